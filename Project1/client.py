@@ -8,27 +8,24 @@
 # Kurosh & Keith W. Ross
 
 
-from socket import *
+from http_client import HTTPConnection
 
 serverName = "gaia.cs.umass.edu"
 serverPort = 80
 
 
-clientSocket = socket(
-    AF_INET, SOCK_STREAM
-)  # Creates a TCP socket for reliable delivery and ordered data
-clientSocket.connect((serverName, serverPort))
+# Opens a TCP connection for reliable delivery and ordered data and reads the whole response
+# (not just the first 1024 bytes). One request, the connection is closed at the end.
+connection = HTTPConnection(serverName, serverPort)
+target = "/wireshark-labs/INTRO-wireshark-file1.html"
 
-request = ("GET /wireshark-labs/INTRO-wireshark-file1.html "
-           "HTTP/1.1\r\nHost:gaia.cs.umass.edu\r\n\r\n")
-
-clientSocket.send(request.encode())  # Sends the encoded GET request
-contentReceived = clientSocket.recv(1024)  # Reads up to 1024 bytes of data.
+response = connection.request("GET", target)
 
 # Prints socket details and the decoded data received from the server.
-print(f"\nRequest: {request}")
-print(f"Length-Recieved: {len(contentReceived)}")
-print(contentReceived.decode())
+print(f"\nRequest: GET {target}")
+print(f"Status: {response.status} {response.reason}")
+print(f"Length-Recieved: {response.bodyLength}")
+print(response.text())
 
 
-clientSocket.close()
+connection.close()
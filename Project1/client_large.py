@@ -2,36 +2,32 @@
 # client_large.py
 
 # Creates a simple client socket and retrieves data via a GET Request. This socket,
-# can handle larger amounts of data with the use a loop to display data until the
-# server closes the transmission (when bytes read = 0).
+# can handle larger amounts of data: the body is streamed to the terminal as it arrives
+# instead of being decoded one recv() at a time, which split characters that straddled
+# two reads (see http_client.py).
 
 # All Code was generated by me with the help of the Class modules and,
 # our class book "Networking A Top-Down Approach" chapter 2.7 by James F. Kurose & Keith W. Ross
 
 
-from socket import *
-serverName = 'gaia.cs.umass.edu'
-serverPort = 80
-
+import sys
 
-clientSocket = socket(AF_INET, SOCK_STREAM)                 # Creates a TCP socket for reliable delivery and ordered data
-clientSocket.connect((serverName, serverPort))
+from http_client import HTTPConnection
 
-request = "GET /wireshark-labs/HTTP-wireshark-file3.html HTTP/1.1\r\nHost:gaia.cs.umass.edu\r\n\r\n"
-
-clientSocket.send(request.encode())                         # Sends the GET request.
+serverName = 'gaia.cs.umass.edu'
+serverPort = 80
 
-print(f"\nRequest: {request}")                              # Print Socket information.
 
+connection = HTTPConnection(serverName, serverPort)         # TCP connection for reliable delivery and ordered data
+target = "/wireshark-labs/HTTP-wireshark-file3.html"
 
-# Loop to read and display 4096 bytes of data at a time, until the server closes the connection. (Bytes read = 0)
-while True:
-    contentReceived = clientSocket.recv(4096)
+print(f"\nRequest: GET {target}")                           # Print Socket information.
+sys.stdout.flush()
 
-    if len(contentReceived) == 0:
-        break
 
-    print(f"Length-Recieved: {len(contentReceived)}")
-    print(contentReceived.decode())
+# Raw bytes go straight to stdout as they're received, the terminal does the decoding.
+response = connection.request("GET", target, sink=sys.stdout.buffer)
+sys.stdout.buffer.flush()
+print(f"\nStatus: {response.status} {response.reason}, Length-Recieved: {response.bodyLength}")
 
-clientSocket.close()
\ No newline at end of file
+connection.close()
@@ -0,0 +1,474 @@
+# Adam Fitzpatrick
+# concurrent_server.py
+
+# Concurrent versions of the accept -> recv -> send -> close loop in server.py, so one slow client
+# can't hold up the others. Both servers speak HTTP/1.1 (http11.py): connections stay open for more
+# requests, pipelined requests are answered in order, and handler(request) gets an HTTPRequest and
+# returns the response, either bytes or an iterable of byte chunks (see buildResponse()). A chunk
+# can also be a FileBody, which is sent with os.sendfile() so the file never passes through Python.
+
+#   SelectorServer - one thread, nonblocking sockets multiplexed with selectors (epoll on Linux)
+#   AsyncioServer  - the same on asyncio streams
+
+# With workers > 0 the handler runs on a bounded thread pool instead of the event loop, for handlers
+# that block (disk, databases, ...). shutdown() stops accepting, lets requests already being handled
+# finish for up to the grace period and then closes everything. Keep-alive connections with nothing
+# going on are closed after idleTimeout seconds.
+
+# A server listens on its own socket, or on sock when one is given (a listening socket inherited from
+# a parent process). reusePort binds with SO_REUSEPORT so several processes can each have their own
+# socket on the same port, see prefork.py.
+
+import asyncio
+import os
+import selectors
+import socket
+import threading
+import time
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+
+from http11 import FileBody, HTTPError, RequestParser, errorResponse
+
+RECV_SIZE = 65536
+SENDFILE_SIZE = 1024 * 1024             # Most bytes one os.sendfile() call is asked for
+MAX_PENDING_OUTPUT = 1024 * 1024        # Stop reading a connection whose client isn't reading its responses
+DEFAULT_BACKLOG = 1024
+SHUTDOWN_GRACE = 5.0                    # Seconds in-flight requests get to finish on shutdown
+IDLE_TIMEOUT = 15.0                     # Seconds an idle keep-alive connection is kept
+
+
+# Per connection state for SelectorServer.
+class Connection(object):
+    __slots__ = ("sock", "addr", "parser", "pending", "outBuffer", "streams", "fileBody", "events", "busy",
+                 "closing", "lastActive")
+
+    def __init__(self, sock, addr):
+        self.sock = sock
+        self.addr = addr
+        self.parser = RequestParser()
+        self.pending = deque()          # Parsed requests waiting for their turn
+        self.outBuffer = bytearray()
+        self.streams = deque()          # Response iterators still to be pulled, in order
+        self.fileBody = None            # FileBody being sent, after outBuffer
+        self.events = 0                 # Events registered with the selector, 0 when not registered
+        self.busy = False               # A request is on the thread pool
+        self.closing = False            # Close once everything queued has been sent
+        self.lastActive = time.monotonic()
+
+    def isIdle(self):
+        return not (self.busy or self.pending or self.outBuffer or self.streams or self.fileBody)
+
+    # Drops output that will never be sent, files still queued in streams are closed as they're collected.
+    def discardOutput(self):
+        if self.fileBody is not None:
+            self.fileBody.close()
+            self.fileBody = None
+        self.streams.clear()
+
+
+class SelectorServer(object):
+
+    def __init__(self, handler, host="", port=5005, backlog=DEFAULT_BACKLOG, workers=0,
+                 shutdownGrace=SHUTDOWN_GRACE, idleTimeout=IDLE_TIMEOUT, sock=None, reusePort=False):
+        self.handler = handler
+        self.shutdownGrace = shutdownGrace
+        self.idleTimeout = idleTimeout
+        self.selector = selectors.DefaultSelector()
+        self.pool = ThreadPoolExecutor(workers) if workers > 0 else None
+        self.connections = {}                       # fileno -> Connection
+        self.finished = deque()                     # (Connection, request, response) handed back by the pool
+        self.stopping = threading.Event()
+        self.countConnections = 0
+        self.countRequests = 0
+
+        if sock is None:
+            sock = socket.create_server((host, port), backlog=backlog, reuse_port=reusePort)
+        self.serverSocket = sock
+        self.serverSocket.setblocking(False)
+        self.selector.register(self.serverSocket, selectors.EVENT_READ, self.accept)
+
+        # The pool and shutdown() wake the loop up by writing to this pair.
+        self.wakeupReceiver, self.wakeupSender = socket.socketpair()
+        self.wakeupReceiver.setblocking(False)
+        self.wakeupSender.setblocking(False)
+        self.selector.register(self.wakeupReceiver, selectors.EVENT_READ, self.drainWakeups)
+
+    def getAddress(self):
+        return self.serverSocket.getsockname()
+
+    def serveForever(self):
+        try:
+            while not self.stopping.is_set():
+                self.runOnce(1.0 if self.idleTimeout else None)
+                self.closeIdle(self.idleTimeout)
+
+            # Graceful shutdown, no new connections and idle ones are closed, busy ones get to finish.
+            self.selector.unregister(self.serverSocket)
+            self.serverSocket.close()
+            for connection in list(self.connections.values()):
+                connection.closing = True
+                connection.pending.clear()
+            self.closeIdle(0)
+            deadline = time.monotonic() + self.shutdownGrace
+            while self.connections and time.monotonic() < deadline:
+                self.runOnce(max(0.0, deadline - time.monotonic()))
+        finally:
+            for connection in list(self.connections.values()):
+                self.close(connection)
+            if self.pool is not None:
+                self.pool.shutdown(wait=False, cancel_futures=True)
+            self.selector.close()
+            self.wakeupReceiver.close()
+            self.wakeupSender.close()
+
+    def runOnce(self, timeout):
+        for key, events in self.selector.select(timeout):
+            key.data(key.fileobj, events)
+
+    def closeIdle(self, timeout):
+        if timeout is None:
+            return
+        cutoff = time.monotonic() - timeout
+        for connection in list(self.connections.values()):
+            if connection.lastActive <= cutoff and connection.isIdle():
+                self.close(connection)
+
+    # Safe to call from any thread or a signal handler.
+    def shutdown(self):
+        self.stopping.set()
+        self.wakeup()
+
+    def wakeup(self):
+        try:
+            self.wakeupSender.send(b"\0")
+        except (BlockingIOError, OSError):
+            pass                                    # Already has a wakeup pending, or closed
+
+    def drainWakeups(self, sock, events):
+        try:
+            while sock.recv(4096):
+                pass
+        except BlockingIOError:
+            pass
+        while self.finished:
+            connection, request, response = self.finished.popleft()
+            connection.busy = False
+            if connection.sock.fileno() in self.connections:
+                self.queueResponse(connection, request, response)
+                self.process(connection)
+
+    def accept(self, sock, events):
+        # Take everything in the backlog, not just one connection per wakeup.
+        while True:
+            try:
+                clientSocket, addr = sock.accept()
+            except (BlockingIOError, InterruptedError):
+                return
+            except OSError:
+                return                              # Out of file descriptors, retry on the next wakeup
+            clientSocket.setblocking(False)
+            clientSocket.setsockopt(socket.IPPROTO_TCP, socket.TCP_NODELAY, 1)
+            connection = Connection(clientSocket, addr)
+            self.connections[clientSocket.fileno()] = connection
+            self.countConnections += 1
+            self.updateEvents(connection)
+
+    def onEvent(self, sock, events):
+        connection = self.connections[sock.fileno()]
+        connection.lastActive = time.monotonic()
+        if events & selectors.EVENT_WRITE:
+            self.write(connection)
+        if events & selectors.EVENT_READ and connection.sock.fileno() in self.connections:
+            self.read(connection)
+
+    def read(self, connection):
+        try:
+            chunk = connection.sock.recv(RECV_SIZE)
+        except (BlockingIOError, InterruptedError):
+            return
+        except OSError:
+            self.close(connection)
+            return
+        if not chunk:
+            # The client is done sending, answer what it already asked for and then close.
+            connection.closing = True
+            self.process(connection)
+            return
+
+        try:
+            connection.pending.extend(connection.parser.feed(chunk))
+        except HTTPError as error:
+            connection.pending.extend(error.requests)
+            connection.pending.append(error)
+        except Exception:
+            self.close(connection)                  # A parser bug costs the connection, not the server
+            return
+        self.process(connection)
+
+    # ################################################################################################ #
+    # process()                                                                                        #
+    #                                                                                                  #
+    # Handles the connection's pending requests one at a time so responses go out in request order.    #
+    # ################################################################################################ #
+    def process(self, connection):
+        while connection.pending and not connection.busy and len(connection.outBuffer) < MAX_PENDING_OUTPUT:
+            request = connection.pending.popleft()
+            if isinstance(request, HTTPError):
+                self.queueResponse(connection, None, errorResponse(request))
+                break
+
+            self.countRequests += 1
+            if self.pool is not None:
+                connection.busy = True
+                future = self.pool.submit(self.handler, request)
+                future.add_done_callback(lambda done, request=request: self.handOff(connection, request, done))
+                break
+            try:
+                response = self.handler(request)
+            except Exception:
+                response = None                     # A broken handler costs the connection, not the server
+            self.queueResponse(connection, request, response)
+
+        self.write(connection)
+
+    # Runs on a pool thread.
+    def handOff(self, connection, request, future):
+        try:
+            response = future.result()
+        except Exception:
+            response = None
+        self.finished.append((connection, request, response))
+        self.wakeup()
+
+    def queueResponse(self, connection, request, response):
+        if response is None:
+            response = errorResponse(HTTPError(500))
+            request = None
+        if isinstance(response, (bytes, bytearray, memoryview)):
+            if connection.streams:
+                connection.streams.append(iter((response,)))
+            else:
+                connection.outBuffer += response
+        else:
+            connection.streams.append(iter(response))
+        if request is None or not request.keepAlive:
+            connection.closing = True
+            connection.pending.clear()
+
+    def write(self, connection):
+        try:
+            while True:
+                if connection.outBuffer:
+                    sent = connection.sock.send(connection.outBuffer)
+                    del connection.outBuffer[:sent]
+                    continue
+                if connection.fileBody is not None:
+                    self.sendFile(connection)
+                    continue
+                if not connection.streams:
+                    break
+                chunk = next(connection.streams[0], None)
+                if chunk is None:
+                    connection.streams.popleft()
+                elif isinstance(chunk, FileBody):
+                    connection.fileBody = chunk
+                else:
+                    connection.outBuffer += chunk
+        except (BlockingIOError, InterruptedError):
+            pass                                    # Socket buffer full, wait for EVENT_WRITE
+        except OSError:
+            self.close(connection)
+            return
+
+        if connection.closing and connection.isIdle():
+            self.close(connection)
+            return
+        if connection.pending and not connection.busy and len(connection.outBuffer) < MAX_PENDING_OUTPUT:
+            self.process(connection)
+            return
+        self.updateEvents(connection)
+
+    # Sends the next piece of connection.fileBody, raises BlockingIOError when the socket is full.
+    def sendFile(self, connection):
+        fileBody = connection.fileBody
+        if fileBody.remaining > 0:
+            count = min(fileBody.remaining, SENDFILE_SIZE)
+            if hasattr(os, "sendfile"):
+                sent = os.sendfile(connection.sock.fileno(), fileBody.file.fileno(), fileBody.offset, count)
+            else:
+                fileBody.file.seek(fileBody.offset)
+                sent = connection.sock.send(fileBody.file.read(count))
+            if sent == 0:
+                raise OSError("File shrank while it was being sent")      # The Content-Length can't be kept
+            fileBody.offset += sent
+            fileBody.remaining -= sent
+        if fileBody.remaining == 0:
+            fileBody.close()
+            connection.fileBody = None
+
+    def updateEvents(self, connection):
+        events = 0
+        if not connection.closing and len(connection.outBuffer) < MAX_PENDING_OUTPUT:
+            events |= selectors.EVENT_READ
+        if connection.outBuffer or connection.streams or connection.fileBody:
+            events |= selectors.EVENT_WRITE
+        if events == connection.events:
+            return
+        if connection.events == 0:
+            self.selector.register(connection.sock, events, self.onEvent)
+        elif events == 0:
+            self.selector.unregister(connection.sock)
+        else:
+            self.selector.modify(connection.sock, events, self.onEvent)
+        connection.events = events
+
+    def close(self, connection):
+        fileno = connection.sock.fileno()
+        if fileno in self.connections:
+            del self.connections[fileno]
+            if connection.events:
+                self.selector.unregister(connection.sock)
+                connection.events = 0
+        connection.discardOutput()
+        connection.sock.close()
+
+
+class AsyncioServer(object):
+
+    def __init__(self, handler, host="", port=5005, backlog=DEFAULT_BACKLOG, workers=0,
+                 shutdownGrace=SHUTDOWN_GRACE, idleTimeout=IDLE_TIMEOUT, sock=None, reusePort=False):
+        self.handler = handler
+        self.host = host
+        self.port = port
+        self.backlog = backlog
+        self.sock = sock
+        self.reusePort = reusePort
+        self.shutdownGrace = shutdownGrace
+        self.idleTimeout = idleTimeout
+        self.pool = ThreadPoolExecutor(workers) if workers > 0 else None
+        self.tasks = set()                          # Connections being served
+        self.busy = set()                           # Of those, the ones in the middle of a request
+        self.loop = None
+        self.stopped = None
+        self.server = None
+        self.countConnections = 0
+        self.countRequests = 0
+
+    async def serve(self, started=None):
+        self.loop = asyncio.get_running_loop()
+        self.stopped = asyncio.Event()
+        if self.sock is not None:
+            self.server = await asyncio.start_server(self.client, sock=self.sock, backlog=self.backlog)
+        else:
+            self.server = await asyncio.start_server(self.client, self.host, self.port, backlog=self.backlog,
+                                                     reuse_port=self.reusePort or None)
+        if started is not None:
+            started(self.server.sockets[0].getsockname())
+
+        await self.stopped.wait()
+
+        self.server.close()
+        for task in self.tasks - self.busy:
+            task.cancel()                           # Idle keep-alive connections
+        if self.tasks:
+            await asyncio.wait(self.tasks, timeout=self.shutdownGrace)
+        for task in self.tasks:
+            task.cancel()
+        if self.pool is not None:
+            self.pool.shutdown(wait=False, cancel_futures=True)
+
+    def serveForever(self, started=None):
+        asyncio.run(self.serve(started))
+
+    # Safe to call from any thread or a signal handler.
+    def shutdown(self):
+        if self.loop is not None:
+            self.loop.call_soon_threadsafe(self.stopped.set)
+
+    async def client(self, reader, writer):
+        task = asyncio.current_task()
+        self.tasks.add(task)
+        self.countConnections += 1
+        parser = RequestParser()
+        try:
+            keepAlive = True
+            while keepAlive and not self.stopped.is_set():
+                # asyncio.timeout() rather than wait_for(), which can swallow a shutdown's cancel.
+                try:
+                    async with asyncio.timeout(self.idleTimeout):
+                        data = await reader.read(RECV_SIZE)
+                except TimeoutError:
+                    break
+                if not data:
+                    break
+
+                self.busy.add(task)
+                try:
+                    requests, error = parser.feed(data), None
+                except HTTPError as parseError:
+                    requests, error = parseError.requests, parseError
+                for request in requests:
+                    keepAlive = await self.respond(request, writer)
+                    if not keepAlive:
+                        break
+                if error is not None:
+                    if keepAlive:                   # Answered after the requests before it, then closed
+                        writer.write(errorResponse(error))
+                    break
+                self.busy.discard(task)
+            await writer.drain()
+        except (ConnectionError, asyncio.CancelledError):
+            pass
+        finally:
+            self.tasks.discard(task)
+            self.busy.discard(task)
+            writer.close()
+
+    async def respond(self, request, writer):
+        self.countRequests += 1
+        try:
+            if self.pool is None:
+                response = self.handler(request)
+            else:
+                response = await self.loop.run_in_executor(self.pool, self.handler, request)
+        except Exception:
+            response = None
+        if response is None:
+            writer.write(errorResponse(HTTPError(500)))
+            return False
+
+        if isinstance(response, (bytes, bytearray, memoryview)):
+            writer.write(response)
+        else:
+            for chunk in response:
+                if isinstance(chunk, FileBody):
+                    await self.sendFile(chunk, writer)
+                else:
+                    writer.write(chunk)
+                await writer.drain()
+        await writer.drain()
+        return request.keepAlive
+
+    async def sendFile(self, fileBody, writer):
+        try:
+            await writer.drain()
+            if fileBody.remaining > 0:
+                # Uses os.sendfile() where the transport allows it, falls back to reading the file.
+                await self.loop.sendfile(writer.transport, fileBody.file, fileBody.offset, fileBody.remaining)
+        finally:
+            fileBody.close()
+
+
+# Raises the open file limit as far as allowed, each connection needs a descriptor.
+def raiseFileLimit():
+    try:
+        import resource
+    except ImportError:
+        return
+    soft, hard = resource.getrlimit(resource.RLIMIT_NOFILE)
+    if hard == resource.RLIM_INFINITY or soft < hard:
+        try:
+            resource.setrlimit(resource.RLIMIT_NOFILE, (hard if hard != resource.RLIM_INFINITY else 65536, hard))
+        except (ValueError, OSError):
+            pass
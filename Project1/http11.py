@@ -0,0 +1,303 @@
+# Adam Fitzpatrick
+# http11.py
+
+# Minimal HTTP/1.1 message handling for the Project1 servers, following RFC 9112.
+# RequestParser is fed bytes as they arrive and hands back every complete request, so
+# pipelined requests on one connection come out in order. Bodies are framed by
+# Content-Length or chunked Transfer-Encoding. buildResponse() always frames the body,
+# with Content-Length for bytes or chunked encoding for an iterable of chunks, so the
+# connection can stay open for the next request.
+
+import re
+
+HEADER_END = b"\r\n\r\n"
+CRLF = b"\r\n"
+MAX_HEADER_SIZE = 65536                 # Request line plus headers
+MAX_BODY_SIZE = 16 * 1024 * 1024
+
+# str.isdigit() and int() also take Unicode digits, signs, "0x" and "_", which aren't valid here.
+DECIMAL_DIGITS = re.compile("[0-9]+")
+HEX_DIGITS = re.compile(rb"[0-9A-Fa-f]+")
+
+STATUS_REASONS = {
+    200: "OK",
+    204: "No Content",
+    206: "Partial Content",
+    304: "Not Modified",
+    400: "Bad Request",
+    403: "Forbidden",
+    404: "Not Found",
+    405: "Method Not Allowed",
+    411: "Length Required",
+    413: "Content Too Large",
+    416: "Range Not Satisfiable",
+    431: "Request Header Fields Too Large",
+    500: "Internal Server Error",
+    501: "Not Implemented",
+    505: "HTTP Version Not Supported",
+}
+
+
+class HTTPError(Exception):
+
+    def __init__(self, status, message=None):
+        super().__init__(message or STATUS_REASONS.get(status, ""))
+        self.status = status
+        self.requests = []                      # Set by RequestParser.feed(), requests completed before this one
+
+
+class HTTPRequest(object):
+    __slots__ = ("method", "target", "version", "headers", "body")
+
+    def __init__(self, method, target, version, headers, body=b""):
+        self.method = method
+        self.target = target
+        self.version = version
+        self.headers = headers                  # lower case name -> value, repeats joined with ", "
+        self.body = body
+
+    def getHeader(self, name, default=None):
+        return self.headers.get(name.lower(), default)
+
+    # HTTP/1.1 stays open unless asked to close, HTTP/1.0 only stays open when asked to.
+    @property
+    def keepAlive(self):
+        tokens = [token.strip().lower() for token in self.headers.get("connection", "").split(",")]
+        if self.version == "HTTP/1.0":
+            return "keep-alive" in tokens
+        return "close" not in tokens
+
+    def __repr__(self):
+        return f"HTTPRequest({self.method} {self.target} {self.version}, {len(self.body)} byte body)"
+
+
+class RequestParser(object):
+    # Chunked body states
+    CHUNK_SIZE = 0
+    CHUNK_DATA = 1
+    CHUNK_DATA_END = 2
+    CHUNK_TRAILER = 3
+
+    def __init__(self, maxHeaderSize=MAX_HEADER_SIZE, maxBodySize=MAX_BODY_SIZE):
+        self.maxHeaderSize = maxHeaderSize
+        self.maxBodySize = maxBodySize
+        self.buffer = bytearray()
+        self.request = None                     # Headers parsed, body still coming
+        self.bodyLength = 0                     # Content-Length of self.request, None when chunked
+        self.body = bytearray()
+        self.chunkState = RequestParser.CHUNK_SIZE
+        self.chunkRemaining = 0
+
+    # ################################################################################################ #
+    # feed()                                                                                           #
+    #                                                                                                  #
+    # Adds data read from the socket and returns the requests it completed, possibly none. Raises     #
+    # HTTPError on a malformed request, with the requests completed before it in error.requests. Those #
+    # should be answered in order, then the error, then the connection closed.                        #
+    # ################################################################################################ #
+    def feed(self, data):
+        self.buffer += data
+        requests = []
+        try:
+            while True:
+                if self.request is None and not self.parseHead():
+                    break
+                if self.bodyLength is None:
+                    done = self.parseChunked()
+                else:
+                    done = self.parseFixed()
+                if not done:
+                    break
+                self.request.body = bytes(self.body)
+                requests.append(self.request)
+                self.request = None
+                self.body = bytearray()
+        except HTTPError as error:
+            error.requests = requests
+            raise
+        return requests
+
+    # Whether a request is partly received, a connection closed now would lose it.
+    def hasPartialRequest(self):
+        return self.request is not None or len(self.buffer) > 0
+
+    def parseHead(self):
+        end = self.buffer.find(HEADER_END)
+        if end == -1:
+            if len(self.buffer) > self.maxHeaderSize:
+                raise HTTPError(431)
+            return False
+        if end > self.maxHeaderSize:
+            raise HTTPError(431)
+
+        head = self.buffer[:end].decode("latin-1")
+        del self.buffer[:end + len(HEADER_END)]
+        lines = head.split("\r\n")
+        while lines and not lines[0]:           # Stray CRLFs between requests are allowed
+            lines.pop(0)
+        if not lines:
+            raise HTTPError(400, "Empty request")
+
+        parts = lines[0].split(" ")
+        if len(parts) != 3:
+            raise HTTPError(400, f"Bad request line: {lines[0]!r}")
+        method, target, version = parts
+        if version not in ("HTTP/1.0", "HTTP/1.1"):
+            raise HTTPError(505)                # keepAlive and the other version rules only cover these two
+
+        headers = {}
+        for line in lines[1:]:
+            name, separator, value = line.partition(":")
+            if not separator or not name or name != name.strip():
+                raise HTTPError(400, f"Bad header line: {line!r}")
+            name = name.lower()
+            value = value.strip()
+            headers[name] = headers[name] + ", " + value if name in headers else value
+        if version == "HTTP/1.1" and "host" not in headers:
+            raise HTTPError(400, "Missing Host header")
+
+        self.request = HTTPRequest(method, target, version, headers)
+        self.bodyLength = self.getBodyLength(headers)
+        self.chunkState = RequestParser.CHUNK_SIZE
+        return True
+
+    def getBodyLength(self, headers):
+        if "transfer-encoding" in headers:
+            codings = [coding.strip().lower() for coding in headers["transfer-encoding"].split(",")]
+            if codings[-1] != "chunked":
+                raise HTTPError(400, "Transfer-Encoding without chunked can't be framed")
+            if codings != ["chunked"]:
+                raise HTTPError(501, "Only chunked transfer coding is supported")
+            return None
+
+        if "content-length" not in headers:
+            return 0
+        values = {value.strip() for value in headers["content-length"].split(",")}
+        if len(values) != 1 or not DECIMAL_DIGITS.fullmatch(next(iter(values))):
+            raise HTTPError(400, "Bad Content-Length")
+        length = int(values.pop())
+        if length > self.maxBodySize:
+            raise HTTPError(413)
+        return length
+
+    def parseFixed(self):
+        if len(self.buffer) < self.bodyLength:
+            return False
+        self.body = self.buffer[:self.bodyLength]
+        del self.buffer[:self.bodyLength]
+        return True
+
+    def parseChunked(self):
+        while True:
+            if self.chunkState == RequestParser.CHUNK_SIZE:
+                end = self.buffer.find(CRLF)
+                if end == -1:
+                    if len(self.buffer) > 1024:
+                        raise HTTPError(400, "Chunk size line too long")
+                    return False
+                sizeField = self.buffer[:end].split(b";", 1)[0].strip()
+                del self.buffer[:end + len(CRLF)]
+                if not HEX_DIGITS.fullmatch(sizeField):
+                    raise HTTPError(400, f"Bad chunk size: {bytes(sizeField)!r}")
+                self.chunkRemaining = int(sizeField, 16)
+                if len(self.body) + self.chunkRemaining > self.maxBodySize:
+                    raise HTTPError(413)
+                self.chunkState = RequestParser.CHUNK_DATA if self.chunkRemaining else RequestParser.CHUNK_TRAILER
+
+            elif self.chunkState == RequestParser.CHUNK_DATA:
+                if not self.buffer:
+                    return False
+                take = min(self.chunkRemaining, len(self.buffer))
+                self.body += self.buffer[:take]
+                del self.buffer[:take]
+                self.chunkRemaining -= take
+                if self.chunkRemaining:
+                    return False
+                self.chunkState = RequestParser.CHUNK_DATA_END
+
+            elif self.chunkState == RequestParser.CHUNK_DATA_END:
+                if len(self.buffer) < len(CRLF):
+                    return False
+                if self.buffer[:len(CRLF)] != CRLF:
+                    raise HTTPError(400, "Chunk data not followed by CRLF")
+                del self.buffer[:len(CRLF)]
+                self.chunkState = RequestParser.CHUNK_SIZE
+
+            else:
+                # Trailer fields are read and ignored, an empty line ends the body.
+                end = self.buffer.find(CRLF)
+                if end == -1:
+                    if len(self.buffer) > self.maxHeaderSize:
+                        raise HTTPError(431)
+                    return False
+                del self.buffer[:end + len(CRLF)]
+                if end == 0:
+                    return True
+
+
+# Part of an open file sent as a response body, the servers hand it to os.sendfile().
+class FileBody(object):
+    __slots__ = ("file", "offset", "remaining")
+
+    def __init__(self, file, offset, count):
+        self.file = file
+        self.offset = offset
+        self.remaining = count
+
+    def close(self):
+        if self.file is not None:
+            self.file.close()
+
+
+# #################################################################################################### #
+# buildResponse()                                                                                      #
+#                                                                                                      #
+# A complete response. body as bytes gets a Content-Length and the whole response is returned as       #
+# bytes. A FileBody also gets a Content-Length and [head, body] is returned. Any other iterable of      #
+# byte chunks is sent with chunked encoding and a generator of the pieces is returned instead, the      #
+# body is only pulled as the socket can take it. headOnly leaves the body out, for HEAD requests.       #
+# #################################################################################################### #
+def buildResponse(status, body=b"", headers=None, keepAlive=True, contentType="text/html; charset=UTF-8",
+                  headOnly=False):
+    lines = [f"HTTP/1.1 {status} {STATUS_REASONS.get(status, '')}"]
+    if contentType is not None and status not in (204, 304):
+        lines.append(f"Content-Type: {contentType}")
+    for name, value in (headers or {}).items():
+        lines.append(f"{name}: {value}")
+    if not keepAlive:
+        lines.append("Connection: close")
+
+    if isinstance(body, (bytes, bytearray, memoryview)):
+        if status not in (204, 304):
+            lines.append(f"Content-Length: {len(body)}")
+        head = "\r\n".join(lines).encode("latin-1") + HEADER_END
+        return head if headOnly else head + body
+
+    if isinstance(body, FileBody):
+        lines.append(f"Content-Length: {body.remaining}")
+        head = "\r\n".join(lines).encode("latin-1") + HEADER_END
+        if headOnly:
+            body.close()
+            return head
+        return [head, body]
+
+    lines.append("Transfer-Encoding: chunked")
+    head = "\r\n".join(lines).encode("latin-1") + HEADER_END
+    return head if headOnly else streamChunked(head, body)
+
+
+def streamChunked(head, chunks):
+    yield head
+    yield from encodeChunks(chunks)
+
+
+def encodeChunks(chunks):
+    for chunk in chunks:
+        if chunk:
+            yield b"%x\r\n" % len(chunk) + chunk + CRLF
+    yield b"0\r\n\r\n"
+
+
+def errorResponse(error):
+    body = f"<html>{error.status} {STATUS_REASONS.get(error.status, '')}: {error}</html>\r\n".encode()
+    return buildResponse(error.status, body, keepAlive=False)
@@ -0,0 +1,413 @@
+# Adam Fitzpatrick
+# http_client.py
+
+# A reusable HTTP/1.1 client for the Project1 servers (or any other), grown out of client.py and
+# client_large.py. Those open a connection per GET and decode whatever recv() returns, which cuts
+# large responses short and splits UTF-8 characters that straddle two reads. Here:
+
+#   - HTTPConnection reads with recv_into() into one preallocated buffer and parses the response as
+#     it arrives, bodies framed by Content-Length, chunked encoding or the server closing.
+#   - Bodies can stream to a sink (a file or a callback) instead of being collected in memory.
+#   - ConnectionPool keeps idle keep-alive connections per host and hands them out again.
+#   - fetchAll() fetches many URLs at once on a thread pool sharing one ConnectionPool.
+
+# Try it against a local server,
+#   python server.py --mode selectors --root ./www
+#   python http_client.py http://localhost:5005/ http://localhost:5005/big.bin --repeat 100 --workers 8
+
+import argparse
+import os
+import re
+import socket
+import ssl
+import threading
+import time
+from collections import defaultdict, deque
+from concurrent.futures import ThreadPoolExecutor
+from urllib.parse import urlsplit
+
+HEADER_END = b"\r\n\r\n"
+CRLF = b"\r\n"
+BUFFER_SIZE = 65536                     # Receive buffer per connection, also the largest chunk a sink is given
+MAX_HEADER_SIZE = 65536
+MAX_IDLE_PER_HOST = 8                   # Idle connections the pool keeps for one host
+TIMEOUT = 10.0
+
+# str.isdigit() and int() also take Unicode digits, signs, "0x" and "_", which aren't valid here.
+DECIMAL_DIGITS = re.compile("[0-9]+")
+HEX_DIGITS = re.compile(rb"[0-9A-Fa-f]+")
+
+
+class HTTPClientError(Exception):
+    pass
+
+
+# The server closed the connection before a complete response arrived.
+class ConnectionClosed(HTTPClientError):
+    pass
+
+
+# The connection was closed before any of the response arrived, typically an idle keep-alive
+# connection the server had timed out. The request can be repeated on a new connection.
+class StaleConnection(ConnectionClosed):
+    pass
+
+
+class HTTPResponse(object):
+    __slots__ = ("status", "reason", "version", "headers", "body", "bodyLength", "reusable")
+
+    def __init__(self, status, reason, version, headers):
+        self.status = status
+        self.reason = reason
+        self.version = version
+        self.headers = headers                  # lower case name -> value, repeats joined with ", "
+        self.body = None                        # bytes, None when the body went to a sink
+        self.bodyLength = 0
+        self.reusable = False                   # The connection can carry another request
+
+    def getHeader(self, name, default=None):
+        return self.headers.get(name.lower(), default)
+
+    def text(self, encoding="utf-8"):
+        return self.body.decode(encoding, "replace")
+
+    def __repr__(self):
+        return f"HTTPResponse({self.status} {self.reason}, {self.bodyLength} byte body)"
+
+
+class HTTPConnection(object):
+
+    def __init__(self, host, port=80, secure=False, timeout=TIMEOUT, bufferSize=BUFFER_SIZE):
+        self.host = host
+        self.port = port
+        self.secure = secure
+        self.timeout = timeout
+        self.sock = None
+        self.buffer = bytearray(bufferSize)
+        self.view = memoryview(self.buffer)
+        self.start = 0                          # Received but not yet parsed: buffer[start:end]
+        self.end = 0
+        self.countRequests = 0
+
+    def connect(self):
+        sock = socket.create_connection((self.host, self.port), self.timeout)
+        sock.setsockopt(socket.IPPROTO_TCP, socket.TCP_NODELAY, 1)
+        if self.secure:
+            sock = ssl.create_default_context().wrap_socket(sock, server_hostname=self.host)
+        self.sock = sock
+        self.start = self.end = 0
+        self.countRequests = 0
+
+    def close(self):
+        if self.sock is not None:
+            self.sock.close()
+            self.sock = None
+
+    # ################################################################################################ #
+    # request()                                                                                        #
+    #                                                                                                  #
+    # Sends one request and reads its whole response. sink, when given, gets the body instead of      #
+    # response.body: a file (anything with write()) or a callable, handed memoryviews of the receive   #
+    # buffer that are only valid during the call. Raises ConnectionClosed, HTTPClientError or OSError. #
+    # ################################################################################################ #
+    def request(self, method, target, headers=None, body=b"", sink=None):
+        if self.sock is None:
+            self.connect()
+        lines = [f"{method} {target} HTTP/1.1", f"Host: {self.host}"]
+        for name, value in (headers or {}).items():
+            lines.append(f"{name}: {value}")
+        if body or method in ("POST", "PUT", "PATCH"):
+            lines.append(f"Content-Length: {len(body)}")
+        self.countRequests += 1
+
+        response = None
+        try:
+            self.sock.sendall("\r\n".join(lines).encode("latin-1") + HEADER_END + body)
+            response = self.readHead()
+            while 100 <= response.status < 200:         # Interim responses, the real one follows
+                response = self.readHead()
+            collected = None
+            if sink is None:
+                collected = bytearray()
+                write = collected.extend
+            else:
+                write = sink.write if hasattr(sink, "write") else sink
+            response.reusable = self.readBody(response, method, write)
+        except (ConnectionClosed, ConnectionResetError, BrokenPipeError) as error:
+            stale = response is None and self.start == self.end
+            self.close()
+            if stale:
+                raise StaleConnection(str(error)) from error
+            raise
+        except BaseException:
+            self.close()                                # Whatever is left of the response is unknown
+            raise
+        if collected is not None:
+            response.body = bytes(collected)
+        if not response.reusable:
+            self.close()
+        return response
+
+    # Receives more data into the buffer, moving what's unparsed to the front first when needed. A
+    # head that doesn't fit grows the buffer, up to MAX_HEADER_SIZE.
+    def receive(self):
+        if self.end == len(self.buffer):
+            unparsed = self.end - self.start
+            if self.start > 0:
+                self.buffer[:unparsed] = self.buffer[self.start:self.end]
+            else:
+                if len(self.buffer) > MAX_HEADER_SIZE:
+                    raise HTTPClientError("Response head too large")
+                self.view.release()
+                self.buffer.extend(bytes(len(self.buffer)))
+                self.view = memoryview(self.buffer)
+            self.start, self.end = 0, unparsed
+        received = self.sock.recv_into(self.view[self.end:])
+        if received == 0:
+            raise ConnectionClosed("Connection closed by the server")
+        self.end += received
+
+    def readLine(self, limit=MAX_HEADER_SIZE):
+        while True:
+            found = self.buffer.find(CRLF, self.start, self.end)
+            if found != -1:
+                line = bytes(self.view[self.start:found])
+                self.start = found + len(CRLF)
+                return line
+            if self.end - self.start > limit:
+                raise HTTPClientError("Line too long")
+            self.receive()
+
+    def readHead(self):
+        while True:
+            found = self.buffer.find(HEADER_END, self.start, self.end)
+            if found != -1:
+                break
+            if self.end - self.start > MAX_HEADER_SIZE:
+                raise HTTPClientError("Response head too large")
+            self.receive()
+        lines = self.buffer[self.start:found].decode("latin-1").split("\r\n")
+        self.start = found + len(HEADER_END)
+
+        version, _, rest = lines[0].partition(" ")
+        status, _, reason = rest.partition(" ")
+        if not version.startswith("HTTP/1.") or not DECIMAL_DIGITS.fullmatch(status):
+            raise HTTPClientError(f"Bad status line: {lines[0]!r}")
+        headers = {}
+        for line in lines[1:]:
+            name, separator, value = line.partition(":")
+            if not separator:
+                raise HTTPClientError(f"Bad header line: {line!r}")
+            name = name.strip().lower()
+            value = value.strip()
+            headers[name] = headers[name] + ", " + value if name in headers else value
+        return HTTPResponse(int(status), reason, version, headers)
+
+    # ################################################################################################ #
+    # readBody()                                                                                       #
+    #                                                                                                  #
+    # Hands the body to write() and returns whether the connection can be used again. Bytes already    #
+    # in the buffer go first, the rest is received straight into the buffer and passed on from there.  #
+    # ################################################################################################ #
+    def readBody(self, response, method, write):
+        tokens = [token.strip().lower() for token in response.getHeader("connection", "").split(",")]
+        if response.version == "HTTP/1.0":
+            keepAlive = "keep-alive" in tokens
+        else:
+            keepAlive = "close" not in tokens
+
+        if method == "HEAD" or response.status in (204, 304):
+            return keepAlive
+
+        transferEncoding = response.getHeader("transfer-encoding")
+        if transferEncoding is not None and transferEncoding.lower().split(",")[-1].strip() == "chunked":
+            while True:
+                sizeLine = self.readLine(1024)
+                sizeField = sizeLine.split(b";", 1)[0].strip()
+                if not HEX_DIGITS.fullmatch(sizeField):
+                    raise HTTPClientError(f"Bad chunk size: {sizeLine!r}")
+                size = int(sizeField, 16)
+                if size == 0:
+                    break
+                self.readFixed(size, response, write)
+                if self.readLine(len(CRLF)) != b"":
+                    raise HTTPClientError("Chunk data not followed by CRLF")
+            while self.readLine() != b"":       # Trailer fields are ignored
+                pass
+            return keepAlive
+
+        contentLength = response.getHeader("content-length")
+        if contentLength is not None:
+            if not DECIMAL_DIGITS.fullmatch(contentLength.strip()):
+                raise HTTPClientError(f"Bad Content-Length: {contentLength!r}")
+            self.readFixed(int(contentLength), response, write)
+            return keepAlive
+
+        # No framing, the body runs until the server closes the connection.
+        self.readFixed(None, response, write)
+        return False
+
+    # Passes on count body bytes, or everything up to the server closing when count is None.
+    def readFixed(self, count, response, write):
+        remaining = count
+        while remaining is None or remaining > 0:
+            if self.start == self.end:
+                self.start = self.end = 0
+                want = len(self.buffer) if remaining is None else min(remaining, len(self.buffer))
+                received = self.sock.recv_into(self.view[:want])
+                if received == 0:
+                    if remaining is None:
+                        return
+                    raise ConnectionClosed(f"Connection closed with {remaining} body bytes missing")
+                self.end = received
+            take = self.end - self.start if remaining is None else min(remaining, self.end - self.start)
+            write(self.view[self.start:self.start + take])
+            self.start += take
+            response.bodyLength += take
+            if remaining is not None:
+                remaining -= take
+
+
+# #################################################################################################### #
+# ConnectionPool                                                                                       #
+#                                                                                                      #
+# Idle keep-alive connections per (scheme, host, port). fetch() takes one (or opens one), makes the   #
+# request and puts it back when the response left it reusable. A request on a reused connection that #
+# the server had already closed is retried once on a new connection, as long as the method is safe    #
+# to repeat. Safe to share between threads.                                                            #
+# #################################################################################################### #
+class ConnectionPool(object):
+    IDEMPOTENT = ("GET", "HEAD", "PUT", "DELETE", "OPTIONS")
+
+    def __init__(self, maxIdlePerHost=MAX_IDLE_PER_HOST, timeout=TIMEOUT, bufferSize=BUFFER_SIZE):
+        self.maxIdlePerHost = maxIdlePerHost
+        self.timeout = timeout
+        self.bufferSize = bufferSize
+        self.idle = defaultdict(deque)          # (scheme, host, port) -> idle HTTPConnections
+        self.lock = threading.Lock()
+        self.countConnects = 0
+        self.countReuses = 0
+
+    def fetch(self, url, method="GET", headers=None, body=b"", sink=None):
+        parts = urlsplit(url)
+        if parts.scheme not in ("http", "https"):
+            raise HTTPClientError(f"Unsupported URL: {url}")
+        secure = parts.scheme == "https"
+        key = (parts.scheme, parts.hostname, parts.port or (443 if secure else 80))
+        target = parts.path or "/"
+        if parts.query:
+            target += "?" + parts.query
+
+        connection = self.get(key)
+        reused = connection.sock is not None
+        try:
+            response = connection.request(method, target, headers, body, sink)
+        except StaleConnection:
+            if not reused or method not in ConnectionPool.IDEMPOTENT:
+                raise
+            with self.lock:
+                self.countConnects += 1
+            response = connection.request(method, target, headers, body, sink)
+        if response.reusable:
+            self.put(key, connection)
+        return response
+
+    def get(self, key):
+        with self.lock:
+            idle = self.idle[key]
+            if idle:
+                self.countReuses += 1
+                return idle.pop()               # Most recently used, least likely to have timed out
+            self.countConnects += 1
+        return HTTPConnection(key[1], key[2], key[0] == "https", self.timeout, self.bufferSize)
+
+    def put(self, key, connection):
+        with self.lock:
+            idle = self.idle[key]
+            if len(idle) < self.maxIdlePerHost:
+                idle.append(connection)
+                return
+        connection.close()
+
+    def close(self):
+        with self.lock:
+            for idle in self.idle.values():
+                for connection in idle:
+                    connection.close()
+            self.idle.clear()
+
+
+# #################################################################################################### #
+# fetchAll()                                                                                           #
+#                                                                                                      #
+# GETs every URL with workers threads sharing pool, returns the responses in the order of urls, or    #
+# the exception a fetch raised in its place. sinkFactory(url), when given, makes the sink for each     #
+# body.                                                                                                #
+# #################################################################################################### #
+def fetchAll(urls, workers=8, pool=None, sinkFactory=None, headers=None):
+    ownsPool = pool is None
+    if ownsPool:
+        pool = ConnectionPool(maxIdlePerHost=workers)
+
+    def fetchOne(url):
+        sink = sinkFactory(url) if sinkFactory is not None else None
+        try:
+            return pool.fetch(url, headers=headers, sink=sink)
+        except (HTTPClientError, OSError) as error:
+            return error
+        finally:
+            if hasattr(sink, "close"):
+                sink.close()
+
+    try:
+        with ThreadPoolExecutor(workers) as executor:
+            return list(executor.map(fetchOne, urls))
+    finally:
+        if ownsPool:
+            pool.close()
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Fetch URLs over pooled keep-alive connections")
+    parser.add_argument("urls", nargs="+")
+    parser.add_argument("--repeat", type=int, default=1, help="fetch the list this many times")
+    parser.add_argument("--workers", type=int, default=8)
+    parser.add_argument("--output", help="directory to write the bodies to, they're discarded otherwise")
+    args = parser.parse_args()
+
+    urls = args.urls * args.repeat
+    if args.output is not None:
+        os.makedirs(args.output, exist_ok=True)
+        numbered = iter(range(len(urls)))
+        lock = threading.Lock()
+
+        def sinkFactory(url):
+            with lock:
+                number = next(numbered)
+            name = os.path.basename(urlsplit(url).path) or "index.html"
+            return open(os.path.join(args.output, f"{number}-{name}"), "wb")
+    else:
+        def sinkFactory(url):
+            return lambda chunk: None
+
+    pool = ConnectionPool(maxIdlePerHost=args.workers)
+    start = time.perf_counter()
+    responses = fetchAll(urls, args.workers, pool, sinkFactory)
+    elapsed = time.perf_counter() - start
+    pool.close()
+
+    failed = [response for response in responses if isinstance(response, Exception)]
+    received = sum(response.bodyLength for response in responses if not isinstance(response, Exception))
+    statuses = defaultdict(int)
+    for response in responses:
+        if not isinstance(response, Exception):
+            statuses[response.status] += 1
+    print(f"{len(urls)} requests in {elapsed:.3f}s ({len(urls) / elapsed:.0f}/s), {received} body bytes, "
+          f"{pool.countConnects} connections opened, {pool.countReuses} reused")
+    print("Statuses: " + ", ".join(f"{status}: {count}" for status, count in sorted(statuses.items())))
+    for error in failed[:5]:
+        print(f"Failed: {error!r}")
+
+
+if __name__ == "__main__":
+    main()
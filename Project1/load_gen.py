@@ -0,0 +1,306 @@
+# Adam Fitzpatrick
+# load_gen.py
+
+# Load generator for server.py (or any HTTP/1.1 server). Keeps N connections busy against one URL
+# and reports throughput and p50/p90/p99/p99.9 latency.
+
+#   closed-loop (default)   - every connection sends its next request as soon as the last response
+#                             is in, measuring how fast the server can go
+#   open-loop (--rate R)    - R requests per second in total on a fixed schedule, whether or not the
+#                             server keeps up. Latency is measured from when a request was due, not
+#                             when it went out, so a stalled server can't hide its queueing delay
+#                             (coordinated omission)
+
+# Connections are spread over --processes worker processes, each running one thread per connection,
+# so the generator isn't held to one core. --no-keepalive opens a new connection per request.
+# --json saves the results with the git commit and machine so runs of different server modes can be
+# compared later with --compare,
+#   python server.py --mode selectors --port 5005 &
+#   python load_gen.py http://127.0.0.1:5005/ -c 64 -d 10 --label selectors --json selectors.json
+#   python load_gen.py --compare blocking.json selectors.json asyncio.json
+
+import argparse
+import json
+import math
+import os
+import platform
+import subprocess
+import sys
+import threading
+import time
+from collections import Counter
+from concurrent.futures import ProcessPoolExecutor
+from urllib.parse import urlsplit
+
+from http_client import HTTPClientError, HTTPConnection
+
+PERCENTILES = (50, 90, 99, 99.9)
+RETRY_DELAY = 0.1                       # Closed-loop pause after a failed request, so a dead server isn't spun on
+
+
+# #################################################################################################### #
+# LatencyHistogram                                                                                     #
+#                                                                                                      #
+# HDR-style histogram of integer values (microseconds here). Values below 2 * 10^significantDigits     #
+# get a bucket each, above that buckets double in width every power of two, so any value is known to  #
+# within one part in 10^significantDigits while the bucket count only grows with the log of the       #
+# range. Sparse and mergeable, worker processes send back their counts and they're added up.           #
+# #################################################################################################### #
+class LatencyHistogram(object):
+
+    def __init__(self, significantDigits=3, counts=None):
+        self.significantDigits = significantDigits
+        self.subBucketBits = math.ceil(math.log2(2 * 10 ** significantDigits))
+        self.halfCount = 1 << (self.subBucketBits - 1)
+        self.counts = Counter(counts or {})             # bucket index -> count
+        self.count = sum(self.counts.values())
+        self.total = 0
+        self.maxValue = 0
+
+    def getIndex(self, value):
+        magnitude = max(0, value.bit_length() - self.subBucketBits)
+        return magnitude * self.halfCount + (value >> magnitude)
+
+    # The highest value that lands in bucket index, what HDR histograms report.
+    def getValue(self, index):
+        magnitude = max(0, index // self.halfCount - 1)
+        return ((index - magnitude * self.halfCount) << magnitude) + (1 << magnitude) - 1
+
+    def record(self, value):
+        value = max(0, int(value))
+        self.counts[self.getIndex(value)] += 1
+        self.count += 1
+        self.total += value
+        if value > self.maxValue:
+            self.maxValue = value
+
+    def merge(self, other):
+        self.counts.update(other.counts)
+        self.count += other.count
+        self.total += other.total
+        self.maxValue = max(self.maxValue, other.maxValue)
+
+    def percentile(self, p):
+        if self.count == 0:
+            return None
+        rank = max(1, math.ceil(p / 100 * self.count))
+        seen = 0
+        for index in sorted(self.counts):
+            seen += self.counts[index]
+            if seen >= rank:
+                return min(self.getValue(index), self.maxValue)
+
+    def getSummary(self):
+        if self.count == 0:
+            return {"count": 0}
+        summary = {"count": self.count, "mean": self.total / self.count}
+        for p in PERCENTILES:
+            summary[f"p{p:g}"] = self.percentile(p)
+        summary["max"] = self.maxValue
+        return summary
+
+    def toDict(self):
+        return {"significantDigits": self.significantDigits, "counts": dict(self.counts), "total": self.total,
+                "maxValue": self.maxValue}
+
+    @classmethod
+    def fromDict(cls, data):
+        histogram = cls(data["significantDigits"], {int(index): count for index, count in data["counts"].items()})
+        histogram.total = data["total"]
+        histogram.maxValue = data["maxValue"]
+        return histogram
+
+
+# #################################################################################################### #
+# runConnection()                                                                                      #
+#                                                                                                      #
+# One connection's loop, on its own thread. interval is the time between its requests in open-loop,   #
+# 0 for closed-loop. Only requests due after measureFrom are recorded, the rest are warm up. A failed  #
+# request closes the connection, the next one reconnects.                                              #
+# #################################################################################################### #
+def runConnection(config, offset, interval, measureFrom, stopAt, histogram, stats):
+    connection = HTTPConnection(config["host"], config["port"], config["secure"], config["timeout"])
+    headers = None if config["keepAlive"] else {"Connection": "close"}
+    discard = lambda chunk: None
+    due = measureFrom - config["warmup"] + offset
+    while True:
+        if interval:
+            now = time.perf_counter()
+            if due > now:
+                time.sleep(due - now)
+            start = due
+            due += interval
+        else:
+            start = time.perf_counter()
+        if start >= stopAt:
+            break
+
+        try:
+            response = connection.request("GET", config["target"], headers, sink=discard)
+        except (HTTPClientError, OSError):
+            stats["errors"] += 1
+            if start >= measureFrom:
+                stats["failedRequests"] += 1
+            # Start over on a new connection. Open-loop waits for its next slot anyway, closed-loop backs off.
+            connection.close()
+            if not interval:
+                time.sleep(max(0.0, min(RETRY_DELAY, stopAt - time.perf_counter())))
+            continue
+        finished = time.perf_counter()
+        if start < measureFrom:
+            continue
+        histogram.record((finished - start) * 1000000)
+        stats["requests"] += 1
+        stats["bytes"] += response.bodyLength
+        if response.status >= 400:
+            stats["errorStatuses"] += 1
+    connection.close()
+
+
+# Runs a share of the connections in one process, returns its histogram and counters.
+def runWorker(config):
+    connections = config["connections"]
+    interval = connections / config["rate"] if config["rate"] else 0
+    measureFrom = time.perf_counter() + config["warmup"]
+    stopAt = measureFrom + config["duration"]
+    histograms = [LatencyHistogram(config["significantDigits"]) for _ in range(connections)]
+    stats = [Counter() for _ in range(connections)]
+    threads = []
+    for index in range(connections):
+        # Open-loop connections are staggered so the requests are spread evenly over each interval.
+        offset = (config["first"] + index) * config["stagger"]
+        thread = threading.Thread(target=runConnection, daemon=True,
+                                  args=(config, offset, interval, measureFrom, stopAt, histograms[index], stats[index]))
+        thread.start()
+        threads.append(thread)
+    for thread in threads:
+        thread.join()
+
+    histogram = LatencyHistogram(config["significantDigits"])
+    total = Counter()
+    for index in range(connections):
+        histogram.merge(histograms[index])
+        total.update(stats[index])
+    return histogram.toDict(), dict(total)
+
+
+def gitCommit():
+    try:
+        return subprocess.run(["git", "rev-parse", "HEAD"], capture_output=True, text=True, check=True,
+                              cwd=os.path.dirname(os.path.abspath(__file__))).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def formatLatency(microseconds):
+    if microseconds is None:
+        return "-"
+    if microseconds >= 1000:
+        return f"{microseconds / 1000:.2f}ms"
+    return f"{microseconds}us"
+
+
+def printResults(results):
+    latency = results["latency"]
+    print(f"{results['label'] or results['url']}: {results['requests']} requests in {results['duration']:.2f}s, "
+          f"{results['throughput']:.0f} req/s, {results['bytesPerSecond'] / 1e6:.1f} MB/s, "
+          f"{results['errors']} errors, {results['errorStatuses']} error statuses")
+    print("  latency " + "  ".join(f"{name} {formatLatency(latency.get(name))}"
+                                   for name in ["p50", "p90", "p99", "p99.9", "max"]))
+
+
+def compare(paths):
+    print("{0:>20} {1:>11} {2:>9} {3:>9} {4:>9} {5:>9} {6:>9} {7:>7}".format(
+        "label", "req/s", "p50", "p90", "p99", "p99.9", "max", "errors"))
+    for path in paths:
+        with open(path) as file:
+            results = json.load(file)
+        latency = results["latency"]
+        print("{0:>20} {1:>11.0f} {2:>9} {3:>9} {4:>9} {5:>9} {6:>9} {7:>7}".format(
+            (results["label"] or os.path.basename(path))[:20], results["throughput"],
+            *(formatLatency(latency.get(name)) for name in ["p50", "p90", "p99", "p99.9", "max"]), results["errors"]))
+
+
+def main():
+    parser = argparse.ArgumentParser(description="HTTP load generator and latency benchmark")
+    parser.add_argument("url", nargs="?")
+    parser.add_argument("-c", "--connections", type=int, default=16)
+    parser.add_argument("-d", "--duration", type=float, default=10.0, help="seconds measured")
+    parser.add_argument("--warmup", type=float, default=1.0, help="seconds run before measuring")
+    parser.add_argument("--rate", type=float, default=0,
+                        help="requests per second in total (open-loop), 0 for closed-loop")
+    parser.add_argument("--no-keepalive", dest="keepAlive", action="store_false",
+                        help="a new connection for every request")
+    parser.add_argument("--processes", type=int, default=min(4, os.cpu_count() or 1))
+    parser.add_argument("--timeout", type=float, default=10.0)
+    parser.add_argument("--significant-digits", type=int, default=3, choices=[1, 2, 3, 4, 5])
+    parser.add_argument("--label", help="name for this run, e.g. the server mode")
+    parser.add_argument("--json", help="write the results")
+    parser.add_argument("--compare", nargs="+", metavar="JSON", help="print saved results side by side and exit")
+    args = parser.parse_args()
+
+    if args.compare:
+        compare(args.compare)
+        return
+    if args.url is None:
+        parser.error("a URL is needed")
+    parts = urlsplit(args.url)
+    if parts.scheme not in ("http", "https") or not parts.hostname:
+        parser.error(f"not an http URL: {args.url}")
+    secure = parts.scheme == "https"
+    target = (parts.path or "/") + ("?" + parts.query if parts.query else "")
+
+    # Connections are dealt out to the processes, every process gets its share of the rate.
+    processes = max(1, min(args.processes, args.connections))
+    configs = []
+    first = 0
+    for worker in range(processes):
+        connections = args.connections // processes + (1 if worker < args.connections % processes else 0)
+        configs.append({"host": parts.hostname, "port": parts.port or (443 if secure else 80), "secure": secure,
+                        "target": target, "timeout": args.timeout, "keepAlive": args.keepAlive,
+                        "connections": connections, "first": first,
+                        "rate": args.rate * connections / args.connections,
+                        "stagger": 1 / args.rate if args.rate else 0, "duration": args.duration,
+                        "warmup": args.warmup, "significantDigits": args.significant_digits})
+        first += connections
+
+    if processes > 1:
+        with ProcessPoolExecutor(processes) as pool:
+            outcomes = list(pool.map(runWorker, configs))
+    else:
+        outcomes = [runWorker(configs[0])]
+
+    histogram = LatencyHistogram(args.significant_digits)
+    stats = Counter()
+    for histogramData, counters in outcomes:
+        histogram.merge(LatencyHistogram.fromDict(histogramData))
+        stats.update(counters)
+
+    results = {
+        "label": args.label,
+        "url": args.url,
+        "commit": gitCommit(),
+        "machine": {"platform": platform.platform(), "python": platform.python_version(), "cpus": os.cpu_count()},
+        "args": vars(args),
+        "duration": args.duration,
+        "requests": stats["requests"],
+        "throughput": stats["requests"] / args.duration,
+        "bytesPerSecond": stats["bytes"] / args.duration,
+        "errors": stats["errors"],
+        "failedRequests": stats["failedRequests"],
+        "errorStatuses": stats["errorStatuses"],
+        "latencyUnit": "us",
+        "latency": histogram.getSummary(),
+        "histogram": histogram.toDict(),
+    }
+    printResults(results)
+    if args.json:
+        with open(args.json, "w") as file:
+            json.dump(results, file, indent=2)
+
+    if stats["requests"] == 0:
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
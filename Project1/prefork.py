@@ -0,0 +1,219 @@
+# Adam Fitzpatrick
+# prefork.py
+
+# Multi-process mode for the concurrent servers. One Python process is held to one core by the GIL,
+# so PreforkSupervisor forks a worker per core and each worker runs its own SelectorServer or
+# AsyncioServer on the same port:
+
+#   - With SO_REUSEPORT (Linux, the BSDs) every worker binds its own listening socket and the kernel
+#     spreads new connections over them.
+#   - Without it the supervisor binds once and the workers inherit the socket and all accept on it.
+
+# The supervisor restarts workers that die (backing off when they die right away, so a broken
+# handler doesn't fork in a loop) and adds up the workers' connection and request counters, which
+# they publish in a shared memory block once a second. SIGINT / SIGTERM stop the workers gracefully;
+# workers still running after the grace period are killed.
+
+# With SO_REUSEPORT connections still queued on a worker that crashes are reset, the kernel doesn't
+# move them to the other sockets.
+
+import mmap
+import os
+import signal
+import socket
+import struct
+import threading
+import time
+
+from concurrent_server import SHUTDOWN_GRACE
+
+STATS_FORMAT = "qqd"                    # connections, requests, time of the last update
+STATS_SIZE = struct.calcsize(STATS_FORMAT)
+STATS_INTERVAL = 1.0                    # Seconds between a worker's stats updates
+RESTART_DELAY = 0.1                     # First delay before restarting a worker that died right away
+MAX_RESTART_DELAY = 5.0
+MIN_UPTIME = 1.0                        # A worker that ran at least this long is restarted immediately
+
+
+class WorkerSlot(object):
+    __slots__ = ("index", "pid", "started", "restarts", "restartDelay", "restartAt")
+
+    def __init__(self, index):
+        self.index = index
+        self.pid = None
+        self.started = 0.0
+        self.restarts = 0
+        self.restartDelay = 0.0
+        self.restartAt = 0.0
+
+
+class PreforkSupervisor(object):
+
+    # makeServer(sock, reusePort) builds the server in a worker, sock is the inherited listening socket
+    # or None when the worker should bind its own with reusePort.
+    def __init__(self, makeServer, host="", port=5005, backlog=1024, processes=None, reusePort=None,
+                 shutdownGrace=SHUTDOWN_GRACE):
+        self.makeServer = makeServer
+        self.host = host
+        self.port = port
+        self.backlog = backlog
+        self.processes = processes or os.cpu_count() or 1
+        self.reusePort = hasattr(socket, "SO_REUSEPORT") if reusePort is None else reusePort
+        self.shutdownGrace = shutdownGrace
+        self.slots = [WorkerSlot(index) for index in range(self.processes)]
+        self.stats = mmap.mmap(-1, STATS_SIZE * self.processes)    # Anonymous and shared with the forks
+        self.retired = [0, 0]                   # Counters of workers that have exited
+        self.stopping = False
+        self.countRestarts = 0
+        self.listenSocket = None
+
+    # ################################################################################################ #
+    # serveForever()                                                                                   #
+    #                                                                                                  #
+    # Starts the workers and supervises them until stop() (or SIGINT / SIGTERM when installSignals).   #
+    # Only returns in the supervisor, workers leave with os._exit().                                   #
+    # ################################################################################################ #
+    def serveForever(self, installSignals=True, onStats=None, statsInterval=None):
+        if self.reusePort:
+            # Bound here only to fail early when the port is taken, the workers bind their own.
+            probe = socket.create_server((self.host, self.port), backlog=self.backlog, reuse_port=True)
+            self.port = probe.getsockname()[1]
+            probe.close()
+        else:
+            self.listenSocket = socket.create_server((self.host, self.port), backlog=self.backlog)
+            self.port = self.listenSocket.getsockname()[1]
+        if installSignals:
+            signal.signal(signal.SIGINT, lambda signum, frame: self.stop())
+            signal.signal(signal.SIGTERM, lambda signum, frame: self.stop())
+
+        for slot in self.slots:
+            self.spawn(slot)
+        lastStats = time.monotonic()
+        while not self.stopping:
+            time.sleep(0.1)
+            self.reap()
+            now = time.monotonic()
+            for slot in self.slots:
+                if slot.pid is None and now >= slot.restartAt and not self.stopping:
+                    self.spawn(slot)
+            if onStats is not None and statsInterval and now - lastStats >= statsInterval:
+                lastStats = now
+                onStats(self.getStats())
+        self.stopWorkers()
+        if self.listenSocket is not None:
+            self.listenSocket.close()
+
+    # Safe to call from a signal handler.
+    def stop(self):
+        self.stopping = True
+
+    def spawn(self, slot):
+        self.writeStats(slot.index, 0, 0)
+        pid = os.fork()
+        if pid == 0:
+            self.runWorker(slot.index)
+        slot.pid = pid
+        slot.started = time.monotonic()
+
+    def runWorker(self, index):
+        status = 1
+        try:
+            # Ctrl+C reaches the whole process group, only the supervisor's SIGTERM stops a worker.
+            signal.signal(signal.SIGINT, signal.SIG_IGN)
+            signal.signal(signal.SIGTERM, signal.SIG_DFL)
+            server = self.makeServer(self.listenSocket, self.reusePort)
+            signal.signal(signal.SIGTERM, lambda signum, frame: server.shutdown())
+            stopped = threading.Event()
+            publisher = threading.Thread(target=self.publishStats, args=(index, server, stopped), daemon=True)
+            publisher.start()
+            server.serveForever()
+            stopped.set()
+            publisher.join()
+            status = 0
+        except BaseException:
+            import traceback
+            traceback.print_exc()
+        finally:
+            os._exit(status)
+
+    # Worker thread copying the server's counters into its stats slot.
+    def publishStats(self, index, server, stopped):
+        while True:
+            self.writeStats(index, server.countConnections, server.countRequests)
+            if stopped.wait(STATS_INTERVAL):
+                self.writeStats(index, server.countConnections, server.countRequests)
+                return
+
+    def writeStats(self, index, connections, requests):
+        struct.pack_into(STATS_FORMAT, self.stats, index * STATS_SIZE, connections, requests, time.time())
+
+    def readStats(self, index):
+        return struct.unpack_from(STATS_FORMAT, self.stats, index * STATS_SIZE)
+
+    # Collects workers that exited and schedules their restart.
+    def reap(self):
+        while True:
+            try:
+                pid, status = os.waitpid(-1, os.WNOHANG)
+            except ChildProcessError:
+                return
+            if pid == 0:
+                return
+            for slot in self.slots:
+                if slot.pid == pid:
+                    self.retire(slot)
+                    if self.stopping:
+                        break
+                    if time.monotonic() - slot.started >= MIN_UPTIME:
+                        slot.restartDelay = 0.0
+                    else:
+                        slot.restartDelay = min(MAX_RESTART_DELAY, max(RESTART_DELAY, slot.restartDelay * 2))
+                    slot.restartAt = time.monotonic() + slot.restartDelay
+                    slot.restarts += 1
+                    self.countRestarts += 1
+                    print(f"Worker {slot.index} (pid {pid}) exited with status {os.waitstatus_to_exitcode(status)}, "
+                          f"restarting in {slot.restartDelay:.1f}s")
+                    break
+
+    def retire(self, slot):
+        connections, requests, _ = self.readStats(slot.index)
+        self.retired[0] += connections
+        self.retired[1] += requests
+        self.writeStats(slot.index, 0, 0)
+        slot.pid = None
+
+    def stopWorkers(self):
+        for slot in self.slots:
+            if slot.pid is not None:
+                try:
+                    os.kill(slot.pid, signal.SIGTERM)
+                except ProcessLookupError:
+                    pass
+        deadline = time.monotonic() + self.shutdownGrace + 1.0
+        while any(slot.pid is not None for slot in self.slots) and time.monotonic() < deadline:
+            time.sleep(0.05)
+            self.reap()
+        for slot in self.slots:
+            if slot.pid is not None:
+                os.kill(slot.pid, signal.SIGKILL)
+                os.waitpid(slot.pid, 0)
+                self.retire(slot)
+
+    # ################################################################################################ #
+    # getStats()                                                                                       #
+    #                                                                                                  #
+    # Totals and per worker counters. Running workers' numbers are up to STATS_INTERVAL old.           #
+    # ################################################################################################ #
+    def getStats(self):
+        workers = []
+        totalConnections, totalRequests = self.retired
+        for slot in self.slots:
+            connections, requests, updated = self.readStats(slot.index)
+            if slot.pid is not None:
+                totalConnections += connections
+                totalRequests += requests
+            workers.append({"index": slot.index, "pid": slot.pid, "restarts": slot.restarts,
+                            "connections": connections if slot.pid is not None else 0,
+                            "requests": requests if slot.pid is not None else 0})
+        return {"connections": totalConnections, "requests": totalRequests, "restarts": self.countRestarts,
+                "workers": workers}
@@ -9,28 +9,95 @@
 # All Code was generated by me with the help of the Class modules and,
 # our class book "Networking A Top-Down Approach" chapter 2.7 by James F. Kurose & Keith W. Ross
 
+# --mode selectors / asyncio serve many clients at once instead (see concurrent_server.py), with
+# HTTP/1.1 keep-alive and pipelining (see http11.py),
+#   python server.py --mode selectors --workers 8 --backlog 4096
+# Ctrl+C (or SIGTERM) shuts those down gracefully. --root serves the files under a directory instead
+# of the fixed page (see static_files.py),
+#   python server.py --mode selectors --root ./www
+# --processes runs that many copies of the server on the port, 0 for one per core (see prefork.py),
+#   python server.py --mode selectors --processes 0
+
+import argparse
+import signal
 from socket import *
 
-serverPort = 5005                                       # define a port number > 1024
-serverSocket = socket(AF_INET, SOCK_STREAM)             # creates a TCP socket
+from concurrent_server import DEFAULT_BACKLOG, AsyncioServer, SelectorServer, raiseFileLimit
+from http11 import buildResponse
+from prefork import PreforkSupervisor
+from static_files import StaticFileHandler
+
+parser = argparse.ArgumentParser(description="Project1 web server")
+parser.add_argument("--mode", default="blocking", choices=["blocking", "selectors", "asyncio"])
+parser.add_argument("--port", type=int, default=5005)
+parser.add_argument("--backlog", type=int, default=DEFAULT_BACKLOG, help="listen backlog")
+parser.add_argument("--workers", type=int, default=0, help="thread pool size for the handler, 0 runs it inline")
+parser.add_argument("--root", help="serve the files under this directory (selectors and asyncio modes)")
+parser.add_argument("--processes", type=int, default=1, help="worker processes, 0 for one per core")
+args = parser.parse_args()
+if args.root is not None and args.mode == "blocking":
+    parser.error("--root needs --mode selectors or asyncio")
+if args.processes != 1 and args.mode == "blocking":
+    parser.error("--processes needs --mode selectors or asyncio")
+
+serverPort = args.port                                  # define a port number > 1024
+
+body = "<html>Congratulations! You've downloaded the first Wireshark lab file!</html>\r\n".encode()
+
+# Both responses are built once, not on every request. Content-Length lets the client keep the connection.
+keepAliveResponse = buildResponse(200, body)
+closeResponse = buildResponse(200, body, keepAlive=False)
+data = closeResponse.decode()
+
+
+def handleRequest(request):
+    return keepAliveResponse if request.keepAlive else closeResponse
+
+
+if args.mode == "blocking":
+    serverSocket = socket(AF_INET, SOCK_STREAM)         # creates a TCP socket
+
+    serverSocket.bind(('', serverPort))                 # Binds the socket
+    serverSocket.listen(args.backlog)                   # Tells the server socket to start listening for clients.
+
+    while True:
+        connectedSocket, addr = serverSocket.accept()   # Creates a new socket for client communication.
+        print(f"Connected to: {addr}\n")
+
+        request = connectedSocket.recv(1024)            # Reads up to 1024 bytes of data from the client.
+        print(f"Received: {request}\n")
 
-serverSocket.bind(('', serverPort))                     # Binds the socket
-serverSocket.listen()                                   # Tells the server socket to start listening for clients.
+        print("Sending >>>>>>>>>")
+        print(data)                                     # Prints data info to terminal.
 
-data = "HTTP/1.1 200 OK\r\n" \
-       "Content-Type: text/html; charset=UTF-8\r\n\r\n" \
-       "<html>Congratulations! You've downloaded the first Wireshark lab file!</html>\r\n"
+        connectedSocket.send(closeResponse)             # Sends "data" back to the client.
+        print("<<<<<<<<<<")
+        connectedSocket.close()
 
-while True:
-    connectedSocket, addr = serverSocket.accept()       # Creates a new socket for client communication.
-    print(f"Connected to: {addr}\n")
+else:
+    raiseFileLimit()                                    # Every open connection needs a file descriptor.
+    serverClass = SelectorServer if args.mode == "selectors" else AsyncioServer
+    handler = StaticFileHandler(args.root) if args.root is not None else handleRequest
 
-    request = connectedSocket.recv(1024)                # Reads up to 1024 bytes of data from the client.
-    print(f"Received: {request}\n")
+    if args.processes == 1:
+        server = serverClass(handler, '', serverPort, args.backlog, args.workers)
+        signal.signal(signal.SIGINT, lambda signum, frame: server.shutdown())
+        signal.signal(signal.SIGTERM, lambda signum, frame: server.shutdown())
 
-    print("Sending >>>>>>>>>")
-    print(data)                                         # Prints data info to terminal.
+        print(f"Serving on port {serverPort} ({args.mode}, {args.workers} workers)")
+        server.serveForever()
+        print(f"Shut down after {server.countConnections} connections, {server.countRequests} requests")
+    else:
+        supervisor = PreforkSupervisor(
+            lambda sock, reusePort: serverClass(handler, '', serverPort, args.backlog, args.workers, sock=sock,
+                                                reusePort=reusePort),
+            '', serverPort, args.backlog, args.processes or None)
 
-    connectedSocket.send(data.encode())                 # Sends "data" back to the client.
-    print("<<<<<<<<<<")
-    connectedSocket.close()
+        print(f"Serving on port {serverPort} ({args.mode}, {supervisor.processes} processes, "
+              f"{'SO_REUSEPORT' if supervisor.reusePort else 'shared socket'}, {args.workers} workers each)")
+        supervisor.serveForever()
+        stats = supervisor.getStats()
+        print(f"Shut down after {stats['connections']} connections, {stats['requests']} requests, "
+              f"{stats['restarts']} worker restarts")
+        for worker in stats["workers"]:
+            print(f"  worker {worker['index']}: {worker['restarts']} restarts")
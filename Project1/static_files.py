@@ -0,0 +1,244 @@
+# Adam Fitzpatrick
+# static_files.py
+
+# Serves the files under a document root for the concurrent servers. StaticFileHandler(root) is the
+# handler: it takes an HTTPRequest and returns the response.
+
+#   - Small files are answered from an LRU cache of complete, already encoded responses (headers and
+#     body). The cache is bounded in bytes and an entry is dropped as soon as the file's mtime or size
+#     changes, every request still costs one stat().
+#   - Larger files are sent with os.sendfile() straight from the page cache (see FileBody in http11.py).
+#   - ETag / If-None-Match and Last-Modified / If-Modified-Since answer repeat fetches with 304.
+#   - Single Range requests (bytes=first-last, first-, -suffix) get 206, If-Range is honored.
+
+import email.utils
+import mimetypes
+import os
+import threading
+from collections import OrderedDict
+from urllib.parse import unquote, urlsplit
+
+from http11 import FileBody, buildResponse
+
+CACHE_SIZE = 32 * 1024 * 1024           # Bytes of cached responses
+MAX_CACHED_FILE = 256 * 1024            # Bigger files are never cached, they go out with sendfile
+INDEX_FILE = "index.html"
+
+
+class CacheEntry(object):
+    __slots__ = ("path", "mtimeNs", "size", "etag", "lastModified", "contentType", "body", "responses", "cost")
+
+    def __init__(self, path, mtimeNs, size, etag, lastModified, contentType, body):
+        self.path = path
+        self.mtimeNs = mtimeNs
+        self.size = size
+        self.etag = etag
+        self.lastModified = lastModified
+        self.contentType = contentType
+        self.body = body
+        self.responses = {}             # (keepAlive, head only) -> encoded 200 response
+        self.cost = len(body)
+
+
+class StaticFileHandler(object):
+
+    def __init__(self, root, cacheSize=CACHE_SIZE, maxCachedFile=MAX_CACHED_FILE):
+        self.root = os.path.realpath(root)
+        self.cacheSize = cacheSize
+        self.maxCachedFile = maxCachedFile
+        self.cache = OrderedDict()              # real path -> CacheEntry, least recently used first
+        self.cacheUsed = 0
+        self.lock = threading.Lock()            # The handler may run on the servers' thread pool
+        self.countCacheHits = 0
+        self.countCacheMisses = 0
+        self.countSendfile = 0
+        self.countNotModified = 0
+
+    def __call__(self, request):
+        keepAlive = request.keepAlive
+        if request.method not in ("GET", "HEAD"):
+            return buildResponse(405, b"", {"Allow": "GET, HEAD"}, keepAlive)
+        headOnly = request.method == "HEAD"
+
+        path = self.resolve(request.target)
+        if path is None:
+            return buildResponse(404, b"<html>404 Not Found</html>\r\n", keepAlive=keepAlive)
+        try:
+            stat = os.stat(path)
+        except OSError:
+            return buildResponse(404, b"<html>404 Not Found</html>\r\n", keepAlive=keepAlive)
+
+        etag = f'"{stat.st_mtime_ns:x}-{stat.st_size:x}"'
+        if self.isNotModified(request, etag, stat.st_mtime):
+            self.countNotModified += 1
+            return buildResponse(304, b"", {"ETag": etag, "Last-Modified": formatDate(stat.st_mtime)}, keepAlive,
+                                 contentType=None)
+
+        byteRange = self.getRange(request, etag, stat.st_mtime, stat.st_size)
+        if byteRange == "unsatisfiable":
+            return buildResponse(416, b"", {"Content-Range": f"bytes */{stat.st_size}"}, keepAlive)
+
+        if stat.st_size <= self.maxCachedFile:
+            entry = self.getCached(path, stat, etag)
+            if entry is not None:
+                if byteRange is None:
+                    return self.getCachedResponse(entry, keepAlive, headOnly)
+                first, last = byteRange
+                return buildResponse(206, entry.body[first:last + 1], self.getHeaders(entry.etag, entry.lastModified,
+                                     f"bytes {first}-{last}/{entry.size}"), keepAlive, entry.contentType, headOnly)
+
+        # Too big to cache (or it changed while being read), send it from the file.
+        first, last = byteRange if byteRange is not None else (0, stat.st_size - 1)
+        headers = self.getHeaders(etag, formatDate(stat.st_mtime),
+                                  f"bytes {first}-{last}/{stat.st_size}" if byteRange is not None else None)
+        file = None
+        if not headOnly:
+            try:
+                file = open(path, "rb")
+            except OSError:
+                return buildResponse(404, b"<html>404 Not Found</html>\r\n", keepAlive=keepAlive)
+            self.countSendfile += 1
+        return buildResponse(206 if byteRange else 200, FileBody(file, first, last + 1 - first), headers, keepAlive,
+                             getContentType(path), headOnly)
+
+    # ################################################################################################ #
+    # resolve()                                                                                        #
+    #                                                                                                  #
+    # The real path of the file the target names, None when it's outside the root or not a file.      #
+    # Directories are served by their index.html.                                                      #
+    # ################################################################################################ #
+    def resolve(self, target):
+        path = unquote(urlsplit(target).path)
+        if "\0" in path:
+            return None
+        path = os.path.realpath(os.path.join(self.root, path.lstrip("/")))
+        if path != self.root and not path.startswith(self.root + os.sep):
+            return None
+        if os.path.isdir(path):
+            path = os.path.join(path, INDEX_FILE)
+        return path if os.path.isfile(path) else None
+
+    def isNotModified(self, request, etag, mtime):
+        ifNoneMatch = request.getHeader("if-none-match")
+        if ifNoneMatch is not None:
+            # If-None-Match wins over If-Modified-Since, weak comparison.
+            tags = [tag.strip().removeprefix("W/") for tag in ifNoneMatch.split(",")]
+            return "*" in tags or etag in tags
+
+        ifModifiedSince = request.getHeader("if-modified-since")
+        if ifModifiedSince is None:
+            return False
+        since = parseDate(ifModifiedSince)
+        return since is not None and int(mtime) <= since
+
+    # (first, last) inclusive for a satisfiable single range, None to send the whole file.
+    def getRange(self, request, etag, mtime, size):
+        header = request.getHeader("range")
+        if header is None or not header.startswith("bytes=") or "," in header:
+            return None                         # Multiple ranges aren't supported, the whole file is a valid answer
+
+        ifRange = request.getHeader("if-range")
+        if ifRange is not None:
+            if ifRange.startswith('"') or ifRange.startswith("W/"):
+                if ifRange != etag:
+                    return None
+            elif parseDate(ifRange) != int(mtime):
+                return None
+
+        first, separator, last = header[len("bytes="):].strip().partition("-")
+        if not separator or not (first or last) or not all(part.isdigit() for part in (first, last) if part):
+            return None
+        if not first:
+            suffix = int(last)
+            if suffix == 0 or size == 0:
+                return "unsatisfiable"
+            return max(0, size - suffix), size - 1
+        first = int(first)
+        if last and int(last) < first:
+            return None                         # Invalid, ignored
+        if first >= size:
+            return "unsatisfiable"
+        return first, min(int(last), size - 1) if last else size - 1
+
+    def getHeaders(self, etag, lastModified, contentRange=None):
+        headers = {"ETag": etag, "Last-Modified": lastModified, "Accept-Ranges": "bytes"}
+        if contentRange is not None:
+            headers["Content-Range"] = contentRange
+        return headers
+
+    # ################################################################################################ #
+    # getCached()                                                                                      #
+    #                                                                                                  #
+    # The cache entry for path, read into the cache when missing or stale. None when the file changed  #
+    # while it was read.                                                                               #
+    # ################################################################################################ #
+    def getCached(self, path, stat, etag):
+        with self.lock:
+            entry = self.cache.get(path)
+            if entry is not None:
+                if entry.mtimeNs == stat.st_mtime_ns and entry.size == stat.st_size:
+                    self.cache.move_to_end(path)
+                    self.countCacheHits += 1
+                    return entry
+                self.evict(path)
+
+        self.countCacheMisses += 1
+        try:
+            with open(path, "rb") as file:
+                body = file.read(self.maxCachedFile + 1)
+        except OSError:
+            return None
+        if len(body) != stat.st_size:
+            return None
+
+        entry = CacheEntry(path, stat.st_mtime_ns, stat.st_size, etag, formatDate(stat.st_mtime), getContentType(path), body)
+        with self.lock:
+            if path in self.cache:
+                self.evict(path)
+            self.cache[path] = entry
+            self.cacheUsed += entry.cost
+            self.shrink()
+        return entry
+
+    def getCachedResponse(self, entry, keepAlive, headOnly):
+        key = (keepAlive, headOnly)
+        response = entry.responses.get(key)
+        if response is None:
+            response = buildResponse(200, entry.body, self.getHeaders(entry.etag, entry.lastModified), keepAlive,
+                                     entry.contentType, headOnly)
+            with self.lock:
+                if key not in entry.responses:
+                    entry.responses[key] = response
+                    entry.cost += len(response)
+                    if self.cache.get(entry.path) is entry:
+                        self.cacheUsed += len(response)
+                        self.shrink()
+        return response
+
+    def evict(self, path):
+        entry = self.cache.pop(path)
+        self.cacheUsed -= entry.cost
+
+    # Drops least recently used entries until the cache fits, called with the lock held.
+    def shrink(self):
+        while self.cacheUsed > self.cacheSize and self.cache:
+            self.evict(next(iter(self.cache)))
+
+
+def getContentType(path):
+    contentType, encoding = mimetypes.guess_type(path)
+    if contentType is None or encoding is not None:
+        return "application/octet-stream"
+    if contentType.startswith("text/") or contentType in ("application/javascript", "application/json"):
+        return contentType + "; charset=UTF-8"
+    return contentType
+
+
+def formatDate(timestamp):
+    return email.utils.formatdate(timestamp, usegmt=True)
+
+
+# Seconds since the epoch for an HTTP date, None when it can't be parsed.
+def parseDate(value):
+    parsed = email.utils.parsedate_tz(value)
+    return email.utils.mktime_tz(parsed) if parsed is not None else None
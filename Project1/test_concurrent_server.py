@@ -0,0 +1,73 @@
+import re
+import socket
+import threading
+
+import pytest
+
+from concurrent_server import AsyncioServer, SelectorServer
+from http11 import HTTPError, RequestParser, buildResponse
+
+PIPELINED = b"GET /a HTTP/1.1\r\nHost: x\r\n\r\nGET /b HTTP/1.1\r\nHost: x\r\n\r\nGARBAGE\r\n\r\n"
+
+
+def handler(request):
+    return buildResponse(200, request.target.encode(), keepAlive=request.keepAlive)
+
+
+def startSelectorServer():
+    server = SelectorServer(handler, host="127.0.0.1", port=0)
+    thread = threading.Thread(target=server.serveForever, daemon=True)
+    thread.start()
+    return server, thread, server.getAddress()
+
+
+def startAsyncioServer():
+    server = AsyncioServer(handler, host="127.0.0.1", port=0)
+    address = []
+    started = threading.Event()
+
+    def onStarted(sockname):
+        address.append(sockname)
+        started.set()
+
+    thread = threading.Thread(target=server.serveForever, args=(onStarted,), daemon=True)
+    thread.start()
+    assert started.wait(5)
+    return server, thread, address[0]
+
+
+@pytest.fixture(params=[startSelectorServer, startAsyncioServer], ids=["selectors", "asyncio"])
+def address(request):
+    server, thread, address = request.param()
+    yield address[:2]
+    server.shutdown()
+    thread.join(5)
+
+
+# Sends data in one write and returns everything the server sends back before it closes.
+def exchange(address, data):
+    with socket.create_connection(address, timeout=5) as sock:
+        sock.sendall(data)
+        received = bytearray()
+        while True:
+            chunk = sock.recv(65536)
+            if not chunk:
+                return bytes(received)
+            received += chunk
+
+
+def test_parser_keeps_requests_before_a_malformed_one():
+    with pytest.raises(HTTPError) as raised:
+        RequestParser().feed(PIPELINED)
+    assert raised.value.status == 400
+    assert [request.target for request in raised.value.requests] == ["/a", "/b"]
+
+
+def test_requests_before_a_malformed_one_are_answered_first(address):
+    received = exchange(address, PIPELINED)
+    assert re.findall(rb"HTTP/1\.1 (\d{3}) ", received) == [b"200", b"200", b"400"]
+    assert received.index(b"\r\n\r\n/a") < received.index(b"\r\n\r\n/b")
+
+
+def test_unknown_http_version_is_rejected(address):
+    assert exchange(address, b"GET / HTTP/1.7\r\nHost: x\r\n\r\n").startswith(b"HTTP/1.1 505 ")
@@ -0,0 +1,105 @@
+import threading
+import time
+
+import pytest
+
+from concurrent_server import SelectorServer
+from http11 import buildResponse
+from http_client import ConnectionPool, HTTPClientError, StaleConnection
+
+CHUNKS = [b"first chunk, ", "ünïcödé split across reads, ".encode() * 50, b"x" * 100000]
+
+
+def handler(request):
+    if request.target == "/chunked":
+        return buildResponse(200, iter(CHUNKS), keepAlive=request.keepAlive)
+    if request.target == "/echo":
+        return buildResponse(200, request.body, keepAlive=request.keepAlive)
+    if request.target == "/bad-chunk":
+        return b"HTTP/1.1 200 OK\r\nTransfer-Encoding: chunked\r\n\r\n-5\r\nhello\r\n0\r\n\r\n"
+    return buildResponse(200, b"hello", keepAlive=request.keepAlive)
+
+
+@pytest.fixture
+def server():
+    server = SelectorServer(handler, host="127.0.0.1", port=0, idleTimeout=0.2)
+    thread = threading.Thread(target=server.serveForever, daemon=True)
+    thread.start()
+    yield server
+    server.shutdown()
+    thread.join(5)
+
+
+def url(server, path="/"):
+    host, port = server.getAddress()
+    return f"http://{host}:{port}{path}"
+
+
+def test_keep_alive_reuses_the_connection(server):
+    pool = ConnectionPool()
+    try:
+        for _ in range(3):
+            response = pool.fetch(url(server))
+            assert response.status == 200 and response.body == b"hello" and response.reusable
+    finally:
+        pool.close()
+    assert pool.countConnects == 1 and pool.countReuses == 2
+    assert server.countConnections == 1 and server.countRequests == 3
+
+
+def test_chunked_body(server):
+    pool = ConnectionPool(bufferSize=1024)
+    try:
+        response = pool.fetch(url(server, "/chunked"))
+        assert response.getHeader("transfer-encoding") == "chunked"
+        assert response.body == b"".join(CHUNKS)
+
+        received = bytearray()
+        response = pool.fetch(url(server, "/chunked"), sink=received.extend)
+        assert response.body is None and bytes(received) == b"".join(CHUNKS)
+    finally:
+        pool.close()
+    assert pool.countReuses == 1
+
+
+def test_bad_chunk_size_is_rejected(server):
+    pool = ConnectionPool()
+    try:
+        with pytest.raises(HTTPClientError):
+            pool.fetch(url(server, "/bad-chunk"))
+    finally:
+        pool.close()
+
+
+# The server times the idle connection out, the next GET finds it closed and is repeated on a new one.
+def test_stale_connection_is_retried(server):
+    pool = ConnectionPool()
+    try:
+        assert pool.fetch(url(server)).reusable
+        waitUntilIdleClosed(server)
+
+        response = pool.fetch(url(server))
+        assert response.status == 200 and response.body == b"hello"
+        assert pool.countReuses == 1 and pool.countConnects == 2
+    finally:
+        pool.close()
+
+
+# A POST might have been acted on, so it isn't repeated.
+def test_stale_connection_is_not_retried_for_post(server):
+    pool = ConnectionPool()
+    try:
+        assert pool.fetch(url(server, "/echo"), method="POST", body=b"once").body == b"once"
+        waitUntilIdleClosed(server)
+
+        with pytest.raises(StaleConnection):
+            pool.fetch(url(server, "/echo"), method="POST", body=b"twice")
+    finally:
+        pool.close()
+
+
+def waitUntilIdleClosed(server, timeout=5.0):
+    deadline = time.monotonic() + timeout
+    while server.connections and time.monotonic() < deadline:
+        time.sleep(0.05)
+    assert not server.connections
@@ -0,0 +1,214 @@
+import math
+from collections import deque
+
+from unreliable import UnreliableChannel
+
+
+# #################################################################################################################### #
+# Channel models                                                                                                       #
+#                                                                                                                      #
+# Description:                                                                                                         #
+# Loss, latency and link models for SeededUnreliableChannel, so one channel can be bursty or slow while the other     #
+# stays clean:                                                                                                         #
+#                                                                                                                      #
+#     BernoulliLoss       - independent loss at a fixed ratio, UnreliableChannel's behavior                           #
+#     GilbertElliottLoss  - two state (good/bad) Markov chain, losses come in bursts                                  #
+#     BernoulliLatency    - a fixed share of segments held for a fixed number of iterations, UnreliableChannel's     #
+#     JitterLatency       - every segment delayed by base plus a random uniform, normal or exponential jitter         #
+#     TraceReplay         - loss and delay per segment read from a trace file, use it as both loss and latency model  #
+#     LinkLimit           - at most rate segments delivered per iteration, a bounded queue that tail drops            #
+#                                                                                                                      #
+# Notes:                                                                                                               #
+# Models don't own a generator. Every loss and latency model says how many uniform [0, 1) draws it needs per segment   #
+# (DRAWS) and takes them from the iterator the channel hands it, that keeps the channel's per-tick batch and its seed. #
+# Delays are in iterations, 0 delivers on the iteration the segment was sent like an undelayed segment does now.      #
+#                                                                                                                      #
+# #################################################################################################################### #
+
+
+class BernoulliLoss(object):
+    DRAWS = 1
+
+    def __init__(self, ratio=UnreliableChannel.RATIO_DROPPED_PACKETS):
+        self.ratio = ratio
+
+    def isLost(self, draws):
+        return next(draws) <= self.ratio
+
+
+class GilbertElliottLoss(object):
+    DRAWS = 2
+
+    # pGoodToBad / pBadToGood are per segment transition probabilities, lossGood / lossBad the loss ratio in each state.
+    def __init__(self, pGoodToBad, pBadToGood, lossGood=0.0, lossBad=1.0):
+        if not 0 < pBadToGood <= 1:
+            raise ValueError(f"pBadToGood must be in (0, 1], got {pBadToGood}")
+        self.pGoodToBad = pGoodToBad
+        self.pBadToGood = pBadToGood
+        self.lossGood = lossGood
+        self.lossBad = lossBad
+        self.bad = False
+        self.countBursts = 0
+
+    # ################################################################################################################ #
+    # fromBurst()                                                                                                      #
+    #                                                                                                                  #
+    # Description:                                                                                                     #
+    # The classic Gilbert model (nothing lost in the good state, everything in the bad one) with the given long run   #
+    # loss ratio and mean burst length in segments                                                                     #
+    # ################################################################################################################ #
+    @classmethod
+    def fromBurst(cls, lossRatio, meanBurstLength):
+        if not 0 <= lossRatio < 1 or meanBurstLength < 1:
+            raise ValueError(f"Need 0 <= lossRatio < 1 and meanBurstLength >= 1, got {lossRatio}, {meanBurstLength}")
+        pBadToGood = 1 / meanBurstLength
+        return cls(lossRatio * pBadToGood / (1 - lossRatio), pBadToGood)
+
+    def isLost(self, draws):
+        transition = next(draws)
+        if self.bad:
+            self.bad = transition > self.pBadToGood
+        elif transition <= self.pGoodToBad:
+            self.bad = True
+            self.countBursts += 1
+        return next(draws) < (self.lossBad if self.bad else self.lossGood)
+
+
+class BernoulliLatency(object):
+    DRAWS = 1
+
+    def __init__(self, ratio=UnreliableChannel.RATIO_DELAYED_PACKETS,
+                 iterations=UnreliableChannel.ITERATIONS_TO_DELAY_PACKETS):
+        self.ratio = ratio
+        self.iterations = iterations
+
+    def getDelay(self, draws):
+        return self.iterations if next(draws) <= self.ratio else 0
+
+
+class JitterLatency(object):
+    DISTRIBUTION_UNIFORM = "uniform"            # base + [0, jitter]
+    DISTRIBUTION_NORMAL = "normal"              # base + |N(0, jitter)|
+    DISTRIBUTION_EXPONENTIAL = "exponential"    # base + Exp(mean jitter)
+    DISTRIBUTION_DRAWS = {DISTRIBUTION_UNIFORM: 1, DISTRIBUTION_NORMAL: 2, DISTRIBUTION_EXPONENTIAL: 1}
+
+    def __init__(self, base=0, jitter=2, distribution=DISTRIBUTION_UNIFORM):
+        if distribution not in JitterLatency.DISTRIBUTION_DRAWS:
+            raise ValueError(f"Unknown jitter distribution: {distribution}")
+        self.base = base
+        self.jitter = jitter
+        self.distribution = distribution
+        self.DRAWS = JitterLatency.DISTRIBUTION_DRAWS[distribution]
+
+    def getDelay(self, draws):
+        u = next(draws)
+        if self.distribution == JitterLatency.DISTRIBUTION_UNIFORM:
+            jitter = u * (self.jitter + 1)
+        elif self.distribution == JitterLatency.DISTRIBUTION_EXPONENTIAL:
+            jitter = -math.log(1.0 - u) * self.jitter
+        else:
+            # Box-Muller, folded so jitter only ever adds delay
+            jitter = abs(math.sqrt(-2.0 * math.log(1.0 - u)) * math.cos(2.0 * math.pi * next(draws))) * self.jitter
+        return self.base + int(jitter)
+
+
+# #################################################################################################################### #
+# TraceReplay                                                                                                          #
+#                                                                                                                      #
+# Description:                                                                                                         #
+# Replays a recorded trace, one line per segment in the order they were sent:                                          #
+#                                                                                                                      #
+#     3          delivered after 3 iterations                                                                          #
+#     0          delivered right away                                                                                  #
+#     drop       lost                                                                                                  #
+#                                                                                                                      #
+# Blank lines and # comments are skipped. The trace starts over when it runs out unless loop is False, after which    #
+# every segment is delivered right away.                                                                               #
+#                                                                                                                      #
+# Notes:                                                                                                               #
+# isLost() moves to the next line and getDelay() reads the same one, so pass the same TraceReplay as the channel's    #
+# loss and latency model.                                                                                              #
+#                                                                                                                      #
+# #################################################################################################################### #
+
+
+class TraceReplay(object):
+    DRAWS = 0
+    DROP = "drop"
+
+    def __init__(self, trace, loop=True):
+        self.records = loadTrace(trace) if isinstance(trace, str) else list(trace)
+        self.loop = loop
+        self.position = 0
+        self.current = 0
+
+    def isLost(self, draws):
+        if self.position == len(self.records):
+            if not self.loop or not self.records:
+                self.current = 0
+                return False
+            self.position = 0
+        self.current = self.records[self.position]
+        self.position += 1
+        return self.current is None
+
+    def getDelay(self, draws):
+        return self.current or 0
+
+
+# Reads a trace file into a list of delays, None for a lost segment.
+def loadTrace(path):
+    records = []
+    with open(path) as trace:
+        for lineNumber, line in enumerate(trace, 1):
+            line = line.split("#", 1)[0].strip()
+            if not line:
+                continue
+            if line.lower() == TraceReplay.DROP:
+                records.append(None)
+                continue
+            try:
+                records.append(int(line))
+            except ValueError:
+                raise ValueError(f"{path}:{lineNumber}: expected a delay or '{TraceReplay.DROP}', got {line!r}")
+    return records
+
+
+# #################################################################################################################### #
+# LinkLimit                                                                                                            #
+#                                                                                                                      #
+# Description:                                                                                                         #
+# Bandwidth and buffer limit at the far end of the channel. Segments that are ready to be delivered wait in a FIFO of  #
+# at most capacity segments and rate of them are delivered per iteration, anything arriving at a full queue is        #
+# dropped.                                                                                                             #
+#                                                                                                                      #
+# #################################################################################################################### #
+
+
+class LinkLimit(object):
+
+    def __init__(self, rate, capacity):
+        if rate < 1 or capacity < 1:
+            raise ValueError(f"Need rate >= 1 and capacity >= 1, got {rate}, {capacity}")
+        self.rate = rate
+        self.capacity = capacity
+        self.queue = deque()
+        self.countQueueDrops = 0
+        self.maxQueueDepth = 0
+
+    def __len__(self):
+        return len(self.queue)
+
+    # False when the queue is full and seg was dropped
+    def offer(self, seg):
+        if len(self.queue) >= self.capacity:
+            self.countQueueDrops += 1
+            return False
+        self.queue.append(seg)
+        self.maxQueueDepth = max(self.maxQueueDepth, len(self.queue))
+        return True
+
+    # Segments delivered this iteration
+    def drain(self):
+        count = min(self.rate, len(self.queue))
+        return [self.queue.popleft() for _ in range(count)]
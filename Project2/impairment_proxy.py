@@ -0,0 +1,209 @@
+import argparse
+import heapq
+import random
+import selectors
+import signal
+import socket
+import time
+
+from rdt_wire import FLAG_ACK, FLAG_STREAM, HEADER, STREAM_ID
+from unreliable import UnreliableChannel
+
+
+# #################################################################################################################### #
+# ImpairmentProxy                                                                                                      #
+#                                                                                                                      #
+# Description:                                                                                                         #
+# Standalone UDP proxy that sits between a client and a server speaking the rdt_wire format and applies the same       #
+# impairments as UnreliableChannel, with the same default ratios: reordering (a batch is reversed), delay, drop and    #
+# payload corruption of data segments. Delays are in milliseconds instead of iterations.                               #
+#                                                                                                                      #
+#     client  --->  listen port  [proxy]  upstream socket  --->  server                                               #
+#     client  <---  listen port  [proxy]  upstream socket  <---  server                                               #
+#                                                                                                                      #
+# Notes:                                                                                                               #
+# Run it as its own process, e.g.                                                                                      #
+#     python impairment_proxy.py --listen-port 6000 --server-port 6001 --seed 1                                        #
+#                                                                                                                      #
+# #################################################################################################################### #
+
+
+class ImpairmentProxy(object):
+
+    def __init__(self, listenAddress, serverAddress,
+                 dropRatio=UnreliableChannel.RATIO_DROPPED_PACKETS,
+                 delayRatio=UnreliableChannel.RATIO_DELAYED_PACKETS,
+                 errorRatio=UnreliableChannel.RATIO_DATA_ERROR_PACKETS,
+                 outOfOrderRatio=UnreliableChannel.RATIO_OUT_OF_ORDER_PACKETS,
+                 delaySeconds=0.005, seed=None):
+        self.serverAddress = serverAddress
+        self.clientAddress = None                       # Learned from the first datagram the client sends
+        self.dropRatio = dropRatio
+        self.delayRatio = delayRatio
+        self.errorRatio = errorRatio
+        self.outOfOrderRatio = outOfOrderRatio
+        self.delaySeconds = delaySeconds
+        self.random = random.Random(seed)
+        self.delayed = []                               # (release time, order, direction, datagram)
+        self.countDelayedOrder = 0
+
+        self.clientSide = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
+        self.clientSide.bind(listenAddress)
+        self.clientSide.setblocking(False)
+        self.serverSide = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
+        self.serverSide.bind((listenAddress[0], 0))
+        self.serverSide.setblocking(False)
+
+        self.selector = selectors.DefaultSelector()
+        self.selector.register(self.clientSide, selectors.EVENT_READ, "toServer")
+        self.selector.register(self.serverSide, selectors.EVENT_READ, "toClient")
+
+        # stats per direction, named like UnreliableChannel's
+        self.stats = {direction: {
+            "countTotalDataPackets": 0,
+            "countSentPackets": 0,
+            "countChecksumErrorPackets": 0,
+            "countDroppedPackets": 0,
+            "countDelayedPackets": 0,
+            "countOutOfOrderPackets": 0,
+            "countAckPackets": 0,
+        } for direction in ("toServer", "toClient")}
+
+    # ################################################################################################################ #
+    # run()                                                                                                            #
+    #                                                                                                                  #
+    # Description:                                                                                                     #
+    # Forwards datagrams until duration seconds have passed (forever when None)                                        #
+    #                                                                                                                  #
+    # ################################################################################################################ #
+    def run(self, duration=None):
+        end = None if duration is None else time.monotonic() + duration
+        while end is None or time.monotonic() < end:
+            timeout = 0.5
+            if self.delayed:
+                timeout = max(0.0, self.delayed[0][0] - time.monotonic())
+
+            for key, mask in self.selector.select(timeout):
+                self.processBatch(key.data, self.drain(key.fileobj, key.data))
+
+            self.releaseDelayed()
+
+    def drain(self, sock, direction):
+        batch = []
+        while True:
+            try:
+                datagram, address = sock.recvfrom(65535)
+            except (BlockingIOError, ConnectionRefusedError):
+                return batch
+            if direction == "toServer":
+                self.clientAddress = address
+            batch.append(datagram)
+
+    # ################################################################################################################ #
+    # processBatch()                                                                                                   #
+    #                                                                                                                  #
+    # Description:                                                                                                     #
+    # Impairs one batch of datagrams the same way UnreliableChannel.processData() impairs one iteration's sendQueue    #
+    #                                                                                                                  #
+    # ################################################################################################################ #
+    def processBatch(self, direction, batch):
+        stats = self.stats[direction]
+        if direction == "toServer":
+            sock, address = self.serverSide, self.serverAddress
+        else:
+            sock, address = self.clientSide, self.clientAddress
+        if address is None:
+            return
+
+        if len(batch) > 1 and self.random.random() <= self.outOfOrderRatio:
+            stats["countOutOfOrderPackets"] += 1
+            batch.reverse()
+
+        for datagram in batch:
+            if self.random.random() <= self.delayRatio:
+                stats["countDelayedPackets"] += 1
+                self.countDelayedOrder += 1
+                heapq.heappush(self.delayed, (time.monotonic() + self.delaySeconds, self.countDelayedOrder,
+                                              direction, datagram))
+                continue
+
+            flags = HEADER.unpack_from(datagram)[3] if len(datagram) >= HEADER.size else FLAG_ACK
+            isAck = flags & FLAG_ACK
+            if isAck:
+                stats["countAckPackets"] += 1
+            else:
+                stats["countTotalDataPackets"] += 1
+
+                # only data packets can have checksum errors...
+                payloadOffset = HEADER.size + (STREAM_ID.size if flags & FLAG_STREAM else 0)
+                if len(datagram) > payloadOffset and self.random.random() <= self.errorRatio:
+                    stats["countChecksumErrorPackets"] += 1
+                    datagram = self.corrupt(datagram, payloadOffset)
+
+            if self.random.random() <= self.dropRatio:
+                stats["countDroppedPackets"] += 1
+                continue
+
+            self.forward(direction, sock, datagram, address)
+
+    def corrupt(self, datagram, payloadOffset):
+        position = self.random.randrange(payloadOffset, len(datagram))
+        return datagram[:position] + b"X" + datagram[position + 1:]
+
+    def releaseDelayed(self):
+        now = time.monotonic()
+        while self.delayed and self.delayed[0][0] <= now:
+            releaseTime, order, direction, datagram = heapq.heappop(self.delayed)
+            if direction == "toServer":
+                self.forward(direction, self.serverSide, datagram, self.serverAddress)
+            elif self.clientAddress is not None:
+                self.forward(direction, self.clientSide, datagram, self.clientAddress)
+
+    def forward(self, direction, sock, datagram, address):
+        try:
+            sock.sendto(datagram, address)
+        except (BlockingIOError, ConnectionRefusedError):
+            self.stats[direction]["countDroppedPackets"] += 1
+            return
+        self.stats[direction]["countSentPackets"] += 1
+
+    def close(self):
+        self.selector.close()
+        self.clientSide.close()
+        self.serverSide.close()
+
+
+def main():
+    parser = argparse.ArgumentParser(description="UDP proxy applying UnreliableChannel style impairments")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--listen-port", type=int, default=6000)
+    parser.add_argument("--server-port", type=int, default=6001)
+    parser.add_argument("--drop", type=float, default=UnreliableChannel.RATIO_DROPPED_PACKETS)
+    parser.add_argument("--delay", type=float, default=UnreliableChannel.RATIO_DELAYED_PACKETS)
+    parser.add_argument("--error", type=float, default=UnreliableChannel.RATIO_DATA_ERROR_PACKETS)
+    parser.add_argument("--out-of-order", type=float, default=UnreliableChannel.RATIO_OUT_OF_ORDER_PACKETS)
+    parser.add_argument("--delay-ms", type=float, default=5.0)
+    parser.add_argument("--duration", type=float, default=None, help="seconds to run, forever by default")
+    parser.add_argument("--seed", type=int, default=None)
+    args = parser.parse_args()
+
+    proxy = ImpairmentProxy((args.host, args.listen_port), (args.host, args.server_port),
+                            args.drop, args.delay, args.error, args.out_of_order, args.delay_ms / 1000, args.seed)
+    print(f"Proxying {args.host}:{args.listen_port} -> {args.host}:{args.server_port}", flush=True)
+    signal.signal(signal.SIGTERM, stopOnSignal)     # udp_main.py terminates it, the stats still get printed
+    try:
+        proxy.run(args.duration)
+    except KeyboardInterrupt:
+        pass
+    finally:
+        proxy.close()
+        for direction, stats in proxy.stats.items():
+            print(direction, stats)
+
+
+def stopOnSignal(signum, frame):
+    raise KeyboardInterrupt
+
+
+if __name__ == "__main__":
+    main()
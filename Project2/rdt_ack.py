@@ -0,0 +1,90 @@
+# #################################################################################################################### #
+# Ack policies                                                                                                         #
+#                                                                                                                      #
+# Description:                                                                                                         #
+# Decide when the receiving RDT layer sends its cumulative ack. The layer reports every data segment it handles and    #
+# whether it arrived in order, the policy answers whether an ack has to go out now and, for the acks it holds back,    #
+# when they are due.                                                                                                   #
+#                                                                                                                      #
+#     ImmediateAck - an ack for every data segment, the original behavior                                              #
+#     DelayedAck   - TCP style delayed ack, every Nth in-order segment or once the oldest unacked one has waited K     #
+#                    iterations                                                                                        #
+#     CoalescedAck - one cumulative ack per tick for all the in-order segments that arrived in it                      #
+#                                                                                                                      #
+# Notes:                                                                                                               #
+# Whatever the policy, a segment that shows a gap (out of order, corrupt, outside the window) or fills one is acked    #
+# right away. Those duplicate and selective acks drive fast retransmit and selective repeat, holding them back would   #
+# slow down recovery, and the held back policies ack the in-order segments that follow one by one too (quick acks).    #
+# Any ack that does go out is cumulative and covers everything held back so far.                                       #
+#                                                                                                                      #
+# Any object with onSegment(), onAckSent(), flush() and getDeadline() can be handed to RDTLayer.setAckPolicy().        #
+#                                                                                                                      #
+# #################################################################################################################### #
+
+
+class ImmediateAck(object):
+
+    def onSegment(self, inOrder, iteration):
+        return True
+
+    def onAckSent(self):
+        pass
+
+    def flush(self, iteration):
+        return False
+
+    def getDeadline(self):
+        return None
+
+
+class DelayedAck(object):
+    EVERY = 2                   # Ack at least every second in-order segment, as RFC 5681 asks of TCP
+    MAX_DELAY = 2               # in iterations, keep it well under the sender's minimum RTO
+    QUICK_ACKS = 4             # In-order segments acked right away after a gap
+
+    def __init__(self, every=EVERY, maxDelay=MAX_DELAY, quickAcks=QUICK_ACKS):
+        self.every = every
+        self.maxDelay = maxDelay
+        self.quickAcks = quickAcks
+        self.quickAcksLeft = 0
+        self.pending = 0                # In-order segments not acked yet
+        self.firstPending = None        # Iteration the oldest of them arrived on
+
+    # ################################################################################################################ #
+    # onSegment()                                                                                                      #
+    #                                                                                                                  #
+    # Description:                                                                                                     #
+    # After a gap the reverse path is likely losing segments too, one held back ack then stands for several and       #
+    # losing it stalls the sender until its timers expire. Like Linux's quick ack mode the next quickAcks in-order     #
+    # segments are acked one by one while the loss is being recovered.                                                 #
+    # ################################################################################################################ #
+    def onSegment(self, inOrder, iteration):
+        if not inOrder:
+            self.quickAcksLeft = self.quickAcks
+            return True
+        if self.quickAcksLeft > 0:
+            self.quickAcksLeft -= 1
+            return True
+        self.pending += 1
+        if self.firstPending is None:
+            self.firstPending = iteration
+        return self.every is not None and self.pending >= self.every
+
+    def onAckSent(self):
+        self.pending = 0
+        self.firstPending = None
+
+    # Called at the end of every receive pass, sends the held back ack once it's due.
+    def flush(self, iteration):
+        return self.pending > 0 and iteration - self.firstPending >= self.maxDelay
+
+    # Iteration the held back ack is due on, so an event driven caller wakes up for it.
+    def getDeadline(self):
+        return self.firstPending + self.maxDelay if self.pending else None
+
+
+# One ack at the end of the receive pass for all the in-order segments that arrived in it.
+class CoalescedAck(DelayedAck):
+
+    def __init__(self, quickAcks=DelayedAck.QUICK_ACKS):
+        super().__init__(None, 0, quickAcks)
@@ -0,0 +1,272 @@
+import argparse
+import asyncio
+import random
+import selectors
+import time
+
+from rdt_layer import RDTLayer
+from unreliable import UnreliableChannel
+
+
+# #################################################################################################################### #
+# asyncio RDT runtime                                                                                                  #
+#                                                                                                                      #
+# Description:                                                                                                         #
+# Runs RDT endpoints and channels as asyncio tasks instead of the lock-step processData() loop in rdt_main.py.        #
+# Segments are delivered as soon as their channel latency has passed and an endpoint wakes up either when something    #
+# arrives or when its earliest retransmission timer expires. Many transfers can share one event loop.                  #
+#                                                                                                                      #
+#     VirtualTimeEventLoop   - event loop whose clock jumps straight to the next scheduled callback, deterministic    #
+#                              with a seed and as fast as the CPU allows                                              #
+#     AsyncUnreliableChannel - UnreliableChannel's impairments applied per segment as it is sent                       #
+#     RDTEndpoint            - drives one RDTLayer                                                                     #
+#                                                                                                                      #
+# Notes:                                                                                                               #
+# Time is measured in iterations so RDTLayer's timers and RTO estimate keep their meaning, one iteration is            #
+# tickSeconds of loop time. rdt_main.py is still the deterministic tick-based mode.                                   #
+#                                                                                                                      #
+# #################################################################################################################### #
+
+
+class VirtualSelector(selectors.DefaultSelector):
+
+    def __init__(self):
+        super().__init__()
+        self.loop = None
+
+    # Nothing is ready, so instead of sleeping move the loop's clock forward to the next timer.
+    def select(self, timeout=None):
+        events = super().select(0)
+        if events or timeout == 0:
+            return events
+        if timeout is None:
+            return super().select(None)         # Nothing scheduled, only real I/O can wake the loop
+        self.loop.virtualTime += timeout
+        return []
+
+
+class VirtualTimeEventLoop(asyncio.SelectorEventLoop):
+
+    def __init__(self):
+        selector = VirtualSelector()
+        super().__init__(selector)
+        selector.loop = self
+        self.virtualTime = 0.0
+
+    def time(self):
+        return self.virtualTime
+
+
+class AsyncUnreliableChannel(object):
+
+    def __init__(self, canDeliverOutOfOrder_, canDropPackets_, canDelayPackets_, canHaveChecksumErrors_,
+                 tickSeconds, latencyIterations=0.5, rng=None):
+        self.canDeliverOutOfOrder = canDeliverOutOfOrder_
+        self.canDropPackets = canDropPackets_
+        self.canDelayPackets = canDelayPackets_
+        self.canHaveChecksumErrors = canHaveChecksumErrors_
+        self.tickSeconds = tickSeconds
+        self.latency = latencyIterations * tickSeconds
+        self.random = rng if rng is not None else random.Random()
+        self.sendQueue = asyncio.Queue()
+        self.receiveQueue = []
+        self.arrived = asyncio.Event()
+        # stats
+        self.countTotalDataPackets = 0
+        self.countSentPackets = 0
+        self.countChecksumErrorPackets = 0
+        self.countDroppedPackets = 0
+        self.countDelayedPackets = 0
+        self.countOutOfOrderPackets = 0
+        self.countAckPackets = 0
+
+    def send(self, seg):
+        self.sendQueue.put_nowait(seg)
+
+    def receive(self):
+        new_list = self.receiveQueue
+        self.receiveQueue = []
+        return new_list
+
+    # ################################################################################################################ #
+    # run()                                                                                                            #
+    #                                                                                                                  #
+    # Description:                                                                                                     #
+    # Channel task, impairs each segment as it is sent and schedules its delivery                                      #
+    #                                                                                                                  #
+    # ################################################################################################################ #
+    async def run(self):
+        loop = asyncio.get_running_loop()
+        while True:
+            seg = await self.sendQueue.get()
+            latency = self.latency
+
+            if self.canDelayPackets and self.random.random() <= UnreliableChannel.RATIO_DELAYED_PACKETS:
+                self.countDelayedPackets += 1
+                latency += UnreliableChannel.ITERATIONS_TO_DELAY_PACKETS * self.tickSeconds
+
+            # A late segment lets the ones sent after it overtake it.
+            elif self.canDeliverOutOfOrder and self.random.random() <= UnreliableChannel.RATIO_OUT_OF_ORDER_PACKETS:
+                self.countOutOfOrderPackets += 1
+                latency += self.tickSeconds
+
+            if seg.acknum == -1:
+                self.countTotalDataPackets += 1
+                # only data packets can have checksum errors...
+                if self.canHaveChecksumErrors and self.random.random() <= UnreliableChannel.RATIO_DATA_ERROR_PACKETS:
+                    seg.createChecksumError()
+                    self.countChecksumErrorPackets += 1
+            else:
+                self.countAckPackets += 1
+
+            if self.canDropPackets and self.random.random() <= UnreliableChannel.RATIO_DROPPED_PACKETS:
+                self.countDroppedPackets += 1
+                continue
+
+            loop.call_later(latency, self.deliver, seg)
+
+    def deliver(self, seg):
+        self.countSentPackets += 1
+        self.receiveQueue.append(seg)
+        self.arrived.set()
+
+
+class RDTEndpoint(object):
+
+    def __init__(self, layer, receiveChannel, tickSeconds):
+        self.layer = layer
+        self.receiveChannel = receiveChannel
+        self.tickSeconds = tickSeconds
+        self.processCalls = 0
+
+    def now(self):
+        return asyncio.get_running_loop().time() / self.tickSeconds
+
+    # ################################################################################################################ #
+    # run()                                                                                                            #
+    #                                                                                                                  #
+    # Description:                                                                                                     #
+    # Endpoint task, processes the layer whenever a segment arrives or a retransmission timer is due. done() is      #
+    # checked after every pass and ends the task when it returns True.                                                 #
+    # ################################################################################################################ #
+    async def run(self, done=None):
+        while True:
+            self.receiveChannel.arrived.clear()
+            self.layer.processEvents(self.now())
+            self.processCalls += 1
+            if done is not None and done():
+                return
+
+            timeout = None
+            deadline = self.layer.getNextDeadline()
+            if deadline is not None:
+                timeout = max(0.0, (deadline - self.now()) * self.tickSeconds)
+            # asyncio.timeout() rather than wait_for(), which can swallow a cancel that lands as the timeout fires and
+            # leave the task running after runTransfer() has given up on it.
+            try:
+                async with asyncio.timeout(timeout):
+                    await self.receiveChannel.arrived.wait()
+            except TimeoutError:
+                pass
+
+
+# #################################################################################################################### #
+# runTransfer()                                                                                                        #
+#                                                                                                                      #
+# Description:                                                                                                         #
+# One client -> server transfer on the running loop. Returns the completion time and the usual counters.               #
+#                                                                                                                      #
+# #################################################################################################################### #
+async def runTransfer(dataToSend, tickSeconds=1.0, mode=RDTLayer.MODE_SELECTIVE_REPEAT,
+                      impairments=(True, True, True, True), rng=None):
+    clientToServerChannel = AsyncUnreliableChannel(*impairments, tickSeconds, rng=rng)
+    serverToClientChannel = AsyncUnreliableChannel(*impairments, tickSeconds, rng=rng)
+
+    client = RDTLayer()
+    server = RDTLayer()
+    client.setSendChannel(clientToServerChannel)
+    client.setReceiveChannel(serverToClientChannel)
+    server.setSendChannel(serverToClientChannel)
+    server.setReceiveChannel(clientToServerChannel)
+    for layer in (client, server):
+        layer.setRetransmitMode(mode)
+    client.setDataToSend(dataToSend)
+
+    loop = asyncio.get_running_loop()
+    start = loop.time()
+    clientEndpoint = RDTEndpoint(client, serverToClientChannel, tickSeconds)
+    serverEndpoint = RDTEndpoint(server, clientToServerChannel, tickSeconds)
+    tasks = [asyncio.ensure_future(clientToServerChannel.run()), asyncio.ensure_future(serverToClientChannel.run()),
+             asyncio.ensure_future(clientEndpoint.run())]
+    try:
+        await serverEndpoint.run(lambda: server.isReceiveComplete(len(dataToSend)))
+    finally:
+        for task in tasks:
+            task.cancel()
+        await asyncio.gather(*tasks, return_exceptions=True)
+
+    elapsed = loop.time() - start
+    return {
+        "elapsed": elapsed,
+        "iterations": elapsed / tickSeconds,
+        "correct": server.isReceiveComplete(dataToSend),
+        "countSentPackets": clientToServerChannel.countSentPackets + serverToClientChannel.countSentPackets,
+        "countSegmentTimeouts": client.countSegmentTimeouts,
+        "countFastRetransmits": client.countFastRetransmits,
+        "processCalls": clientEndpoint.processCalls + serverEndpoint.processCalls,
+    }
+
+
+async def runTransfers(payloads, **kwargs):
+    return await asyncio.gather(*(runTransfer(payload, **kwargs) for payload in payloads))
+
+
+# #################################################################################################################### #
+# run()                                                                                                                #
+#                                                                                                                      #
+# Description:                                                                                                         #
+# Runs a coroutine on a VirtualTimeEventLoop (clock="virtual") or a normal asyncio loop (clock="real")                 #
+#                                                                                                                      #
+# #################################################################################################################### #
+def run(coroutine, clock="virtual"):
+    if clock == "real":
+        return asyncio.run(coroutine)
+
+    loop = VirtualTimeEventLoop()
+    try:
+        return loop.run_until_complete(coroutine)
+    finally:
+        loop.close()
+
+
+def main():
+    parser = argparse.ArgumentParser(description="asyncio driven RDT transfers")
+    parser.add_argument("--clock", choices=["virtual", "real"], default="virtual")
+    parser.add_argument("--tick-ms", type=float, default=1.0, help="length of one iteration on the real clock")
+    parser.add_argument("--transfers", type=int, default=1)
+    parser.add_argument("--size", type=int, default=1000, help="characters per transfer")
+    parser.add_argument("--mode", default=RDTLayer.MODE_SELECTIVE_REPEAT,
+                        choices=[RDTLayer.MODE_GO_BACK_N, RDTLayer.MODE_SELECTIVE_REPEAT])
+    parser.add_argument("--seed", type=int, default=None)
+    args = parser.parse_args()
+
+    random.seed(args.seed)                          # Segment.createChecksumError() uses the global generator
+    rng = random.Random(args.seed)
+    tickSeconds = 1.0 if args.clock == "virtual" else args.tick_ms / 1000
+    payload = ("The quick brown fox jumped over the lazy dog. " * (args.size // 46 + 1))[:args.size]
+
+    start = time.perf_counter()
+    results = run(runTransfers([payload] * args.transfers, tickSeconds=tickSeconds, mode=args.mode, rng=rng),
+                  args.clock)
+    wall = time.perf_counter() - start
+
+    iterations = sorted(result["iterations"] for result in results)
+    print("transfers: {0}, all correct: {1}".format(len(results), all(result["correct"] for result in results)))
+    print("completion (iterations): min {0:.1f}, median {1:.1f}, max {2:.1f}".format(
+        iterations[0], iterations[len(iterations) // 2], iterations[-1]))
+    print("countSentPackets: {0}".format(sum(result["countSentPackets"] for result in results)))
+    print("wall clock: {0:.3f} s".format(wall))
+
+
+if __name__ == "__main__":
+    main()
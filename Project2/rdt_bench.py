@@ -0,0 +1,269 @@
+import argparse
+import csv
+import itertools
+import json
+import math
+import os
+import statistics
+import subprocess
+import sys
+import time
+from concurrent.futures import ProcessPoolExecutor
+
+from channel_models import BernoulliLatency, BernoulliLoss, GilbertElliottLoss, JitterLatency
+from rdt_ack import CoalescedAck, DelayedAck, ImmediateAck
+from rdt_compress import DecompressionError
+from rdt_layer import RDTLayer
+from rdt_metrics import RDTMetrics, RDTProfiler
+from rdt_segment import RDTSegment
+from rdt_window import FixedWindow
+from seeded_channel import SeededUnreliableChannel
+
+# #################################################################################################################### #
+# RDT Bench                                                                                                            #
+#                                                                                                                      #
+# Headless version of rdt_main.py for benchmarking. Runs the client -> server transfer over SeededUnreliableChannels   #
+# for every combination of the swept parameters and every seed, trials in parallel on a process pool, and reports     #
+# percentiles of iterations, goodput and retransmission overhead per combination. Results go to CSV (one row per      #
+# trial) and/or JSON (trials, summary and the git commit) so runs can be compared between commits.                    #
+#                                                                                                                      #
+#     python rdt_bench.py --sizes 1000 10000 --data-lengths 4 16 --windows 15 64 --seeds 20 --json bench.json         #
+#     python rdt_bench.py --ratios 0.05 0.1 --loss-model gilbert --burst 4 --csv bench.csv                            #
+#                                                                                                                      #
+# #################################################################################################################### #
+
+SWEPT = ("mode", "ackPolicy", "fecBlock", "compression", "size", "dataLength", "window", "ratio")
+METRICS = ("iterations", "goodput", "retransmitOverhead", "timeouts", "fastRetransmits", "ackPackets", "retransmits",
+           "recovered", "dataPackets")
+ACK_POLICIES = {"immediate": ImmediateAck, "coalesced": CoalescedAck, "delayed": DelayedAck}
+
+
+def makePayload(size):
+    return ("The quick brown fox jumped over the lazy dog. " * (size // 46 + 1))[:size]
+
+
+# --compression-levels values, "off" for no compression.
+def parseCompressionLevel(value):
+    return None if value == "off" else int(value)
+
+
+def makeChannel(trial, seed):
+    ratio = trial["ratio"]
+    if trial["lossModel"] == "gilbert":
+        lossModel = GilbertElliottLoss.fromBurst(ratio, trial["burst"])
+    else:
+        lossModel = BernoulliLoss(ratio)
+    if trial["jitter"]:
+        latencyModel = JitterLatency(0, trial["jitter"], JitterLatency.DISTRIBUTION_EXPONENTIAL)
+    else:
+        latencyModel = BernoulliLatency(ratio)
+    return SeededUnreliableChannel(True, True, True, True, seed=seed, lossModel=lossModel, latencyModel=latencyModel,
+                                   ratioOutOfOrder=ratio, ratioDataErrors=ratio)
+
+
+# #################################################################################################################### #
+# runTrial()                                                                                                           #
+#                                                                                                                      #
+# Description:                                                                                                         #
+# One transfer, trial holds the parameters, returns them with the results. Runs in a pool worker.                     #
+#                                                                                                                      #
+# #################################################################################################################### #
+def runTrial(trial):
+    dataToSend = makePayload(trial["size"])
+    clientToServerChannel = makeChannel(trial, 2 * trial["seed"])
+    serverToClientChannel = makeChannel(trial, 2 * trial["seed"] + 1)
+
+    client = RDTLayer()
+    server = RDTLayer()
+    client.setSendChannel(clientToServerChannel)
+    client.setReceiveChannel(serverToClientChannel)
+    server.setSendChannel(serverToClientChannel)
+    server.setReceiveChannel(clientToServerChannel)
+    for layer in (client, server):
+        layer.setRetransmitMode(trial["mode"])
+        layer.setChecksumAlgorithm(trial["checksum"])
+        layer.setDataLength(trial["dataLength"])
+        layer.setForwardErrorCorrection(trial["fecBlock"])
+    client.setWindowController(FixedWindow(trial["window"]))
+    server.setReceiveWindow(trial["window"])
+    server.setAckPolicy(ACK_POLICIES[trial["ackPolicy"]]())
+    client.setCompression(trial["compression"])
+    client.setDataToSend(dataToSend)
+
+    metrics = None
+    if trial["profile"]:
+        metrics = RDTMetrics(profile=True)
+        client.setInstrumentation(metrics)
+        server.setInstrumentation(metrics)
+
+    loopIter = 0
+    completed = False
+    error = None
+    start = time.perf_counter()
+    while loopIter < trial["maxIterations"]:
+        loopIter += 1
+        client.processData()
+        clientToServerChannel.processData()
+        try:
+            server.processData()
+        except DecompressionError as exception:
+            error = str(exception)
+            break
+        serverToClientChannel.processData()
+        if server.isReceiveComplete(len(dataToSend)):
+            completed = server.isReceiveComplete(dataToSend)
+            break
+    elapsed = time.perf_counter() - start
+
+    # Compressed, the ideal is the segments the compressed payload needs, so the overhead still only counts resends.
+    payloadLength = len(dataToSend) if trial["compression"] is None else client.next_sequence_number
+    idealSegments = max(1, math.ceil(payloadLength / trial["dataLength"]))
+    # The channel counts parity as data, it's reported on its own and the overhead only counts resends.
+    dataSegments = clientToServerChannel.countTotalDataPackets - client.countParitySent
+    result = dict(trial)
+    result.update({
+        "completed": completed,
+        "error": error,
+        "iterations": loopIter,
+        "goodput": server.getReceivedLength() / loopIter,
+        "retransmitOverhead": dataSegments / idealSegments - 1,
+        "timeouts": client.countSegmentTimeouts,
+        "fastRetransmits": client.countFastRetransmits,
+        "retransmits": client.countRetransmits,
+        "recovered": server.countRecoveredSegments,
+        "paritySegments": client.countParitySent,
+        "payloadChars": client.next_sequence_number,
+        "dataPackets": clientToServerChannel.countTotalDataPackets,
+        "ackPackets": serverToClientChannel.countAckPackets,
+        "droppedPackets": clientToServerChannel.countDroppedPackets + serverToClientChannel.countDroppedPackets,
+        "checksumErrorPackets": clientToServerChannel.countChecksumErrorPackets,
+        "seconds": elapsed,
+    })
+    if metrics is not None:
+        metrics.profiler.uninstall()
+        profile = metrics.profiler.getSummary()
+        for stage in (RDTProfiler.STAGE_SEND, RDTProfiler.STAGE_RECEIVE, RDTProfiler.STAGE_CHECKSUM,
+                      RDTProfiler.STAGE_CHANNEL):
+            result[stage + "Seconds"] = profile.get(stage, {}).get("seconds", 0.0)
+    return result
+
+
+# Nearest rank percentile of a sorted list
+def percentile(values, p):
+    return values[max(0, math.ceil(p / 100 * len(values)) - 1)]
+
+
+def summarize(results):
+    groups = {}
+    for result in results:
+        groups.setdefault(tuple(result[key] for key in SWEPT), []).append(result)
+
+    summary = []
+    for key, trials in groups.items():
+        row = dict(zip(SWEPT, key))
+        row["trials"] = len(trials)
+        row["completed"] = sum(trial["completed"] for trial in trials)
+        for metric in METRICS:
+            values = sorted(trial[metric] for trial in trials)
+            row[metric] = {"mean": statistics.fmean(values), "p50": percentile(values, 50),
+                           "p90": percentile(values, 90), "p99": percentile(values, 99), "max": values[-1]}
+        summary.append(row)
+    return summary
+
+
+def gitCommit():
+    try:
+        return subprocess.run(["git", "rev-parse", "HEAD"], capture_output=True, text=True, check=True,
+                              cwd=os.path.dirname(os.path.abspath(__file__))).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Headless RDT benchmark sweeps")
+    parser.add_argument("--modes", nargs="+", default=[RDTLayer.MODE_SELECTIVE_REPEAT],
+                        choices=[RDTLayer.MODE_GO_BACK_N, RDTLayer.MODE_SELECTIVE_REPEAT])
+    parser.add_argument("--ack-policies", nargs="+", default=["immediate"], choices=list(ACK_POLICIES),
+                        help="when the server acks, see rdt_ack.py")
+    parser.add_argument("--fec-blocks", nargs="+", type=int, default=[0],
+                        help="data segments per XOR parity segment, 0 for no FEC")
+    parser.add_argument("--compression-levels", nargs="+", type=parseCompressionLevel, default=[None],
+                        help="zlib levels the payload is compressed with before segmentation, or off")
+    parser.add_argument("--sizes", nargs="+", type=int, default=[1000], help="payload sizes in characters")
+    parser.add_argument("--data-lengths", nargs="+", type=int, default=[RDTLayer.DATA_LENGTH])
+    parser.add_argument("--windows", nargs="+", type=int, default=[RDTLayer.FLOW_CONTROL_WIN_SIZE],
+                        help="send and receive window in characters")
+    parser.add_argument("--ratios", nargs="+", type=float, default=[0.1],
+                        help="drop, delay, corruption and reorder ratio")
+    parser.add_argument("--loss-model", default="bernoulli", choices=["bernoulli", "gilbert"])
+    parser.add_argument("--burst", type=float, default=4, help="mean burst length for --loss-model gilbert")
+    parser.add_argument("--jitter", type=float, default=0,
+                        help="mean exponential jitter in iterations instead of the fixed 5 iteration delays")
+    parser.add_argument("--checksum", default=RDTSegment.CHECKSUM_CRC32, choices=RDTSegment.CHECKSUM_ALGORITHMS)
+    parser.add_argument("--seeds", type=int, default=10, help="trials per combination, seeded 0..n-1")
+    parser.add_argument("--max-iterations", type=int, default=100000)
+    parser.add_argument("--workers", type=int, default=os.cpu_count())
+    parser.add_argument("--profile", action="store_true", help="time the send, receive, checksum and channel stages")
+    parser.add_argument("--csv", help="write one row per trial")
+    parser.add_argument("--json", help="write trials and summary")
+    args = parser.parse_args()
+
+    trials = [{"mode": mode, "ackPolicy": ackPolicy, "fecBlock": fecBlock, "compression": compression, "size": size,
+               "dataLength": dataLength, "window": window, "ratio": ratio, "seed": seed,
+               "lossModel": args.loss_model, "burst": args.burst, "jitter": args.jitter, "checksum": args.checksum,
+               "maxIterations": args.max_iterations, "profile": args.profile}
+              for mode, ackPolicy, fecBlock, compression, size, dataLength, window, ratio, seed in itertools.product(
+                  args.modes, args.ack_policies, args.fec_blocks, args.compression_levels, args.sizes,
+                  args.data_lengths, args.windows, args.ratios, range(args.seeds))]
+
+    start = time.perf_counter()
+    if args.workers > 1:
+        with ProcessPoolExecutor(args.workers) as pool:
+            results = list(pool.map(runTrial, trials, chunksize=max(1, len(trials) // (4 * args.workers))))
+    else:
+        results = [runTrial(trial) for trial in trials]
+    elapsed = time.perf_counter() - start
+    summary = summarize(results)
+
+    print("{0} trials in {1:.1f} s".format(len(results), elapsed))
+    print("{0:>17} {1:>9} {2:>3} {3:>4} {4:>7} {5:>4} {6:>6} {7:>5}  {8:>9} {9:>15} {10:>6} {11:>12} {12:>8} "
+          "{13:>9} {14:>9} {15:>16}".format(
+              "mode", "acks", "fec", "zlib", "size", "len", "window", "ratio", "completed", "iterations p50", "p90",
+              "goodput p50", "overhead", "data p50", "acks p50", "recovered/resent"))
+    for row in summary:
+        print("{0:>17} {1:>9} {2:>3} {3:>4} {4:>7} {5:>4} {6:>6} {7:>5}  {8:>4}/{9:<4} {10:>15} {11:>6} {12:>12.2f} "
+              "{13:>8.2f} {14:>9} {15:>9} {16:>16}".format(
+                  row["mode"], row["ackPolicy"], row["fecBlock"],
+                  "off" if row["compression"] is None else row["compression"], row["size"], row["dataLength"],
+                  row["window"], row["ratio"], row["completed"], row["trials"], row["iterations"]["p50"],
+                  row["iterations"]["p90"], row["goodput"]["p50"], row["retransmitOverhead"]["p50"],
+                  row["dataPackets"]["p50"], row["ackPackets"]["p50"],
+                  "{0:.0f}/{1:.0f}".format(row["recovered"]["mean"], row["retransmits"]["mean"])))
+
+    failed = [result for result in results if result["error"]]
+    if failed:
+        print("{0} trials stopped on an error, the first (seed {1}): {2}".format(
+            len(failed), failed[0]["seed"], failed[0]["error"]))
+
+    if args.profile:
+        print("profile (seconds, all trials): " + ", ".join(
+            "{0} {1:.3f}".format(stage, sum(result[stage + "Seconds"] for result in results))
+            for stage in (RDTProfiler.STAGE_SEND, RDTProfiler.STAGE_RECEIVE, RDTProfiler.STAGE_CHECKSUM,
+                          RDTProfiler.STAGE_CHANNEL)))
+
+    if args.csv:
+        with open(args.csv, "w", newline="") as file:
+            writer = csv.DictWriter(file, fieldnames=list(results[0]))
+            writer.writeheader()
+            writer.writerows(results)
+    if args.json:
+        with open(args.json, "w") as file:
+            json.dump({"commit": gitCommit(), "args": vars(args), "trials": results, "summary": summary}, file,
+                      indent=2)
+
+    if not all(result["completed"] for result in results):
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,228 @@
+import codecs
+import io
+import zlib
+
+from rdt_segment import RDTSegment, finishInternetChecksum, onesComplementSum
+
+
+# #################################################################################################################### #
+# ReceiveBuffer                                                                                                        #
+#                                                                                                                      #
+# Description:                                                                                                         #
+# In-order received data kept as a list of chunks. Appending is O(1) and the string is only built when somebody asks  #
+# for it, after which the chunks are collapsed into that one string so asking again is free until more data arrives.   #
+#                                                                                                                      #
+#                                                                                                                      #
+# Notes:                                                                                                               #
+# len() and matches() never build the string, use them for progress and completion checks. With a sink the chunks are #
+# handed to it as they arrive and nothing is kept, only the length is tracked.                                         #
+#                                                                                                                      #
+# #################################################################################################################### #
+
+
+class ReceiveBuffer(object):
+
+    def __init__(self, sink=None):
+        self.chunks = []
+        self.length = 0
+        self.sink = makeSink(sink) if sink is not None else None
+        self.crc = 0                        # CRC32 of what went to the sink, as UTF-8, since it can't be compared
+
+    def __len__(self):
+        return self.length
+
+    def append(self, chunk):
+        if chunk:
+            if self.sink is not None:
+                self.sink(chunk)
+                self.crc = zlib.crc32(chunk.encode(), self.crc)
+            else:
+                self.chunks.append(chunk)
+            self.length += len(chunk)
+
+    # ################################################################################################################ #
+    # getvalue()                                                                                                       #
+    #                                                                                                                  #
+    # Description:                                                                                                     #
+    # Everything received so far as one string                                                                         #
+    #                                                                                                                  #
+    # ################################################################################################################ #
+    def getvalue(self):
+        if not self.chunks:
+            return ""
+        if len(self.chunks) > 1:
+            self.chunks = ["".join(self.chunks)]
+        return self.chunks[0]
+
+    # ################################################################################################################ #
+    # matches()                                                                                                        #
+    #                                                                                                                  #
+    # Description:                                                                                                     #
+    # True when the data received so far is exactly data, compared chunk by chunk without joining. Data that went to a #
+    # sink is only known by its length and CRC32.                                                                      #
+    # ################################################################################################################ #
+    def matches(self, data):
+        if self.length != len(data):
+            return False
+        if self.sink is not None:
+            return zlib.crc32(data.encode()) == self.crc
+
+        offset = 0
+        for chunk in self.chunks:
+            if not data.startswith(chunk, offset):
+                return False
+            offset += len(chunk)
+        return True
+
+
+# #################################################################################################################### #
+# Segmenter                                                                                                            #
+#                                                                                                                      #
+# Description:                                                                                                         #
+# Cuts the send buffer into segments a window at a time. The data is encoded once and kept behind a memoryview, so     #
+# the CRC32 and internet checksums for a whole batch are computed on views into that buffer instead of re-encoding     #
+# every slice. The layer keeps the segments it made and resends copies of them, nothing is checksummed twice.          #
+#                                                                                                                      #
+#                                                                                                                      #
+# Notes:                                                                                                               #
+# Segment payloads are still str slices, UnreliableChannel and the receiver work on str. Views are only used when the  #
+# data is ASCII, otherwise character and byte offsets differ and each slice is encoded on its own.                     #
+#                                                                                                                      #
+# #################################################################################################################### #
+
+
+class Segmenter(object):
+
+    # base is the seqnum of data[0], used when the data is one batch of a stream.
+    def __init__(self, data, base=0):
+        self.data = data
+        self.base = base
+        self.encoded = data.encode()
+        self.isAscii = len(self.encoded) == len(data)
+        self.view = memoryview(self.encoded)
+
+    def __len__(self):
+        return len(self.data)
+
+    # ################################################################################################################ #
+    # makeSegments()                                                                                                   #
+    #                                                                                                                  #
+    # Description:                                                                                                     #
+    # Segments of dataLength characters starting at start, for every start before windowEnd and the end of the data.   #
+    # compressed flags them as carrying compressed payload.                                                            #
+    # ################################################################################################################ #
+    def makeSegments(self, start, windowEnd, dataLength, checksumAlgorithm, streamId=0, compressed=False):
+        segments = []
+        end = min(windowEnd, self.base + len(self.data))
+        for seqnum in range(start, end, dataLength):
+            payload = self.data[seqnum - self.base: seqnum - self.base + dataLength]
+            segment = RDTSegment(checksumAlgorithm, streamId)
+            checksum = self.checksum(seqnum, len(payload), checksumAlgorithm, streamId, compressed)
+            segment.setData(seqnum, payload, checksum, compressed)
+            segments.append(segment)
+        return segments
+
+    # None lets RDTSegment compute it the usual way.
+    def checksum(self, seqnum, length, checksumAlgorithm, streamId, compressed=False):
+        if not self.isAscii or checksumAlgorithm == RDTSegment.CHECKSUM_SUM_OF_ORDS:
+            return None
+
+        window = RDTSegment.WINDOW_COMPRESSED if compressed else -1
+        header = RDTSegment.HEADER.pack(seqnum, -1, window, streamId)
+        payload = self.view[seqnum - self.base: seqnum - self.base + length]
+        if checksumAlgorithm == RDTSegment.CHECKSUM_CRC32:
+            return zlib.crc32(payload, zlib.crc32(header))
+        return finishInternetChecksum(onesComplementSum(header) + onesComplementSum(payload))
+
+
+# #################################################################################################################### #
+# StreamSegmenter                                                                                                      #
+#                                                                                                                      #
+# Description:                                                                                                         #
+# Segmenter for data that isn't in memory up front. Text is pulled from the source only as the window opens, so memory #
+# stays bounded by the window (plus one read) no matter how big the transfer is. The source can be:                    #
+#                                                                                                                      #
+#     - a file object or mmap, anything with read(n), in text or binary mode                                          #
+#     - an iterable of str or bytes chunks, e.g. a generator                                                          #
+#                                                                                                                      #
+# Notes:                                                                                                               #
+# Bytes are decoded as UTF-8 incrementally, seqnums always count characters.                                           #
+#                                                                                                                      #
+# #################################################################################################################### #
+
+
+class StreamSegmenter(object):
+    READ_SIZE = 4096            # characters (or bytes) asked of a file per read
+
+    def __init__(self, source, readSize=READ_SIZE):
+        self.readSize = readSize
+        self.chunks = readChunks(source, readSize)
+        self.decoder = codecs.getincrementaldecoder("utf-8")()
+        self.pending = ""                   # Text pulled from the source but not segmented yet
+        self.pendingStart = 0               # seqnum of pending[0]
+        self.exhausted = False
+
+    # Characters pulled from the source so far. Only the full length once the source is exhausted.
+    def __len__(self):
+        return self.pendingStart + len(self.pending)
+
+    def isExhausted(self):
+        return self.exhausted
+
+    def fill(self, count):
+        while len(self.pending) < count and not self.exhausted:
+            chunk = next(self.chunks, None)
+            if chunk is None:
+                self.exhausted = True
+                chunk = self.decoder.decode(b"", True)
+            elif isinstance(chunk, (bytes, bytearray, memoryview)):
+                chunk = self.decoder.decode(chunk)
+            self.pending += chunk
+
+    # ################################################################################################################ #
+    # makeSegments()                                                                                                   #
+    #                                                                                                                  #
+    # Description:                                                                                                     #
+    # Same contract as Segmenter.makeSegments(), start has to be where the previous call stopped                       #
+    #                                                                                                                  #
+    # ################################################################################################################ #
+    def makeSegments(self, start, windowEnd, dataLength, checksumAlgorithm, streamId=0, compressed=False):
+        if start != self.pendingStart:
+            raise ValueError(f"Stream segments are cut in order, expected {self.pendingStart} but got {start}")
+        if windowEnd <= start:
+            return []
+
+        # Whole segments only, unless the source has run dry.
+        wanted = -(-(windowEnd - start) // dataLength) * dataLength
+        self.fill(wanted)
+        usable = len(self.pending) if self.exhausted else len(self.pending) - len(self.pending) % dataLength
+        usable = min(usable, wanted)
+        if usable == 0:
+            return []
+
+        batch = Segmenter(self.pending[:usable], start)
+        self.pending = self.pending[usable:]
+        self.pendingStart += usable
+        return batch.makeSegments(start, windowEnd, dataLength, checksumAlgorithm, streamId, compressed)
+
+
+# Chunks of a file object, mmap or iterable, as StreamSegmenter takes them.
+def readChunks(source, readSize=StreamSegmenter.READ_SIZE):
+    if hasattr(source, "read"):
+        return iter(lambda: source.read(readSize), source.read(0))
+    return iter(source)
+
+
+# #################################################################################################################### #
+# makeSink()                                                                                                           #
+#                                                                                                                      #
+# Description:                                                                                                         #
+# Turns a callable or a writable file into a function that takes in-order str chunks. Binary files get UTF-8.         #
+#                                                                                                                      #
+# #################################################################################################################### #
+def makeSink(sink):
+    if not hasattr(sink, "write"):
+        return sink
+    if isinstance(sink, io.TextIOBase):
+        return sink.write
+    return lambda chunk: sink.write(chunk.encode())
@@ -0,0 +1,76 @@
+import codecs
+import zlib
+
+
+# #################################################################################################################### #
+# Payload compression                                                                                                  #
+#                                                                                                                      #
+# Description:                                                                                                         #
+# Optional zlib stage between the application data and segmentation. The sender compresses the stream incrementally    #
+# as the window asks for more of it and segments the compressed bytes, so compressible text costs fewer segments,      #
+# iterations and retransmissions. The receiver inflates the in-order data as it is delivered, getDataReceived() and    #
+# the receive sink only ever see the original text.                                                                    #
+#                                                                                                                      #
+#     compressChunks()   - sender side, turns chunks of text or bytes into chunks of compressed payload                #
+#     StreamDecompressor - receiver side, turns in-order compressed payload back into text                             #
+#                                                                                                                      #
+# Notes:                                                                                                               #
+# Compressed bytes are carried as a latin-1 str, one character per byte, so they pass through the channels, the        #
+# checksums and FEC like any payload and seqnums count compressed bytes. They are checksummed and sent on the wire as  #
+# latin-1 too, so a compressed segment is as many bytes as it has characters. The sender flags its data segments as    #
+# compressed (RDTSegment.WINDOW_COMPRESSED in the otherwise unused window field) and FEC flags the parity over them,   #
+# the receiver switches to inflating for the stream on the first flagged segment.                                      #
+#                                                                                                                      #
+# #################################################################################################################### #
+
+COMPRESSION_LEVEL = 6                   # zlib's default, most of level 9's ratio at a fraction of the time
+CHUNK_SIZE = 4096                       # characters of a str handed to the compressor at a time
+
+
+# The received stream can't be inflated, the data delivered so far is all there will be.
+class DecompressionError(Exception):
+    pass
+
+
+# Compressed payload for chunks of str or bytes, str is encoded as UTF-8. Chunks the compressor keeps to itself come
+# out as "", the rest of the stream comes out at the end.
+def compressChunks(chunks, level=COMPRESSION_LEVEL):
+    compressor = zlib.compressobj(level)
+    for chunk in chunks:
+        if isinstance(chunk, str):
+            chunk = chunk.encode()
+        yield compressor.compress(chunk).decode("latin-1")
+    yield compressor.flush().decode("latin-1")
+
+
+# Splits a string into chunks for compressChunks() without copying it all at once.
+def splitText(data, chunkSize=CHUNK_SIZE):
+    return (data[start:start + chunkSize] for start in range(0, len(data), chunkSize))
+
+
+class StreamDecompressor(object):
+
+    def __init__(self):
+        self.decompressor = zlib.decompressobj()
+        self.decoder = codecs.getincrementaldecoder("utf-8")()
+        self.failed = False                 # After a DecompressionError, the rest of the stream can't be inflated
+
+    # ################################################################################################################ #
+    # decompress()                                                                                                     #
+    #                                                                                                                  #
+    # Description:                                                                                                     #
+    # Text for the next in-order piece of compressed payload, "" while zlib or the UTF-8 decoder are waiting for more. #
+    # Raises DecompressionError on data that isn't a zlib stream of UTF-8 text, and on anything after that.            #
+    # ################################################################################################################ #
+    def decompress(self, payload):
+        if self.failed:
+            raise DecompressionError("Compressed stream already failed")
+        try:
+            data = self.decompressor.decompress(payload.encode("latin-1"))
+            return self.decoder.decode(data, self.decompressor.eof)
+        except (zlib.error, UnicodeError) as error:
+            self.failed = True
+            raise DecompressionError(f"Can't inflate the received stream: {error}") from error
+
+    def isFinished(self):
+        return self.decompressor.eof
@@ -0,0 +1,164 @@
+import struct
+
+
+# #################################################################################################################### #
+# Forward error correction                                                                                             #
+#                                                                                                                      #
+# Description:                                                                                                         #
+# XOR parity over blocks of data segments. The sender sends one parity segment after every blockSize new data          #
+# segments (and for a partial block of two or more when the window stalls), so the redundancy is at most 1 / 2. The    #
+# receiver keeps recent good segments and, once a block has its parity and all but one of its segments, rebuilds the   #
+# missing one without waiting for a retransmission. Dropped and corrupted segments are both repaired, two losses in    #
+# one block are left to the usual retransmission.                                                                      #
+#                                                                                                                      #
+#     ParityEncoder - sender side, accumulates the XOR of the block being sent                                         #
+#     ParityDecoder - receiver side, matches parity with the segments it has and rebuilds                              #
+#                                                                                                                      #
+# Notes:                                                                                                               #
+# A parity segment is a data segment (acknum -1) whose window field holds the number of segments it covers, seqnum     #
+# is where the block starts. Its payload is PARITY_HEADER (block length in characters, XOR of the segments' byte       #
+# lengths, PARITY_COMPRESSED when the block is compressed payload) followed by the XOR of their bytes, UTF-8 or for    #
+# compressed payload latin-1. It is carried as a latin-1 str so it passes through the channels like any payload, and   #
+# as latin-1 on the wire (rdt_wire.py). A rebuilt segment is flagged compressed the same way the lost one was. See     #
+# RDTSegment.setParity().                                                                                              #
+#                                                                                                                      #
+# #################################################################################################################### #
+
+PARITY_HEADER = struct.Struct("!IIB")     # block length in characters, XOR of the segments' byte lengths, flags
+PARITY_COMPRESSED = 0x01                    # The block is compressed payload (rdt_compress.py), one byte per character
+
+
+class ParityEncoder(object):
+
+    def __init__(self, blockSize):
+        if blockSize < 2:
+            # Parity over a single segment is just a second copy of it.
+            raise ValueError(f"FEC block size must be at least 2, got {blockSize}")
+        self.blockSize = blockSize
+        self.reset()
+
+    def reset(self):
+        self.start = None                   # seqnum of the first segment in the block
+        self.count = 0
+        self.chars = 0
+        self.lengthXor = 0
+        self.xor = bytearray()
+        self.compressed = False
+
+    # ################################################################################################################ #
+    # add()                                                                                                            #
+    #                                                                                                                  #
+    # Description:                                                                                                     #
+    # Adds a newly sent segment to the block. Returns (seqnum, count, payload) for the parity segment when this        #
+    # completes the block, None otherwise. compressed says the segment carries compressed payload.                     #
+    # ################################################################################################################ #
+    def add(self, seqnum, payload, compressed=False):
+        if self.start is None:
+            self.start = seqnum
+        self.compressed = compressed
+        data = encodePayload(payload, compressed)
+        if len(data) > len(self.xor):
+            self.xor.extend(bytes(len(data) - len(self.xor)))
+        for index, byte in enumerate(data):
+            self.xor[index] ^= byte
+        self.lengthXor ^= len(data)
+        self.chars += len(payload)
+        self.count += 1
+        return self.flush() if self.count == self.blockSize else None
+
+    # Parity for the segments added so far. None when there are fewer than two, a lone segment stays in the block and
+    # is covered together with the ones sent after it.
+    def flush(self):
+        if self.count < 2:
+            return None
+        flags = PARITY_COMPRESSED if self.compressed else 0
+        payload = (PARITY_HEADER.pack(self.chars, self.lengthXor, flags) + self.xor).decode("latin-1")
+        parity = (self.start, self.count, payload)
+        self.reset()
+        return parity
+
+
+class ParityDecoder(object):
+    HISTORY = 256                           # Characters below the expected seqnum kept before any parity is seen
+
+    def __init__(self):
+        self.data = {}                      # seqnum -> payload of good data segments, delivered or not
+        self.parities = {}                  # block start -> (count, chars, lengthXor, xor bytes, compressed)
+        self.history = ParityDecoder.HISTORY
+
+    def addData(self, seqnum, payload):
+        self.data[seqnum] = payload
+        for start, parity in list(self.parities.items()):
+            if start <= seqnum < start + parity[1]:
+                return self.recover(start)
+        return []
+
+    # Returns the segments the parity made recoverable as (seqnum, payload, compressed), most likely none.
+    def addParity(self, seqnum, count, payload):
+        raw = payload.encode("latin-1", "replace")
+        if len(raw) < PARITY_HEADER.size:
+            return []
+        chars, lengthXor, flags = PARITY_HEADER.unpack_from(raw)
+        self.parities[seqnum] = (count, chars, lengthXor, raw[PARITY_HEADER.size:], bool(flags & PARITY_COMPRESSED))
+        # Data from before a block's start can still be needed until the whole block is delivered.
+        self.history = max(self.history, chars)
+        return self.recover(seqnum)
+
+    # ################################################################################################################ #
+    # recover()                                                                                                        #
+    #                                                                                                                  #
+    # Description:                                                                                                     #
+    # Rebuilds the block's one missing segment when everything else in it is here. The segments are found by walking   #
+    # the block from its start, the missing one's length comes from where the next segment starts (or the block ends). #
+    # ################################################################################################################ #
+    def recover(self, start):
+        count, chars, lengthXor, xor, compressed = self.parities[start]
+        end = start + chars
+        position = start
+        present = []
+        while position < end and position in self.data:
+            present.append(position)
+            position += len(self.data[position])
+        if position >= end:
+            del self.parities[start]        # Nothing missing
+            return []
+
+        missing = position
+        after = sorted(seqnum for seqnum in self.data if missing < seqnum < end)
+        position = after[0] if after else end
+        missingChars = position - missing
+        for seqnum in after:
+            if seqnum != position:
+                return []                   # Another gap, more than one segment is missing
+            present.append(seqnum)
+            position += len(self.data[seqnum])
+        if position != end or len(present) != count - 1:
+            return []
+
+        rebuilt = bytearray(xor)
+        for seqnum in present:
+            data = encodePayload(self.data[seqnum], compressed)
+            lengthXor ^= len(data)
+            for index, byte in enumerate(data):
+                rebuilt[index] ^= byte
+        try:
+            payload = bytes(rebuilt[:lengthXor]).decode("latin-1" if compressed else "utf-8")
+        except UnicodeDecodeError:
+            return []
+        if lengthXor > len(rebuilt) or len(payload) != missingChars:
+            return []
+        del self.parities[start]
+        return [(missing, payload, compressed)]
+
+    # Forgets blocks that are fully delivered and data no block can need any more.
+    def prune(self, expected):
+        for start in [start for start, parity in self.parities.items() if start + parity[1] <= expected]:
+            del self.parities[start]
+        horizon = expected - self.history
+        for seqnum in [seqnum for seqnum in self.data if seqnum < horizon]:
+            del self.data[seqnum]
+
+
+# Bytes a payload is XORed as, compressed payload is one byte per character.
+def encodePayload(payload, compressed):
+    return payload.encode("latin-1" if compressed else "utf-8")
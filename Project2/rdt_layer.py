@@ -1,4 +1,13 @@
-from segment import Segment
+import copy
+
+from rdt_ack import ImmediateAck
+from rdt_buffers import ReceiveBuffer, Segmenter, StreamSegmenter, readChunks
+from rdt_compress import COMPRESSION_LEVEL, DecompressionError, StreamDecompressor, compressChunks, splitText
+from rdt_fec import ParityDecoder, ParityEncoder
+from rdt_rto import RTOEstimator
+from rdt_segment import RDTSegment
+from rdt_timers import RetransmitTimerHeap
+from rdt_window import FixedWindow
 
 
 # #################################################################################################################### #
@@ -33,6 +42,9 @@ class RDTLayer(object):
     receiveChannel = None
     dataToSend = ""
     currentIteration = 0  # Use this for segment 'timeouts'
+    MODE_GO_BACK_N = "go-back-n"                        # Resend every unacknowledged segment on timeout
+    MODE_SELECTIVE_REPEAT = "selective-repeat"          # Buffer out of order segments, resend only timed out ones
+    FAST_RETRANSMIT_THRESHOLD = 3                       # Duplicate acks before the missing segment is resent
     # Add items as needed
 
     # ################################################################################################################ #
@@ -47,14 +59,43 @@ class RDTLayer(object):
         self.sendChannel = None
         self.receiveChannel = None
         self.dataToSend = ""
-        self.dataReceived = ""
+        self.segmenter = Segmenter("")
+        self.data_length = RDTLayer.DATA_LENGTH     # Characters per segment, see setDataLength()
+        self.received_data = ReceiveBuffer()    # In-order received data, joined only when asked for
         self.currentIteration = 0
         self.next_sequence_number = 0
         self.last_ACKed = 0
-        self.sent_segments = []             # Keeps track of sent segments, used to implement go back N
-        self.timeout = 10                   # Set timeout window
+        self.sent_segments = {}             # Unacknowledged segments keyed by seqnum, in the order they were sent
+        self.timeout = RTOEstimator.INITIAL_RTO  # Set timeout window, follows the RTO estimate when adaptive
+        self.adaptive_timeout = True
+        self.rto_estimator = RTOEstimator()
+        self.retransmitted = set()          # Seqnums resent at least once, never used for RTT samples (Karn's rule)
+        self.retransmit_timers = RetransmitTimerHeap()  # Per-segment retransmission deadlines
         self.expected_sequence_number = 0
-        self.countSegmentTimeouts = 0
+        self.countSegmentTimeouts = 0       # Total timeouts, kept for the main summary
+        self.segmentTimeoutCounts = {}      # seqnum -> number of times that segment's timer expired
+        self.fast_retransmit_threshold = RDTLayer.FAST_RETRANSMIT_THRESHOLD
+        self.duplicate_ack_count = 0        # Acks in a row for last_ACKed while data is outstanding
+        self.countFastRetransmits = 0
+        self.window_controller = FixedWindow(RDTLayer.FLOW_CONTROL_WIN_SIZE)  # Congestion window policy
+        self.receive_window = RDTLayer.FLOW_CONTROL_WIN_SIZE    # Window this end advertises in its acks
+        self.peer_window = RDTLayer.FLOW_CONTROL_WIN_SIZE       # Last window advertised by the other end
+        self.checksum_algorithm = RDTSegment.CHECKSUM_SUM_OF_ORDS
+        self.stream_id = 0                  # Stamped on every segment this end creates, see rdt_mux.py
+        self.recovery_point = 0             # Losses below this seqnum were already reported to the window controller
+        self.mode = RDTLayer.MODE_GO_BACK_N
+        self.receive_buffer = {}            # Selective repeat: out of order payloads keyed by seqnum
+        self.metrics = None                 # RDTMetrics, see setInstrumentation()
+        self.ack_policy = ImmediateAck()    # When acks go out, see setAckPolicy()
+        self.held_ack_seqnum = -1           # Selective repeat: newest in-order seqnum an ack is being held back for
+        self.fec_encoder = None             # Forward error correction, see setForwardErrorCorrection()
+        self.fec_decoder = None
+        self.countRetransmits = 0           # Segments resent after a timeout or fast retransmit
+        self.countParitySent = 0
+        self.countRecoveredSegments = 0     # Segments rebuilt from parity instead of waiting for a retransmission
+        self.held_timers = {}               # seqnum -> iterations left on a timer paused by holdTimer()
+        self.compression_level = None       # zlib level the data to send is compressed with, see setCompression()
+        self.decompressor = None            # Inflates received data once the peer flags it as compressed
 
         # Add items as needed
 
@@ -80,6 +121,171 @@ class RDTLayer(object):
     def setReceiveChannel(self, channel):
         self.receiveChannel = channel
 
+    # ################################################################################################################ #
+    # setRetransmitMode()                                                                                              #
+    #                                                                                                                  #
+    # Description:                                                                                                     #
+    # Called by main to choose between MODE_GO_BACK_N (default) and MODE_SELECTIVE_REPEAT. Both ends of a connection   #
+    # should use the same mode.                                                                                        #
+    #                                                                                                                  #
+    # ################################################################################################################ #
+    def setRetransmitMode(self, mode):
+        if mode not in (RDTLayer.MODE_GO_BACK_N, RDTLayer.MODE_SELECTIVE_REPEAT):
+            raise ValueError(f"Unknown retransmit mode: {mode}")
+        self.mode = mode
+
+    # ################################################################################################################ #
+    # setChecksumAlgorithm()                                                                                           #
+    #                                                                                                                  #
+    # Description:                                                                                                     #
+    # Called by main to pick the checksum used on the segments this end creates, one of RDTSegment.CHECKSUM_*.        #
+    # Incoming segments are checked with whatever algorithm they were created with.                                    #
+    #                                                                                                                  #
+    # ################################################################################################################ #
+    def setChecksumAlgorithm(self, algorithm):
+        if algorithm not in RDTSegment.CHECKSUM_ALGORITHMS:
+            raise ValueError(f"Unknown checksum algorithm: {algorithm}")
+        self.checksum_algorithm = algorithm
+
+    # ################################################################################################################ #
+    # setStreamId()                                                                                                    #
+    #                                                                                                                  #
+    # Description:                                                                                                     #
+    # Called by the multiplexer to set the stream this layer carries                                                   #
+    #                                                                                                                  #
+    #                                                                                                                  #
+    # ################################################################################################################ #
+    def setStreamId(self, streamId):
+        self.stream_id = streamId
+
+    # ################################################################################################################ #
+    # setAdaptiveTimeout()                                                                                             #
+    #                                                                                                                  #
+    # Description:                                                                                                     #
+    # Called by main to switch between the estimated RTO (default) and a fixed timeout in iterations                   #
+    #                                                                                                                  #
+    #                                                                                                                  #
+    # ################################################################################################################ #
+    def setAdaptiveTimeout(self, adaptive, fixedTimeout=RTOEstimator.INITIAL_RTO):
+        self.adaptive_timeout = adaptive
+        self.timeout = self.rto_estimator.getTimeout() if adaptive else fixedTimeout
+
+    # ################################################################################################################ #
+    # setFastRetransmitThreshold()                                                                                     #
+    #                                                                                                                  #
+    # Description:                                                                                                     #
+    # Called by main to set how many duplicate acks trigger a fast retransmit, 0 turns fast retransmit off             #
+    #                                                                                                                  #
+    #                                                                                                                  #
+    # ################################################################################################################ #
+    def setFastRetransmitThreshold(self, threshold):
+        self.fast_retransmit_threshold = threshold
+
+    # ################################################################################################################ #
+    # setWindowController()                                                                                            #
+    #                                                                                                                  #
+    # Description:                                                                                                     #
+    # Called by main to set the congestion window policy, see rdt_window.py. Defaults to FixedWindow of                #
+    # FLOW_CONTROL_WIN_SIZE.                                                                                           #
+    #                                                                                                                  #
+    # ################################################################################################################ #
+    def setWindowController(self, controller):
+        self.window_controller = controller
+
+    # ################################################################################################################ #
+    # setReceiveWindow()                                                                                               #
+    #                                                                                                                  #
+    # Description:                                                                                                     #
+    # Called by main to set how many characters past the expected sequence number this end accepts and advertises     #
+    #                                                                                                                  #
+    #                                                                                                                  #
+    # ################################################################################################################ #
+    def setReceiveWindow(self, size):
+        self.receive_window = size
+
+    # ################################################################################################################ #
+    # setAckPolicy()                                                                                                   #
+    #                                                                                                                  #
+    # Description:                                                                                                     #
+    # Called by main to set when this end acks the data it receives, see rdt_ack.py. Defaults to ImmediateAck, an ack  #
+    # per data segment.                                                                                                #
+    #                                                                                                                  #
+    # ################################################################################################################ #
+    def setAckPolicy(self, policy):
+        self.ack_policy = policy
+
+    # ################################################################################################################ #
+    # setForwardErrorCorrection()                                                                                      #
+    #                                                                                                                  #
+    # Description:                                                                                                     #
+    # Called by main to send an XOR parity segment after every blockSize data segments and rebuild single losses from  #
+    # the parity the other end sends, see rdt_fec.py. The redundancy is 1 / blockSize, blockSize is at least 2 and 0   #
+    # turns it off. Both ends of a connection should set it.                                                           #
+    # ################################################################################################################ #
+    def setForwardErrorCorrection(self, blockSize):
+        if blockSize:
+            self.fec_encoder = ParityEncoder(blockSize)
+            self.fec_decoder = ParityDecoder()
+        else:
+            self.fec_encoder = None
+            self.fec_decoder = None
+
+    # ################################################################################################################ #
+    # setCompression()                                                                                                 #
+    #                                                                                                                  #
+    # Description:                                                                                                     #
+    # Called by main to compress the data this end sends with zlib at level (rdt_compress.py), None sends it as is.    #
+    # The receiving end needs no setting, it inflates as soon as it sees a segment flagged compressed. Set it before   #
+    # setDataSource(), a string from setDataToSend() is picked up either way.                                          #
+    # ################################################################################################################ #
+    def setCompression(self, level=COMPRESSION_LEVEL):
+        if level is not None and not -1 <= level <= 9:
+            raise ValueError(f"zlib compression level must be -1 to 9, got {level}")
+        if self.next_sequence_number > 0:
+            raise ValueError("Compression can't be changed once data has been sent")
+        self.compression_level = level
+        if self.dataToSend:
+            self.setDataToSend(self.dataToSend)
+
+    # ################################################################################################################ #
+    # setInstrumentation()                                                                                             #
+    #                                                                                                                  #
+    # Description:                                                                                                     #
+    # Called by main to collect counters, histograms, an event trace or the debug log with an RDTMetrics              #
+    # (rdt_metrics.py). None, the default, turns it all off. Set the channels first when profiling.                   #
+    #                                                                                                                  #
+    # ################################################################################################################ #
+    def setInstrumentation(self, metrics):
+        self.metrics = metrics
+        if metrics is not None and metrics.profiler is not None:
+            metrics.profiler.installLayer(self)
+            metrics.profiler.installChannel(self.sendChannel)
+            metrics.profiler.installChannel(self.receiveChannel)
+
+    # ################################################################################################################ #
+    # getSendWindow()                                                                                                  #
+    #                                                                                                                  #
+    # Description:                                                                                                     #
+    # The usable send window, the smaller of the congestion window and the window the receiver advertised             #
+    #                                                                                                                  #
+    #                                                                                                                  #
+    # ################################################################################################################ #
+    def getSendWindow(self):
+        return min(self.window_controller.getWindow(), self.peer_window)
+
+    # ################################################################################################################ #
+    # getRTOEstimates()                                                                                                #
+    #                                                                                                                  #
+    # Description:                                                                                                     #
+    # Called by main to read the current SRTT, RTTVAR and RTO (in iterations) and the timeout in use                   #
+    #                                                                                                                  #
+    #                                                                                                                  #
+    # ################################################################################################################ #
+    def getRTOEstimates(self):
+        estimates = self.rto_estimator.getEstimates()
+        estimates["timeout"] = self.timeout
+        return estimates
+
     # ################################################################################################################ #
     # setDataToSend()                                                                                                  #
     #                                                                                                                  #
@@ -90,6 +296,48 @@ class RDTLayer(object):
     # ################################################################################################################ #
     def setDataToSend(self, data):
         self.dataToSend = data
+        if self.compression_level is not None:
+            self.segmenter = StreamSegmenter(compressChunks(splitText(data), self.compression_level))
+        else:
+            self.segmenter = Segmenter(data)
+
+    # ################################################################################################################ #
+    # setDataSource()                                                                                                  #
+    #                                                                                                                  #
+    # Description:                                                                                                     #
+    # Called by main to stream the data to send from a file object, mmap or iterable of chunks instead of one string. #
+    # Data is only read as the window opens.                                                                           #
+    #                                                                                                                  #
+    # ################################################################################################################ #
+    def setDataSource(self, source):
+        self.dataToSend = ""
+        if self.compression_level is not None:
+            source = compressChunks(readChunks(source), self.compression_level)
+        self.segmenter = StreamSegmenter(source)
+
+    # ################################################################################################################ #
+    # setReceiveSink()                                                                                                 #
+    #                                                                                                                  #
+    # Description:                                                                                                     #
+    # Called by main to have in-order data pushed to a callback or writable file as it is delivered instead of kept.  #
+    # getDataReceived() has nothing to return afterwards, getReceivedLength() still counts.                           #
+    #                                                                                                                  #
+    # ################################################################################################################ #
+    def setReceiveSink(self, sink):
+        self.received_data = ReceiveBuffer(sink)
+
+    # ################################################################################################################ #
+    # setDataLength()                                                                                                  #
+    #                                                                                                                  #
+    # Description:                                                                                                     #
+    # Called by main to set the characters per segment for this layer (DATA_LENGTH by default). Set it before any     #
+    # data is sent.                                                                                                    #
+    #                                                                                                                  #
+    # ################################################################################################################ #
+    def setDataLength(self, dataLength):
+        if dataLength < 1:
+            raise ValueError(f"Data length must be at least 1, got {dataLength}")
+        self.data_length = dataLength
 
     # ################################################################################################################ #
     # getDataReceived()                                                                                                #
@@ -103,11 +351,41 @@ class RDTLayer(object):
         # ############################################################################################################ #
         # Identify the data that has been received...
 
-        print(f"getDataReceived(): {self.dataReceived}")
+        if self.metrics is not None and self.metrics.debugging:
+            self.metrics.debug(f"getDataReceived(): {len(self.received_data)} characters")
 
         #
         # ############################################################################################################ #+
-        return self.dataReceived
+        return self.received_data.getvalue()
+
+    # The received string, kept as an attribute-style read for older callers.
+    @property
+    def dataReceived(self):
+        return self.received_data.getvalue()
+
+    # ################################################################################################################ #
+    # getReceivedLength()                                                                                              #
+    #                                                                                                                  #
+    # Description:                                                                                                     #
+    # Called by main to get how many characters have been received in order, without building the string              #
+    #                                                                                                                  #
+    #                                                                                                                  #
+    # ################################################################################################################ #
+    def getReceivedLength(self):
+        return len(self.received_data)
+
+    # ################################################################################################################ #
+    # isReceiveComplete()                                                                                              #
+    #                                                                                                                  #
+    # Description:                                                                                                     #
+    # Called by main to check whether expected has been received. expected is either a length or the string itself,   #
+    # a string is compared chunk by chunk without copying the received data.                                           #
+    #                                                                                                                  #
+    # ################################################################################################################ #
+    def isReceiveComplete(self, expected):
+        if isinstance(expected, int):
+            return len(self.received_data) >= expected
+        return self.received_data.matches(expected)
 
     # ################################################################################################################ #
     # processData()                                                                                                    #
@@ -122,6 +400,32 @@ class RDTLayer(object):
         self.processSend()
         self.processReceiveAndSendRespond()
 
+    # ################################################################################################################ #
+    # processEvents()                                                                                                  #
+    #                                                                                                                  #
+    # Description:                                                                                                     #
+    # Event driven alternative to processData() for rdt_async.py. The caller supplies the time in (possibly           #
+    # fractional) iterations. Incoming segments are handled first so a window opened by an ack is filled right away.   #
+    #                                                                                                                  #
+    # ################################################################################################################ #
+    def processEvents(self, iteration):
+        self.currentIteration = iteration
+        self.processReceiveAndSendRespond()
+        self.processSend()
+
+    # ################################################################################################################ #
+    # getNextDeadline()                                                                                                #
+    #                                                                                                                  #
+    # Description:                                                                                                     #
+    # Iteration the earliest retransmission timer or held back ack is due on, None when nothing is pending            #
+    #                                                                                                                  #
+    #                                                                                                                  #
+    # ################################################################################################################ #
+    def getNextDeadline(self):
+        deadlines = [deadline for deadline in (self.retransmit_timers.nextDeadline(), self.ack_policy.getDeadline())
+                     if deadline is not None]
+        return min(deadlines) if deadlines else None
+
     # ################################################################################################################ #
     # processSend()                                                                                                    #
     #                                                                                                                  #
@@ -133,11 +437,12 @@ class RDTLayer(object):
     def processSend(self):
         """Implements a stop and wait, go back N approach.
 
-        If the last acknowledged number is less than the next sequence number and
-        the current iteration exceeds the timeout window, the data that hasn't yet
-        been acknowledged will be resent. Otherwise, as long as there is data
+        Every unacknowledged segment has its own deadline in a timer heap. When
+        one or more deadlines pass, go back N resends all the data that hasn't
+        yet been acknowledged while selective repeat resends only the segments
+        that timed out. Otherwise, as long as there is data
         left to send and if fits within the flow control window, it is processed
-        into packets of DATA_LENGTH and sent through the unreliable channel.
+        into packets of data_length and sent through the unreliable channel.
 
         Sources used: Computer Networking: a Top-Down Approach (9th ed.)
                       J.F. Kurose, K.W. Ross, Pearson, 2026
@@ -145,41 +450,232 @@ class RDTLayer(object):
 
         # ############################################################################################################ #
 
-        print(f"next_sequence_number: {self.next_sequence_number}, Acked: {self.last_ACKed}")
-
-        # If last acked < the next sequence number packets were lost.
-        if self.last_ACKed < self.next_sequence_number:
-
-            # (Current iteration - timer) keeps track of the current iterations time.
-            # If it exceeds the timeout window, it resends segments.
-            if (self.currentIteration - self.timer) >= self.timeout:
+        metrics = self.metrics
+        if metrics is not None and metrics.debugging:
+            metrics.debug(f"next_sequence_number: {self.next_sequence_number}, Acked: {self.last_ACKed}")
+
+        # Only segments whose deadline has passed are looked at.
+        expired = self.retransmit_timers.popExpired(self.currentIteration)
+        if expired:
+            if metrics is not None:
+                metrics.debug("timeout resending")
+                metrics.count("timeouts")
+                metrics.count("segment_timeouts", len(expired))
+                if metrics.tracing:
+                    metrics.event("timeout", self.currentIteration, seqnums=expired)
+
+            for seqnum in expired:
+                self.segmentTimeoutCounts[seqnum] = self.segmentTimeoutCounts.get(seqnum, 0) + 1
+            self.countSegmentTimeouts += 1  # Implemented suggestion from https://edstem.org/us/courses/90274/discussion/7635500
+            if max(expired) >= self.recovery_point:
+                self.window_controller.onTimeout()
+                self.recovery_point = self.next_sequence_number
+
+            if self.mode == RDTLayer.MODE_SELECTIVE_REPEAT:
+                # Resends only the segments that timed out.
+                for seqnum in expired:
+                    self.resendSegment(self.sent_segments[seqnum])
+            else:
+                # Go back N, resends every previously unacknowledged segment.
+                for segment in self.sent_segments.values():
+                    self.resendSegment(segment)
+
+        # Processes packets as long as there is data to send, and it fits within the flow control window. The whole
+        # window's worth of segments is cut and checksummed in one batch.
+        segments = self.segmenter.makeSegments(self.next_sequence_number, self.last_ACKed + self.getSendWindow(),
+                                               self.data_length, self.checksum_algorithm, self.stream_id,
+                                               self.compression_level is not None)
+        for segmentSend in segments:
+            seqnum = segmentSend.seqnum
+            segmentSend.setStartIteration(self.currentIteration)
+            self.retransmit_timers.start(seqnum, self.currentIteration + self.timeout)  # Starts this segment's own timer.
+
+            if metrics is not None:
+                metrics.count("segments_sent")
+                if metrics.tracing:
+                    metrics.event("send", self.currentIteration, seq=seqnum, len=len(segmentSend.payload))
+                if metrics.debugging:
+                    metrics.debug("Sending segment: " + segmentSend.to_string())
+
+            # Sends a copy through the unreliable channel, the channel corrupts segments in place so the kept
+            # original has to stay clean for retransmission.
+            self.sendChannel.send(copy.copy(segmentSend))
+            self.sent_segments[seqnum] = segmentSend  # Keeps the sent segment for tracking.
+            self.next_sequence_number += len(segmentSend.payload)  # Sets sequence number for the next segment.
+
+            if self.fec_encoder is not None:
+                parity = self.fec_encoder.add(seqnum, segmentSend.payload, segmentSend.isCompressed())
+                if parity is not None:
+                    self.sendParity(*parity)
+
+        # The window is full or the data ran out, protect the partial block now rather than after the next one fills.
+        if not segments and self.fec_encoder is not None:
+            parity = self.fec_encoder.flush()
+            if parity is not None:
+                self.sendParity(*parity)
+
+        if metrics is not None and self.sent_segments:
+            metrics.observe("window_occupancy", self.next_sequence_number - self.last_ACKed)
 
-                print("timeout resending")
+    # ################################################################################################################ #
+    # resendSegment()                                                                                                  #
+    #                                                                                                                  #
+    # Description:                                                                                                     #
+    # Resends a copy of an unacknowledged segment and restarts its timer, backed off for each earlier timeout when the  #
+    # timeout is adaptive.                                                                                             #
+    #                                                                                                                  #
+    # ################################################################################################################ #
+    def resendSegment(self, segment):
+        if self.metrics is not None:
+            self.metrics.count("retransmits")
+            if self.metrics.tracing:
+                self.metrics.event("resend", self.currentIteration, seq=segment.seqnum)
+        self.retransmitted.add(segment.seqnum)
+        self.countRetransmits += 1
+        segment.setStartIteration(self.currentIteration)
+
+        timeout = self.timeout
+        if self.adaptive_timeout:
+            timeout = self.rto_estimator.getTimeout(self.segmentTimeoutCounts.get(segment.seqnum, 0))
+        self.retransmit_timers.start(segment.seqnum, self.currentIteration + timeout)
+        self.sendChannel.send(copy.copy(segment))   # After the timer is running, see holdTimer()
 
-                # Resends previously unacknowledged segments
-                for segment in self.sent_segments:
-                    self.sendChannel.send(segment)
+    # ################################################################################################################ #
+    # holdTimer() / releaseTimer()                                                                                     #
+    #                                                                                                                  #
+    # Description:                                                                                                     #
+    # For send channels that queue segments before they reach the wire (rdt_mux.py). holdTimer() pauses the timer of a #
+    # segment that was just queued, releaseTimer() resumes it once the segment really goes out, so time spent waiting  #
+    # in the queue can neither expire it nor count towards its RTT.                                                    #
+    # ################################################################################################################ #
+    def holdTimer(self, seqnum):
+        deadline = self.retransmit_timers.getDeadline(seqnum)
+        if deadline is not None:
+            self.held_timers[seqnum] = deadline - self.currentIteration
+            self.retransmit_timers.cancel(seqnum)
+
+    def releaseTimer(self, seqnum):
+        remaining = self.held_timers.pop(seqnum, None)
+        segment = self.sent_segments.get(seqnum)
+        if remaining is not None and segment is not None:  # Otherwise acked while it was queued
+            segment.setStartIteration(self.currentIteration)
+            self.retransmit_timers.start(seqnum, self.currentIteration + remaining)
 
-                self.timer = self.currentIteration  # Reset timer.
-                self.countSegmentTimeouts += 1  # Implemented suggestion from https://edstem.org/us/courses/90274/discussion/7635500
+    # ################################################################################################################ #
+    # sendParity()                                                                                                     #
+    #                                                                                                                  #
+    # Description:                                                                                                     #
+    # Sends a parity segment from the FEC encoder. Parity is never acked or resent, it only costs bandwidth.           #
+    #                                                                                                                  #
+    #                                                                                                                  #
+    # ################################################################################################################ #
+    def sendParity(self, seqnum, count, payload):
+        segmentParity = RDTSegment(self.checksum_algorithm, self.stream_id)
+        segmentParity.setParity(seqnum, count, payload)
+        self.sendChannel.send(segmentParity)
+        self.countParitySent += 1
+        if self.metrics is not None:
+            self.metrics.count("parity_sent")
+            if self.metrics.tracing:
+                self.metrics.event("parity", self.currentIteration, seq=seqnum, count=count)
 
-        # Processes packets as long as there is data to send, and it fits within the flow control window.
-        while (self.next_sequence_number < len(self.dataToSend)) and (
-                self.next_sequence_number < self.last_ACKed + RDTLayer.FLOW_CONTROL_WIN_SIZE
-        ):
-            segmentSend = Segment()  # Create a new empty packet.
-            seqnum = self.next_sequence_number  # Variable to hold sequence number
+    # ################################################################################################################ #
+    # fastRetransmit()                                                                                                 #
+    #                                                                                                                  #
+    # Description:                                                                                                     #
+    # Resends the segment at last_ACKed right away instead of waiting for its timer. Only fires once per loss, the     #
+    # duplicate ack count has to reset on a new ack before it can fire again.                                          #
+    #                                                                                                                  #
+    # ################################################################################################################ #
+    def fastRetransmit(self):
+        if self.metrics is not None:
+            self.metrics.count("fast_retransmits")
+            if self.metrics.debugging:
+                self.metrics.debug("fast retransmit: " + self.sent_segments[self.last_ACKed].to_string())
+
+        self.resendSegment(self.sent_segments[self.last_ACKed])
+        self.countFastRetransmits += 1
+        if self.last_ACKed >= self.recovery_point:
+            self.window_controller.onFastRetransmit()
+            self.recovery_point = self.next_sequence_number
 
-            data = self.dataToSend[
-                seqnum: seqnum + RDTLayer.DATA_LENGTH]  # Defines the data to send, uses slicing to create a chunk of DATA_LENGTH.
-            segmentSend.setData(seqnum, data)  # Uses setData to create the checksum.
+    # ################################################################################################################ #
+    # retireSegment()                                                                                                  #
+    #                                                                                                                  #
+    # Description:                                                                                                     #
+    # Forgets an acknowledged segment and stops its timer. With sampleRTT the segment's round trip time is fed to the  #
+    # RTO estimator.                                                                                                   #
+    #                                                                                                                  #
+    # ################################################################################################################ #
+    def retireSegment(self, seqnum, sampleRTT=False):
+        segment = self.sent_segments.pop(seqnum)
+        self.retransmit_timers.cancel(seqnum)
+        self.window_controller.onAck(len(segment.payload))
+
+        # Karn's rule, the ack could belong to either copy of a retransmitted segment so it gives no sample.
+        if seqnum in self.retransmitted:
+            self.retransmitted.discard(seqnum)
+        elif sampleRTT:
+            rtt = self.currentIteration - segment.getStartIteration()
+            self.rto_estimator.addSample(rtt)
+            if self.metrics is not None:
+                self.metrics.observe("rtt", rtt)
+                if self.metrics.tracing:
+                    self.metrics.event("rtt", self.currentIteration, seq=seqnum, rtt=rtt)
+            if self.adaptive_timeout:
+                self.timeout = self.rto_estimator.getTimeout()
 
-            print("Sending segment: ", segmentSend.to_string())
+    # ################################################################################################################ #
+    # getSegmentTimeoutCounts()                                                                                        #
+    #                                                                                                                  #
+    # Description:                                                                                                     #
+    # Called by main to get how many times each segment's timer expired, keyed by seqnum                               #
+    #                                                                                                                  #
+    #                                                                                                                  #
+    # ################################################################################################################ #
+    def getSegmentTimeoutCounts(self):
+        return dict(self.segmentTimeoutCounts)
 
-            self.sendChannel.send(segmentSend)  # Sends data through the unreliable channel.
-            self.sent_segments.append(segmentSend)  # Appends the sent segments to a list for tracking.
-            self.next_sequence_number += len(data)  # Sets sequence number for the next segment.
+    # ################################################################################################################ #
+    # sendAck()                                                                                                        #
+    #                                                                                                                  #
+    # Description:                                                                                                     #
+    # Sends a cumulative ack. In selective repeat the seqnum of the segment that triggered the ack is carried in the   #
+    # otherwise unused seqnum field so the sender can retire that one segment.                                         #
+    #                                                                                                                  #
+    # ################################################################################################################ #
+    def sendAck(self, seqnum=-1):
+        if self.mode != RDTLayer.MODE_SELECTIVE_REPEAT:
+            seqnum = -1
+
+        segmentAck = RDTSegment(self.checksum_algorithm, self.stream_id)
+        segmentAck.setAck(self.expected_sequence_number, self.receive_window, seqnum)
+        self.sendChannel.send(segmentAck)
+        self.ack_policy.onAckSent()
+        self.held_ack_seqnum = -1
+
+        if self.metrics is not None:
+            self.metrics.count("acks_sent")
+            if self.metrics.tracing:
+                self.metrics.event("ack", self.currentIteration, ack=self.expected_sequence_number, seq=seqnum)
+            if self.metrics.debugging:
+                self.metrics.debug("Sending ack: " + segmentAck.to_string())
 
+    # ################################################################################################################ #
+    # acknowledge()                                                                                                    #
+    #                                                                                                                  #
+    # Description:                                                                                                     #
+    # Reports a handled data segment to the ack policy and sends the ack now if it says so. inOrder is False for a     #
+    # segment that shows or fills a gap, those are always acked right away.                                            #
+    #                                                                                                                  #
+    # ################################################################################################################ #
+    def acknowledge(self, inOrder, seqnum=-1):
+        if self.ack_policy.onSegment(inOrder, self.currentIteration):
+            self.sendAck(seqnum)
+            return
+        self.held_ack_seqnum = seqnum
+        if self.metrics is not None:
+            self.metrics.count("acks_held")
 
     # ################################################################################################################ #
     # processReceive()                                                                                                 #
@@ -198,58 +694,202 @@ class RDTLayer(object):
         # Iterate through the incoming segments.
         for packet in listIncomingSegments:
             if packet.acknum == -1:                 # If the packet contains data.
-
-                # If the checksum fails, send ack for the expected_sequence_number for that packet to be resent.
-                if not packet.checkChecksum():
-                    segmentAck = Segment()
-                    segmentAck.setAck(self.expected_sequence_number)
-                    self.sendChannel.send(segmentAck)
-
-                # If the packet is out of order, send ack for the expected_sequence_number for that packet to be resent.
-                # This should account for dropped packets as well.
-                elif packet.seqnum != self.expected_sequence_number:
-                    segmentAck = Segment()
-                    segmentAck.setAck(self.expected_sequence_number)
-                    self.sendChannel.send(segmentAck)
-
-                # Else append the packets data to dataReceived and increment the next expect sequence number.
+                if packet.isParity():
+                    self.receiveParity(packet)
                 else:
-                    self.dataReceived += packet.payload
-                    self.expected_sequence_number += len(packet.payload)
-
-                    segmentAck = Segment()
-                    segmentAck.setAck(self.expected_sequence_number)
-                    self.sendChannel.send(segmentAck)
+                    self.receiveData(packet)
 
             else:
+                if packet.window != -1:
+                    self.peer_window = packet.window
+
                 if packet.acknum > self.last_ACKed:
                     self.last_ACKed = packet.acknum
+                    self.duplicate_ack_count = 0
 
+                    acked = []
+                    for seqnum in self.sent_segments:       # Kept in seqnum order
+                        if seqnum >= self.last_ACKed:
+                            break
+                        acked.append(seqnum)
 
-                    self.timer = self.currentIteration
+                    # The segment that triggered the ack gives the RTT sample. Selective repeat acks name it, otherwise
+                    # it's the newest segment the ack covers.
+                    sampleSeqnum = packet.seqnum if packet.seqnum != -1 else (acked[-1] if acked else -1)
+                    for seqnum in acked:
+                        self.retireSegment(seqnum, seqnum == sampleSeqnum)
 
-                    while len(self.sent_segments) > 0 and self.sent_segments[0].seqnum < self.last_ACKed:
-                        self.sent_segments.pop(0)
+                # Duplicate cumulative ack, the receiver is missing the segment at last_ACKed.
+                elif packet.acknum == self.last_ACKed and self.last_ACKed in self.sent_segments:
+                    self.duplicate_ack_count += 1
+                    if self.duplicate_ack_count == self.fast_retransmit_threshold:
+                        self.fastRetransmit()
+
+                # Selective ack, retire just the segment it names.
+                if self.mode == RDTLayer.MODE_SELECTIVE_REPEAT and packet.seqnum in self.sent_segments:
+                    self.retireSegment(packet.seqnum, True)
+
+        if self.fec_decoder is not None:
+            self.fec_decoder.prune(self.expected_sequence_number)
+
+        # Acks the policy held back during this pass, or earlier ones that are now due.
+        if self.ack_policy.flush(self.currentIteration):
+            self.sendAck(self.held_ack_seqnum)
 
         # ############################################################################################################ #
         # What segments have been received?
         # How will you get them back in order?
         # This is where a majority of your logic will be implemented
 
-        if len(listIncomingSegments) > 0:
-            print(f"Processed {len(listIncomingSegments)} packets. Current Data: '{self.dataReceived}'")
+        if len(listIncomingSegments) > 0 and self.metrics is not None:
+            self.metrics.count("segments_received", len(listIncomingSegments))
+            if self.metrics.debugging:
+                self.metrics.debug(f"Processed {len(listIncomingSegments)} packets. "
+                                   f"Received: {len(self.received_data)} characters")
 
         # ############################################################################################################ #
         # How do you respond to what you have received?
         # How can you tell data segments apart from ack segemnts?
-        print("processReceive(): Complete this...")
 
         # Somewhere in here you will be setting the contents of the ack segments to send.
         # The goal is to employ cumulative ack, just like TCP does...
 
         # ############################################################################################################ #
-        # Display response segment
-
-        print("Sending ack: ", )
+        # Display response segment, see sendAck()
 
         # Use the unreliable sendChannel to send the ack packet
+
+    # ################################################################################################################ #
+    # receiveData()                                                                                                    #
+    #                                                                                                                  #
+    # Description:                                                                                                     #
+    # Handles one data segment, received or rebuilt by FEC, and acks it according to the ack policy                    #
+    #                                                                                                                  #
+    #                                                                                                                  #
+    # ################################################################################################################ #
+    def receiveData(self, packet):
+        # If the checksum fails, send ack for the expected_sequence_number for that packet to be resent.
+        if not packet.checkChecksum():
+            if self.metrics is not None:
+                self.metrics.count("checksum_errors")
+                if self.metrics.tracing:
+                    self.metrics.event("corrupt", self.currentIteration, seq=packet.seqnum)
+            self.acknowledge(False)
+            return
+
+        if packet.isCompressed() and self.decompressor is None:
+            self.decompressor = StreamDecompressor()
+
+        recovered = ()
+        if self.fec_decoder is not None:
+            recovered = self.fec_decoder.addData(packet.seqnum, packet.payload)
+
+        if self.mode == RDTLayer.MODE_SELECTIVE_REPEAT:
+            self.receiveSelectiveRepeat(packet)
+
+        # If the packet is out of order, send ack for the expected_sequence_number for that packet to be resent.
+        # This should account for dropped packets as well.
+        elif packet.seqnum != self.expected_sequence_number:
+            if self.metrics is not None:
+                self.metrics.count("out_of_order_segments")
+            self.acknowledge(False)
+
+        # Else append the packets data to received_data and increment the next expect sequence number.
+        else:
+            self.deliverData(packet.payload)
+            self.expected_sequence_number += len(packet.payload)
+            if self.fec_decoder is not None:
+                # Segments kept for FEC that arrived early are delivered now instead of being sent again.
+                while self.expected_sequence_number in self.fec_decoder.data:
+                    payload = self.fec_decoder.data[self.expected_sequence_number]
+                    self.deliverData(payload)
+                    self.expected_sequence_number += len(payload)
+            self.acknowledge(True)
+
+        for seqnum, payload, compressed in recovered:
+            self.receiveRecovered(seqnum, payload, compressed)
+
+    # ################################################################################################################ #
+    # deliverData()                                                                                                    #
+    #                                                                                                                  #
+    # Description:                                                                                                     #
+    # Hands the next in-order payload to the application, inflated first when the stream is compressed. A stream       #
+    # zlib can't inflate raises DecompressionError out of processData(), the data can't be delivered correctly.        #
+    # ################################################################################################################ #
+    def deliverData(self, payload):
+        if self.decompressor is not None:
+            try:
+                payload = self.decompressor.decompress(payload)
+            except DecompressionError:
+                if self.metrics is not None:
+                    self.metrics.count("decompress_errors")
+                    if self.metrics.tracing:
+                        self.metrics.event("decompress_error", self.currentIteration, seq=self.expected_sequence_number)
+                raise
+        self.received_data.append(payload)
+
+    # ################################################################################################################ #
+    # receiveParity()                                                                                                  #
+    #                                                                                                                  #
+    # Description:                                                                                                     #
+    # Hands a parity segment to the FEC decoder. A corrupt one is just dropped, parity is never resent so there is     #
+    # nothing to ask for.                                                                                              #
+    # ################################################################################################################ #
+    def receiveParity(self, packet):
+        if not packet.checkChecksum():
+            if self.metrics is not None:
+                self.metrics.count("checksum_errors")
+            return
+        if self.fec_decoder is None:
+            return
+        for seqnum, payload, compressed in self.fec_decoder.addParity(packet.seqnum, packet.window, packet.payload):
+            self.receiveRecovered(seqnum, payload, compressed)
+
+    # ################################################################################################################ #
+    # receiveRecovered()                                                                                               #
+    #                                                                                                                  #
+    # Description:                                                                                                     #
+    # Handles a segment the FEC decoder rebuilt as if it had arrived, unless the original or a retransmission already  #
+    # did.                                                                                                             #
+    # ################################################################################################################ #
+    def receiveRecovered(self, seqnum, payload, compressed=False):
+        if seqnum < self.expected_sequence_number or seqnum in self.receive_buffer:
+            return                                  # A retransmission got here first
+        self.countRecoveredSegments += 1
+        if self.metrics is not None:
+            self.metrics.count("fec_recovered")
+            if self.metrics.tracing:
+                self.metrics.event("recover", self.currentIteration, seq=seqnum)
+        segment = RDTSegment(self.checksum_algorithm, self.stream_id)
+        segment.setData(seqnum, payload, compressed=compressed)
+        self.receiveData(segment)
+
+    # ################################################################################################################ #
+    # receiveSelectiveRepeat()                                                                                         #
+    #                                                                                                                  #
+    # Description:                                                                                                     #
+    # Buffers a good data segment that falls inside the receive window, then delivers every buffered segment that is   #
+    # now in order.                                                                                                    #
+    #                                                                                                                  #
+    # ################################################################################################################ #
+    def receiveSelectiveRepeat(self, packet):
+        # Anything past the window is dropped, the sender will resend it once the window moves.
+        if packet.seqnum >= self.expected_sequence_number + self.receive_window:
+            self.acknowledge(False)
+            return
+
+        # Only the next expected segment arriving with nothing buffered behind it is plain in-order. Anything else is
+        # early, a duplicate, or fills a gap.
+        inOrder = packet.seqnum == self.expected_sequence_number and not self.receive_buffer
+        if packet.seqnum >= self.expected_sequence_number:
+            self.receive_buffer[packet.seqnum] = packet.payload
+
+        # Drain the buffer in order.
+        while self.expected_sequence_number in self.receive_buffer:
+            payload = self.receive_buffer.pop(self.expected_sequence_number)
+            self.deliverData(payload)
+            self.expected_sequence_number += len(payload)
+
+        if self.metrics is not None:
+            self.metrics.observe("receive_buffer_depth", len(self.receive_buffer))
+        self.acknowledge(inOrder, packet.seqnum)
@@ -1,4 +1,7 @@
+from rdt_ack import ImmediateAck
 from rdt_layer import *
+from rdt_metrics import RDTMetrics
+from rdt_window import FixedWindow
 from unreliable import UnreliableChannel
 
 # #################################################################################################################### #
@@ -48,9 +51,49 @@ dropPackets = True
 delayPackets = True
 dataErrors = True
 
+# Retransmit strategy used by both ends: RDTLayer.MODE_GO_BACK_N or RDTLayer.MODE_SELECTIVE_REPEAT
+retransmitMode = RDTLayer.MODE_SELECTIVE_REPEAT
+client.setRetransmitMode(retransmitMode)
+server.setRetransmitMode(retransmitMode)
+
+# Checksum used by both ends: RDTSegment.CHECKSUM_SUM_OF_ORDS (original), CHECKSUM_INTERNET or CHECKSUM_CRC32
+checksumAlgorithm = RDTSegment.CHECKSUM_CRC32
+client.setChecksumAlgorithm(checksumAlgorithm)
+server.setChecksumAlgorithm(checksumAlgorithm)
+
+# Sender window policy (rdt_window.py). FixedWindow(RDTLayer.FLOW_CONTROL_WIN_SIZE) is the original behavior,
+# AIMDWindow grows the window while the channel is healthy and backs off on loss. The server's advertised window still
+# caps it.
+client.setWindowController(FixedWindow(RDTLayer.FLOW_CONTROL_WIN_SIZE))
+# from rdt_window import AIMDWindow
+# client.setWindowController(AIMDWindow(RDTLayer.DATA_LENGTH))
+# server.setReceiveWindow(64 * RDTLayer.DATA_LENGTH)
+
+# When the server acks (rdt_ack.py). ImmediateAck acks every segment like before, CoalescedAck sends one ack per
+# iteration and DelayedAck every second segment or after two iterations, both still ack gaps right away.
+server.setAckPolicy(ImmediateAck())
+# from rdt_ack import CoalescedAck, DelayedAck
+# server.setAckPolicy(CoalescedAck())
+# server.setAckPolicy(DelayedAck())
+
+# Forward error correction (rdt_fec.py): an XOR parity segment after every 4 data segments lets the server rebuild a
+# single lost or corrupted segment per block without a retransmission. 0 turns it off.
+fecBlockSize = 0
+client.setForwardErrorCorrection(fecBlockSize)
+server.setForwardErrorCorrection(fecBlockSize)
+
+# Payload compression (rdt_compress.py): the client deflates the data with zlib before cutting it into segments and the
+# server inflates it as it is delivered, getDataReceived() is the original text either way. None sends it as is.
+client.setCompression(None)
+# client.setCompression(6)
+
 # Create unreliable communication channels
 clientToServerChannel = UnreliableChannel(outOfOrder,dropPackets,delayPackets,dataErrors)
 serverToClientChannel = UnreliableChannel(outOfOrder,dropPackets,delayPackets,dataErrors)
+# Reproducible runs: same impairments, each channel with its own seeded generator (seeded_channel.py)
+# from seeded_channel import SeededUnreliableChannel
+# clientToServerChannel = SeededUnreliableChannel(outOfOrder,dropPackets,delayPackets,dataErrors,seed=1)
+# serverToClientChannel = SeededUnreliableChannel(outOfOrder,dropPackets,delayPackets,dataErrors,seed=2)
 
 # Creat client and server that connect to unreliable channels
 client.setSendChannel(clientToServerChannel)
@@ -61,6 +104,14 @@ server.setReceiveChannel(clientToServerChannel)
 # Set initial data that will be sent from client to server
 client.setDataToSend(dataToSend)
 
+# Instrumentation. LEVEL_DEBUG logs every segment like before, LEVEL_COUNTERS only collects the numbers for the summary.
+# RDTMetrics(..., trace="client.jsonl") also records every event, profile=True times the send/receive/checksum/channel
+# stages.
+clientMetrics = RDTMetrics(RDTMetrics.LEVEL_DEBUG)
+serverMetrics = RDTMetrics(RDTMetrics.LEVEL_DEBUG)
+client.setInstrumentation(clientMetrics)
+server.setInstrumentation(serverMetrics)
+
 loopIter = 0            # Used to track communication timing in iterations
 while True:
     print("-----------------------------------------------------------------------------------------------------------")
@@ -78,10 +129,12 @@ while True:
 
     # show the data received so far
     print("Main--------------------------------------------")
-    dataReceivedFromClient = server.getDataReceived()
-    print("DataReceivedFromClient: {0}".format(dataReceivedFromClient))
+    # Progress is checked by length so the received string isn't rebuilt and printed every iteration.
+    print("DataReceivedFromClient: {0} of {1} characters".format(server.getReceivedLength(), len(dataToSend)))
 
-    if dataReceivedFromClient == dataToSend:
+    if server.isReceiveComplete(dataToSend):
+        dataReceivedFromClient = server.getDataReceived()
+        print("DataReceivedFromClient: {0}".format(dataReceivedFromClient))
         print('$$$$$$$$ ALL DATA RECEIVED $$$$$$$$')
         break
 
@@ -98,5 +151,18 @@ print("countAckPackets: {0}".format(serverToClientChannel.countAckPackets))
 print("countDroppedAckPackets: {0}".format(serverToClientChannel.countDroppedPackets))
 
 print("# segment timeouts: {0}".format(client.countSegmentTimeouts))
+print("# fast retransmits: {0}".format(client.countFastRetransmits))
+print("# segments recovered by FEC / retransmitted: {0} / {1} ({2} parity segments sent)".format(
+    server.countRecoveredSegments, client.countRetransmits, client.countParitySent))
+print("# payload characters sent (before retransmissions): {0} for {1} characters of data".format(
+    client.next_sequence_number, len(dataToSend)))
+segmentTimeoutCounts = client.getSegmentTimeoutCounts()
+print("# segments that timed out: {0}".format(len(segmentTimeoutCounts)))
+print("# per-segment timeouts (seqnum: count): {0}".format(
+    ", ".join("{0}: {1}".format(seqnum, count) for seqnum, count in sorted(segmentTimeoutCounts.items()))))
+
+print("RTO estimates (iterations): {0}".format(client.getRTOEstimates()))
+print("client metrics: {0}".format(clientMetrics.getSummary()))
+print("server metrics: {0}".format(serverMetrics.getSummary()))
 
 print("TOTAL ITERATIONS: {0}".format(loopIter))
@@ -0,0 +1,216 @@
+import json
+import math
+import sys
+import time
+from collections import Counter
+
+from rdt_buffers import Segmenter
+from rdt_segment import RDTSegment
+
+
+# #################################################################################################################### #
+# RDTMetrics                                                                                                           #
+#                                                                                                                      #
+# Description:                                                                                                         #
+# Instrumentation for RDTLayer, handed to it with setInstrumentation(). A layer without one only pays an "is None"     #
+# check at each hook. Levels, each including the ones before it:                                                      #
+#                                                                                                                      #
+#     LEVEL_COUNTERS - counters (segments sent, retransmits, timeouts, ...) and histograms of per-segment RTT,        #
+#                      window occupancy and receive buffer depth                                                      #
+#     LEVEL_EVENTS   - plus one JSON line per event to trace (a path or a writable file), see readTrace()             #
+#     LEVEL_DEBUG    - plus the human readable per-segment log rdt_main.py used to print, written to log              #
+#                                                                                                                      #
+# profile=True also attributes wall-clock time to the send, receive, checksum and channel stages, see RDTProfiler.    #
+#                                                                                                                      #
+# Notes:                                                                                                               #
+# One RDTMetrics per layer keeps client and server numbers apart, sharing one merges them.                            #
+#                                                                                                                      #
+# #################################################################################################################### #
+
+
+class RDTMetrics(object):
+    LEVEL_COUNTERS = 1
+    LEVEL_EVENTS = 2
+    LEVEL_DEBUG = 3
+
+    def __init__(self, level=LEVEL_COUNTERS, trace=None, log=None, profile=False):
+        self.level = level
+        self.counters = Counter()
+        self.histograms = {}
+        self.ownsTrace = isinstance(trace, str)
+        self.trace = open(trace, "w") if self.ownsTrace else trace
+        self.tracing = level >= RDTMetrics.LEVEL_EVENTS and self.trace is not None
+        self.debugging = level >= RDTMetrics.LEVEL_DEBUG
+        self.log = log if log is not None else sys.stdout
+        self.profiler = RDTProfiler() if profile else None
+
+    def count(self, name, amount=1):
+        self.counters[name] += amount
+
+    def observe(self, name, value):
+        histogram = self.histograms.get(name)
+        if histogram is None:
+            histogram = self.histograms[name] = Histogram()
+        histogram.add(value)
+
+    # Writes one trace line, only when tracing. Callers check metrics.tracing first so the fields aren't even built.
+    def event(self, kind, iteration, **fields):
+        if self.tracing:
+            fields["t"] = iteration
+            fields["ev"] = kind
+            self.trace.write(json.dumps(fields, separators=(",", ":")) + "\n")
+
+    def debug(self, message):
+        if self.debugging:
+            print(message, file=self.log)
+
+    def close(self):
+        if self.ownsTrace:
+            self.trace.close()
+        self.tracing = False
+
+    # ################################################################################################################ #
+    # getSummary()                                                                                                     #
+    #                                                                                                                  #
+    # Description:                                                                                                     #
+    # Counters, histogram statistics and profile as plain dicts, ready for json.dump()                                 #
+    #                                                                                                                  #
+    # ################################################################################################################ #
+    def getSummary(self):
+        summary = {
+            "counters": dict(self.counters),
+            "histograms": {name: histogram.getSummary() for name, histogram in self.histograms.items()},
+        }
+        if self.profiler is not None:
+            summary["profile"] = self.profiler.getSummary()
+        return summary
+
+
+# #################################################################################################################### #
+# Histogram                                                                                                            #
+#                                                                                                                      #
+# Description:                                                                                                         #
+# Exact counts per value. Everything the layer observes is a small number of iterations, segments or characters, so   #
+# there are few distinct values and percentiles come out exact.                                                        #
+#                                                                                                                      #
+# #################################################################################################################### #
+
+
+class Histogram(object):
+
+    def __init__(self):
+        self.values = Counter()
+        self.count = 0
+        self.total = 0
+
+    def add(self, value):
+        self.values[value] += 1
+        self.count += 1
+        self.total += value
+
+    # Nearest rank percentile
+    def percentile(self, p):
+        if self.count == 0:
+            return None
+        rank = max(1, math.ceil(p / 100 * self.count))
+        seen = 0
+        for value in sorted(self.values):
+            seen += self.values[value]
+            if seen >= rank:
+                return value
+
+    def getSummary(self):
+        if self.count == 0:
+            return {"count": 0}
+        return {"count": self.count, "mean": self.total / self.count, "min": min(self.values),
+                "p50": self.percentile(50), "p90": self.percentile(90), "p99": self.percentile(99),
+                "max": max(self.values)}
+
+
+# #################################################################################################################### #
+# RDTProfiler                                                                                                          #
+#                                                                                                                      #
+# Description:                                                                                                         #
+# Attributes time to stages by wrapping the methods that do the work, nothing is added to the code path when it's     #
+# not installed:                                                                                                       #
+#                                                                                                                      #
+#     send      - RDTLayer.processSend()                                                                               #
+#     receive   - RDTLayer.processReceiveAndSendRespond()                                                              #
+#     checksum  - computing and checking checksums (RDTSegment, Segmenter)                                             #
+#     channel   - the channels' send(), receive() and processData()                                                    #
+#                                                                                                                      #
+# Times are exclusive, checksum and channel time spent inside send is not counted as send.                            #
+#                                                                                                                      #
+# Notes:                                                                                                               #
+# Layers and channels are wrapped per instance. Checksums are wrapped on the classes, so while any profiler is        #
+# installed every segment in the process is timed, uninstall() puts the classes back.                                  #
+#                                                                                                                      #
+# #################################################################################################################### #
+
+
+class RDTProfiler(object):
+    STAGE_SEND = "send"
+    STAGE_RECEIVE = "receive"
+    STAGE_CHECKSUM = "checksum"
+    STAGE_CHANNEL = "channel"
+    CHECKSUM_METHODS = ((RDTSegment, "computeChecksum"), (RDTSegment, "checkChecksum"), (Segmenter, "checksum"))
+
+    def __init__(self):
+        self.seconds = Counter()
+        self.calls = Counter()
+        self.stack = []                     # Child time of the stages currently running
+        self.wrapped = set()                # ids of channels already wrapped
+        self.patched = []                   # (class, name, original) to put back
+
+    def wrap(self, stage, function):
+        def timed(*args, **kwargs):
+            start = time.perf_counter()
+            self.stack.append(0.0)
+            try:
+                return function(*args, **kwargs)
+            finally:
+                elapsed = time.perf_counter() - start
+                self.seconds[stage] += elapsed - self.stack.pop()
+                self.calls[stage] += 1
+                if self.stack:
+                    self.stack[-1] += elapsed
+        return timed
+
+    def installLayer(self, layer):
+        layer.processSend = self.wrap(RDTProfiler.STAGE_SEND, layer.processSend)
+        layer.processReceiveAndSendRespond = self.wrap(RDTProfiler.STAGE_RECEIVE, layer.processReceiveAndSendRespond)
+        if not self.patched:
+            for cls, name in RDTProfiler.CHECKSUM_METHODS:
+                original = cls.__dict__[name]
+                self.patched.append((cls, name, original))
+                setattr(cls, name, self.wrap(RDTProfiler.STAGE_CHECKSUM, original))
+
+    def installChannel(self, channel):
+        if channel is None or id(channel) in self.wrapped:
+            return
+        self.wrapped.add(id(channel))
+        for name in ("send", "receive", "processData"):
+            if hasattr(channel, name):
+                setattr(channel, name, self.wrap(RDTProfiler.STAGE_CHANNEL, getattr(channel, name)))
+
+    def uninstall(self):
+        for cls, name, original in self.patched:
+            setattr(cls, name, original)
+        self.patched = []
+
+    def getSummary(self):
+        return {stage: {"calls": self.calls[stage], "seconds": self.seconds[stage]} for stage in self.calls}
+
+
+# #################################################################################################################### #
+# readTrace()                                                                                                          #
+#                                                                                                                      #
+# Description:                                                                                                         #
+# The events of a JSONL trace as dicts, in order, for replaying a run after the fact                                   #
+#                                                                                                                      #
+# #################################################################################################################### #
+def readTrace(path):
+    with open(path) as trace:
+        for line in trace:
+            if line.strip():
+                yield json.loads(line)
@@ -0,0 +1,224 @@
+import argparse
+from collections import deque
+
+from rdt_layer import RDTLayer
+from seeded_channel import SeededUnreliableChannel
+
+
+# #################################################################################################################### #
+# RDTMultiplexer                                                                                                       #
+#                                                                                                                      #
+# Description:                                                                                                         #
+# Runs many independent RDT streams over one pair of channels. Every stream is its own RDTLayer with its own sequence  #
+# space, stamped with its stream id, so a stream can send and receive at the same time. Incoming segments are          #
+# demultiplexed by streamId and outgoing ones are scheduled round-robin, one segment per stream per turn, so a busy    #
+# stream can't starve the others when the per-tick budget is limited.                                                 #
+#                                                                                                                      #
+#                                                                                                                      #
+# Notes:                                                                                                               #
+# Segments for a stream this end doesn't know yet open it (acceptStreams), that's how the server side learns about     #
+# new transfers. layerFactory(streamId) can return a preconfigured RDTLayer.                                           #
+#                                                                                                                      #
+# A data segment's retransmission timer is paused while it waits for the scheduler (RDTLayer.holdTimer() and           #
+# releaseTimer()), and a stream's queue holds one copy of each seqnum at most, so it never grows past the window.      #
+# Otherwise segments waiting for their turn under a small budget time out in the queue and are queued again, and the   #
+# duplicates crowd out new data until the transfer collapses.                                                          #
+#                                                                                                                      #
+# #################################################################################################################### #
+
+
+class MuxStreamChannel(object):
+
+    def __init__(self, layer):
+        self.layer = layer
+        self.inbox = []
+        self.outbox = deque()
+        self.queued = {}                        # seqnum -> iteration a data segment in the outbox was queued on
+
+    # A resend of a segment that has been waiting since an earlier tick is dropped, the queued copy goes out first.
+    def send(self, seg):
+        if isDataSegment(seg):
+            queuedOn = self.queued.setdefault(seg.seqnum, self.layer.currentIteration)
+            if queuedOn < self.layer.currentIteration:
+                return
+            self.layer.holdTimer(seg.seqnum)
+        self.outbox.append(seg)
+
+    # Next segment for the shared channel, its timer resumes now.
+    def take(self):
+        seg = self.outbox.popleft()
+        if isDataSegment(seg):
+            self.queued.pop(seg.seqnum, None)
+            self.layer.releaseTimer(seg.seqnum)
+        return seg
+
+    def receive(self):
+        new_list = self.inbox
+        self.inbox = []
+        return new_list
+
+
+class RDTMultiplexer(object):
+
+    def __init__(self, sendChannel, receiveChannel, maxSegmentsPerTick=None, layerFactory=None, acceptStreams=True):
+        self.sendChannel = sendChannel
+        self.receiveChannel = receiveChannel
+        self.maxSegmentsPerTick = maxSegmentsPerTick
+        self.layerFactory = layerFactory if layerFactory is not None else (lambda streamId: RDTLayer())
+        self.acceptStreams = acceptStreams
+        self.onStreamOpened = None              # Called with (streamId, layer) when a peer opens a stream
+        self.layers = {}                        # streamId -> RDTLayer
+        self.channels = {}                      # streamId -> MuxStreamChannel
+        self.order = []                         # streamIds in the order they were opened
+        self.turn = 0                           # Rotates who goes first each tick
+        self.countUnknownStreamSegments = 0
+
+    # ################################################################################################################ #
+    # openStream()                                                                                                     #
+    #                                                                                                                  #
+    # Description:                                                                                                     #
+    # Creates the RDTLayer for streamId, optionally with data to send, and returns it                                  #
+    #                                                                                                                  #
+    # ################################################################################################################ #
+    def openStream(self, streamId, dataToSend=None):
+        if streamId in self.layers:
+            raise ValueError(f"Stream {streamId} is already open")
+
+        layer = self.layerFactory(streamId)
+        channel = MuxStreamChannel(layer)
+        layer.setStreamId(streamId)
+        layer.setSendChannel(channel)
+        layer.setReceiveChannel(channel)
+        if dataToSend is not None:
+            layer.setDataToSend(dataToSend)
+
+        self.layers[streamId] = layer
+        self.channels[streamId] = channel
+        self.order.append(streamId)
+        return layer
+
+    def getStream(self, streamId):
+        return self.layers[streamId]
+
+    # ################################################################################################################ #
+    # processData()                                                                                                    #
+    #                                                                                                                  #
+    # Description:                                                                                                     #
+    # "timeslice" for every stream. Called by main once per iteration, like RDTLayer.processData()                     #
+    #                                                                                                                  #
+    # ################################################################################################################ #
+    def processData(self):
+        self.demultiplex()
+
+        count = len(self.order)
+        for i in range(count):
+            self.layers[self.order[(self.turn + i) % count]].processData()
+
+        self.schedule()
+        self.turn = (self.turn + 1) % max(1, count)
+
+    def demultiplex(self):
+        for seg in self.receiveChannel.receive():
+            streamId = getattr(seg, "streamId", 0)
+            if streamId not in self.channels:
+                if not self.acceptStreams:
+                    self.countUnknownStreamSegments += 1
+                    continue
+                layer = self.openStream(streamId)
+                if self.onStreamOpened is not None:
+                    self.onStreamOpened(streamId, layer)
+            self.channels[streamId].inbox.append(seg)
+
+    # ################################################################################################################ #
+    # schedule()                                                                                                       #
+    #                                                                                                                  #
+    # Description:                                                                                                     #
+    # Moves queued segments to the shared channel round-robin. Whatever doesn't fit in maxSegmentsPerTick waits for    #
+    # the next tick at the front of its stream's queue.                                                                #
+    # ################################################################################################################ #
+    def schedule(self):
+        count = len(self.order)
+        active = deque()
+        for i in range(count):
+            streamId = self.order[(self.turn + i) % count]
+            if self.channels[streamId].outbox:
+                active.append(streamId)
+
+        budget = self.maxSegmentsPerTick
+        while active and (budget is None or budget > 0):
+            streamId = active.popleft()
+            channel = self.channels[streamId]
+            self.sendChannel.send(channel.take())
+            if channel.outbox:
+                active.append(streamId)
+            if budget is not None:
+                budget -= 1
+
+    def getQueuedSegments(self):
+        return sum(len(channel.outbox) for channel in self.channels.values())
+
+
+# Data segments are the ones with a retransmission timer, acks and FEC parity are never resent.
+def isDataSegment(seg):
+    return seg.acknum == -1 and not seg.isParity()
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Many concurrent RDT streams over one channel pair")
+    parser.add_argument("--streams", type=int, default=100, help="streams in each direction")
+    parser.add_argument("--size", type=int, default=200, help="characters per stream")
+    parser.add_argument("--budget", type=int, default=None, help="segments each end may send per iteration")
+    parser.add_argument("--mode", default=RDTLayer.MODE_SELECTIVE_REPEAT,
+                        choices=[RDTLayer.MODE_GO_BACK_N, RDTLayer.MODE_SELECTIVE_REPEAT])
+    parser.add_argument("--seed", type=int, default=None)
+    args = parser.parse_args()
+
+    def layerFactory(streamId):
+        layer = RDTLayer()
+        layer.setRetransmitMode(args.mode)
+        return layer
+
+    seeds = (None, None) if args.seed is None else (args.seed, args.seed + 1)
+    clientToServerChannel = SeededUnreliableChannel(True, True, True, True, seed=seeds[0])
+    serverToClientChannel = SeededUnreliableChannel(True, True, True, True, seed=seeds[1])
+    client = RDTMultiplexer(clientToServerChannel, serverToClientChannel, args.budget, layerFactory)
+    server = RDTMultiplexer(serverToClientChannel, clientToServerChannel, args.budget, layerFactory)
+
+    # Stream i carries one payload client -> server and another server -> client.
+    payloads = {streamId: ("stream {0:05d} ".format(streamId) * args.size)[:args.size]
+                for streamId in range(1, args.streams + 1)}
+    for streamId, payload in payloads.items():
+        client.openStream(streamId, payload)
+    server.onStreamOpened = lambda streamId, layer: layer.setDataToSend(payloads[streamId][::-1])
+
+    completed = {}                                  # (direction, streamId) -> iteration it completed on
+    loopIter = 0
+    while len(completed) < 2 * len(payloads):
+        loopIter += 1
+        client.processData()
+        clientToServerChannel.processData()
+        server.processData()
+        serverToClientChannel.processData()
+
+        for streamId, payload in payloads.items():
+            if ("up", streamId) not in completed and streamId in server.layers and \
+                    server.layers[streamId].isReceiveComplete(len(payload)):
+                completed[("up", streamId)] = loopIter
+            if ("down", streamId) not in completed and client.layers[streamId].isReceiveComplete(len(payload)):
+                completed[("down", streamId)] = loopIter
+
+    correct = all(server.layers[streamId].isReceiveComplete(payload) and
+                  client.layers[streamId].isReceiveComplete(payload[::-1]) for streamId, payload in payloads.items())
+    times = sorted(completed.values())
+    totalChars = 2 * sum(len(payload) for payload in payloads.values())
+
+    print("streams: {0} each way, all correct: {1}".format(len(payloads), correct))
+    print("TOTAL ITERATIONS: {0}".format(loopIter))
+    print("aggregate throughput: {0:.1f} chars/iteration".format(totalChars / loopIter))
+    print("stream completion (iterations): min {0}, median {1}, p99 {2}, max {3}".format(
+        times[0], times[len(times) // 2], times[min(len(times) - 1, len(times) * 99 // 100)], times[-1]))
+    print("countSentPackets: {0}".format(clientToServerChannel.countSentPackets + serverToClientChannel.countSentPackets))
+
+
+if __name__ == "__main__":
+    main()
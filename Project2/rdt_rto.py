@@ -0,0 +1,76 @@
+import math
+
+
+# #################################################################################################################### #
+# RTOEstimator                                                                                                         #
+#                                                                                                                      #
+# Description:                                                                                                         #
+# Estimates the round trip time in iterations with Jacobson/Karels smoothing and derives the retransmission timeout   #
+# (RTO) from it, the same way TCP does (RFC 6298).                                                                     #
+#                                                                                                                      #
+#     SRTT   = (1 - ALPHA) * SRTT + ALPHA * R                                                                          #
+#     RTTVAR = (1 - BETA) * RTTVAR + BETA * |SRTT - R|                                                                 #
+#     RTO    = SRTT + K * RTTVAR                                                                                       #
+#                                                                                                                      #
+# Notes:                                                                                                               #
+# Karn's rule is up to the caller, samples from retransmitted segments must not be added. Backoff is per segment, a   #
+# segment that has timed out n times waits RTO * 2^n, so one unlucky segment doesn't slow down the rest.               #
+#                                                                                                                      #
+# #################################################################################################################### #
+
+
+class RTOEstimator(object):
+    ALPHA = 1 / 8
+    BETA = 1 / 4
+    K = 4
+    INITIAL_RTO = 10            # in iterations, the old fixed timeout
+    MIN_RTO = 2                 # an ack can't be processed before the iteration after its segment was sent
+    MAX_RTO = 64
+
+    def __init__(self, initialRTO=INITIAL_RTO, minRTO=MIN_RTO, maxRTO=MAX_RTO):
+        self.srtt = None
+        self.rttvar = None
+        self.minRTO = minRTO
+        self.maxRTO = maxRTO
+        self.rto = initialRTO
+        self.countSamples = 0
+
+    # ################################################################################################################ #
+    # addSample()                                                                                                      #
+    #                                                                                                                  #
+    # Description:                                                                                                     #
+    # Folds one round trip time measurement (in iterations) into the estimate and recomputes the RTO                   #
+    #                                                                                                                  #
+    # ################################################################################################################ #
+    def addSample(self, rtt):
+        if self.srtt is None:
+            self.srtt = rtt
+            self.rttvar = rtt / 2
+        else:
+            self.rttvar = (1 - RTOEstimator.BETA) * self.rttvar + RTOEstimator.BETA * abs(self.srtt - rtt)
+            self.srtt = (1 - RTOEstimator.ALPHA) * self.srtt + RTOEstimator.ALPHA * rtt
+
+        self.countSamples += 1
+        self.rto = self.clamp(self.srtt + RTOEstimator.K * self.rttvar)
+
+    def clamp(self, rto):
+        return max(self.minRTO, min(self.maxRTO, rto))
+
+    # ################################################################################################################ #
+    # getTimeout()                                                                                                     #
+    #                                                                                                                  #
+    # Description:                                                                                                     #
+    # The RTO rounded up to whole iterations, backed off exponentially for a segment that already timed out retries    #
+    # times                                                                                                            #
+    # ################################################################################################################ #
+    def getTimeout(self, retries=0):
+        return math.ceil(self.clamp(self.rto * 2 ** retries))
+
+    def getEstimates(self):
+        return {
+            "srtt": self.srtt,
+            "rttvar": self.rttvar,
+            "rto": self.rto,
+            "timeout": self.getTimeout(),
+            "samples": self.countSamples,
+        }
@@ -0,0 +1,139 @@
+import struct
+import sys
+import zlib
+from array import array
+
+from segment import Segment
+
+
+# #################################################################################################################### #
+# RDTSegment                                                                                                           #
+#                                                                                                                      #
+# Description:                                                                                                         #
+# Segment with the extra header fields the RDT layer needs. segment.py is left untouched so the unreliable channel    #
+# keeps working with either type.                                                                                      #
+#                                                                                                                      #
+#                                                                                                                      #
+# Notes:                                                                                                               #
+# window is the receive window advertised in acks, in characters past acknum. It is -1 on data segments and            #
+# WINDOW_COMPRESSED on data segments carrying compressed payload (rdt_compress.py). On the parity segments of forward  #
+# error correction it holds how many data segments they cover (rdt_fec.py). streamId tells multiplexed transfers       #
+# apart (rdt_mux.py), every stream has its own sequence space. Both are covered by the checksum.                       #
+#                                                                                                                      #
+# The checksum algorithm is recorded on the segment. CHECKSUM_SUM_OF_ORDS is the original Segment checksum over       #
+# to_string(), the other two work straight on the packed header fields and the encoded payload (payloadEncoding()):    #
+#                                                                                                                      #
+#     CHECKSUM_INTERNET - 16 bit ones' complement sum (RFC 1071)                                                       #
+#     CHECKSUM_CRC32    - zlib.crc32                                                                                   #
+#                                                                                                                      #
+# #################################################################################################################### #
+
+
+class RDTSegment(Segment):
+    CHECKSUM_SUM_OF_ORDS = "sum-of-ords"
+    CHECKSUM_INTERNET = "internet"
+    CHECKSUM_CRC32 = "crc32"
+    CHECKSUM_ALGORITHMS = (CHECKSUM_SUM_OF_ORDS, CHECKSUM_INTERNET, CHECKSUM_CRC32)
+
+    HEADER = struct.Struct("!iiiI")     # seqnum, acknum, window, streamId
+    WINDOW_COMPRESSED = -2              # window of a data segment whose payload is compressed
+
+    def __init__(self, checksumAlgorithm=CHECKSUM_SUM_OF_ORDS, streamId=0):
+        super().__init__()
+        if checksumAlgorithm not in RDTSegment.CHECKSUM_ALGORITHMS:
+            raise ValueError(f"Unknown checksum algorithm: {checksumAlgorithm}")
+        self.window = -1
+        self.streamId = streamId
+        self.checksumAlgorithm = checksumAlgorithm
+
+    # checksum can be passed in when it was already computed for this seq and data (see rdt_buffers.Segmenter).
+    def setData(self, seq, data, checksum=None, compressed=False):
+        self.seqnum = seq
+        self.acknum = -1
+        self.window = RDTSegment.WINDOW_COMPRESSED if compressed else -1
+        self.payload = data
+        self.checksum = self.computeChecksum() if checksum is None else checksum
+
+    # Parity over the count data segments starting at seq, see rdt_fec.py.
+    def setParity(self, seq, count, data):
+        self.seqnum = seq
+        self.acknum = -1
+        self.window = count
+        self.payload = data
+        self.checksum = self.computeChecksum()
+
+    def isParity(self):
+        return self.acknum == -1 and self.window > 0
+
+    def isCompressed(self):
+        return self.acknum == -1 and self.window == RDTSegment.WINDOW_COMPRESSED
+
+    # seq is only used by selective repeat, to name the segment that triggered the ack.
+    def setAck(self, ack, window=-1, seq=-1):
+        self.seqnum = seq
+        self.acknum = ack
+        self.window = window
+        self.payload = ''
+        self.checksum = self.computeChecksum()
+
+    def to_string(self):
+        return "seq: {0}, ack: {1}, win: {2}, stream: {3}, data: {4}"\
+        .format(self.seqnum, self.acknum, self.window, self.streamId, self.payload)
+
+    def checkChecksum(self):
+        return self.computeChecksum() == self.checksum
+
+    # ################################################################################################################ #
+    # computeChecksum()                                                                                                #
+    #                                                                                                                  #
+    # Description:                                                                                                     #
+    # Checksum of the current header fields and payload with this segment's algorithm                                  #
+    #                                                                                                                  #
+    # ################################################################################################################ #
+    def computeChecksum(self):
+        if self.checksumAlgorithm == RDTSegment.CHECKSUM_SUM_OF_ORDS:
+            return self.calc_checksum(self.to_string())
+
+        data = (RDTSegment.HEADER.pack(self.seqnum, self.acknum, self.window, self.streamId)
+                + self.payload.encode(payloadEncoding(self.acknum, self.window)))
+        if self.checksumAlgorithm == RDTSegment.CHECKSUM_CRC32:
+            return zlib.crc32(data)
+        return internetChecksum(data)
+
+
+# Compressed payload and parity are bytes carried one per character, they are checksummed and sent as latin-1 so they
+# don't grow to two UTF-8 bytes per character above 0x7F. Everything else is UTF-8 text.
+def payloadEncoding(acknum, window):
+    if acknum == -1 and (window == RDTSegment.WINDOW_COMPRESSED or window > 0):
+        return "latin-1"
+    return "utf-8"
+
+
+# #################################################################################################################### #
+# internetChecksum()                                                                                                   #
+#                                                                                                                      #
+# Description:                                                                                                         #
+# 16 bit ones' complement of the ones' complement sum of data (RFC 1071). The sum is additive, so pieces starting on   #
+# even offsets can be summed separately with onesComplementSum() and finished together with finishInternetChecksum().  #
+#                                                                                                                      #
+# #################################################################################################################### #
+def internetChecksum(data):
+    return finishInternetChecksum(onesComplementSum(data))
+
+
+# Sums data as native 16 bit words. Odd length data is padded with a zero byte.
+def onesComplementSum(data):
+    if len(data) % 2:
+        data = bytes(data) + b"\x00"
+    words = array("H")
+    words.frombytes(data)
+    return sum(words)
+
+
+# Folds the carries, swaps back to network order (RFC 1071, byte order independence) and complements.
+def finishInternetChecksum(total):
+    while total >> 16:
+        total = (total & 0xFFFF) + (total >> 16)
+    if sys.byteorder == "little":
+        total = ((total & 0xFF) << 8) | (total >> 8)
+    return ~total & 0xFFFF
@@ -0,0 +1,91 @@
+import heapq
+
+
+# #################################################################################################################### #
+# RetransmitTimerHeap                                                                                                  #
+#                                                                                                                      #
+# Description:                                                                                                         #
+# Per-segment retransmission deadlines (in iterations) kept in a min-heap keyed by deadline. Only the deadlines that   #
+# have expired are ever looked at, so a tick costs O(expired * log n) instead of a scan over the whole window.         #
+#                                                                                                                      #
+#                                                                                                                      #
+# Notes:                                                                                                               #
+# Cancelled and restarted timers are removed lazily, the heap entry is skipped when it no longer matches the live      #
+# deadline for its seqnum.                                                                                             #
+#                                                                                                                      #
+# #################################################################################################################### #
+
+
+class RetransmitTimerHeap(object):
+
+    def __init__(self):
+        self.heap = []                      # (deadline, seqnum) entries, may include stale ones
+        self.deadlines = {}                 # seqnum -> live deadline
+
+    def __len__(self):
+        return len(self.deadlines)
+
+    def __contains__(self, seqnum):
+        return seqnum in self.deadlines
+
+    # ################################################################################################################ #
+    # start()                                                                                                          #
+    #                                                                                                                  #
+    # Description:                                                                                                     #
+    # Starts (or restarts) the timer for seqnum so that it expires on the given iteration                              #
+    #                                                                                                                  #
+    # ################################################################################################################ #
+    def start(self, seqnum, deadline):
+        self.deadlines[seqnum] = deadline
+        heapq.heappush(self.heap, (deadline, seqnum))
+
+        # Keep stale entries from piling up when timers are restarted a lot.
+        if len(self.heap) > 2 * len(self.deadlines) + 16:
+            self.heap = [(deadline, seqnum) for seqnum, deadline in self.deadlines.items()]
+            heapq.heapify(self.heap)
+
+    # Iteration seqnum's timer expires on, None if it isn't running.
+    def getDeadline(self, seqnum):
+        return self.deadlines.get(seqnum)
+
+    # ################################################################################################################ #
+    # cancel()                                                                                                         #
+    #                                                                                                                  #
+    # Description:                                                                                                     #
+    # Stops the timer for seqnum, does nothing if it isn't running                                                     #
+    #                                                                                                                  #
+    # ################################################################################################################ #
+    def cancel(self, seqnum):
+        self.deadlines.pop(seqnum, None)
+
+    # ################################################################################################################ #
+    # popExpired()                                                                                                     #
+    #                                                                                                                  #
+    # Description:                                                                                                     #
+    # Removes and returns the seqnums whose deadline is at or before the current iteration, earliest first             #
+    #                                                                                                                  #
+    # ################################################################################################################ #
+    def popExpired(self, currentIteration):
+        expired = []
+        while self.heap and self.heap[0][0] <= currentIteration:
+            deadline, seqnum = heapq.heappop(self.heap)
+            if self.deadlines.get(seqnum) == deadline:
+                del self.deadlines[seqnum]
+                expired.append(seqnum)
+        return expired
+
+    # ################################################################################################################ #
+    # nextDeadline()                                                                                                   #
+    #                                                                                                                  #
+    # Description:                                                                                                     #
+    # Returns the earliest live deadline, or None when no timers are running                                           #
+    #                                                                                                                  #
+    # ################################################################################################################ #
+    def nextDeadline(self):
+        while self.heap and self.deadlines.get(self.heap[0][1]) != self.heap[0][0]:
+            heapq.heappop(self.heap)
+        return self.heap[0][0] if self.heap else None
+
+    def clear(self):
+        self.heap = []
+        self.deadlines = {}
@@ -0,0 +1,88 @@
+# #################################################################################################################### #
+# Window controllers                                                                                                   #
+#                                                                                                                      #
+# Description:                                                                                                         #
+# Decide how many characters past the last acked one the sender may have in flight. The RDT layer reports acks and     #
+# loss signals, the controller answers with the congestion window. The receiver's advertised window still caps it.     #
+#                                                                                                                      #
+#     FixedWindow - a constant window, the original FLOW_CONTROL_WIN_SIZE behavior                                     #
+#     AIMDWindow  - TCP Reno style slow start, additive increase and multiplicative decrease                           #
+#                                                                                                                      #
+# Notes:                                                                                                               #
+# Any object with onAck(), onTimeout(), onFastRetransmit() and getWindow() can be handed to                            #
+# RDTLayer.setWindowController().                                                                                      #
+#                                                                                                                      #
+# #################################################################################################################### #
+
+
+class FixedWindow(object):
+
+    def __init__(self, size):
+        self.size = size
+
+    def onAck(self, charsAcked):
+        pass
+
+    def onTimeout(self):
+        pass
+
+    def onFastRetransmit(self):
+        pass
+
+    def getWindow(self):
+        return self.size
+
+
+class AIMDWindow(object):
+    INITIAL_SEGMENTS = 1        # cwnd after a timeout and at start, in segments
+    INITIAL_SSTHRESH = 64       # in segments
+    MAX_SEGMENTS = 256          # Hard cap so a clean channel can't flood the send queue
+
+    def __init__(self, segmentSize, maxWindow=None):
+        self.segmentSize = segmentSize
+        self.maxWindow = maxWindow if maxWindow is not None else AIMDWindow.MAX_SEGMENTS * segmentSize
+        self.cwnd = AIMDWindow.INITIAL_SEGMENTS * segmentSize
+        self.ssthresh = AIMDWindow.INITIAL_SSTHRESH * segmentSize
+        self.countTimeouts = 0
+        self.countFastRetransmits = 0
+
+    # ################################################################################################################ #
+    # onAck()                                                                                                          #
+    #                                                                                                                  #
+    # Description:                                                                                                     #
+    # Slow start grows cwnd by the amount acked (doubling every round trip), congestion avoidance by about one segment #
+    # per round trip.                                                                                                  #
+    # ################################################################################################################ #
+    def onAck(self, charsAcked):
+        if self.cwnd < self.ssthresh:
+            self.cwnd += charsAcked
+        else:
+            self.cwnd += self.segmentSize * charsAcked / self.cwnd
+        self.cwnd = min(self.cwnd, self.maxWindow)
+
+    # ################################################################################################################ #
+    # onTimeout()                                                                                                      #
+    #                                                                                                                  #
+    # Description:                                                                                                     #
+    # A timeout is a strong loss signal, halve ssthresh and go back to slow start                                      #
+    #                                                                                                                  #
+    # ################################################################################################################ #
+    def onTimeout(self):
+        self.countTimeouts += 1
+        self.ssthresh = max(self.cwnd / 2, 2 * self.segmentSize)
+        self.cwnd = AIMDWindow.INITIAL_SEGMENTS * self.segmentSize
+
+    # ################################################################################################################ #
+    # onFastRetransmit()                                                                                               #
+    #                                                                                                                  #
+    # Description:                                                                                                     #
+    # Duplicate acks mean data is still getting through, halve the window but skip slow start (fast recovery)          #
+    #                                                                                                                  #
+    # ################################################################################################################ #
+    def onFastRetransmit(self):
+        self.countFastRetransmits += 1
+        self.ssthresh = max(self.cwnd / 2, 2 * self.segmentSize)
+        self.cwnd = self.ssthresh
+
+    def getWindow(self):
+        return int(self.cwnd)
@@ -0,0 +1,179 @@
+import struct
+import zlib
+
+from rdt_segment import RDTSegment, internetChecksum, payloadEncoding
+
+
+# #################################################################################################################### #
+# Wire format                                                                                                          #
+#                                                                                                                      #
+# Description:                                                                                                         #
+# Compact binary encoding of a segment, a fixed 18 byte big-endian header followed by the raw payload:                 #
+#                                                                                                                      #
+#     offset  size  field                                                                                              #
+#          0     4  seqnum     (signed, -1 on acks)                                                                    #
+#          4     4  acknum     (signed, -1 on data)                                                                    #
+#          8     4  window     (signed, -1 when not advertised)                                                        #
+#         12     2  flags      (FLAG_ACK, FLAG_STREAM, checksum algorithm in FLAG_CHECKSUM_MASK)                       #
+#         14     4  checksum   (low 32 bits)                                                                           #
+#         18     4  streamId   (only when FLAG_STREAM is set, stream 0 leaves it out)                                  #
+#      18/22     -  payload                                                                                            #
+#                                                                                                                      #
+# The payload length is whatever is left of the datagram, so it isn't stored. Text payload is UTF-8, compressed        #
+# payload and FEC parity are latin-1, one byte per character (rdt_segment.payloadEncoding()).                          #
+#                                                                                                                      #
+# Notes:                                                                                                               #
+# PackedSegment decodes without copying, the payload stays a memoryview into the received buffer until it's asked for  #
+# as a str. Internet and CRC32 checksums are verified straight on the bytes.                                           #
+#                                                                                                                      #
+# #################################################################################################################### #
+
+HEADER = struct.Struct("!iiiHI")
+STREAM_ID = struct.Struct("!I")
+
+FLAG_ACK = 0x0001
+FLAG_CHECKSUM_SHIFT = 1
+FLAG_CHECKSUM_MASK = 0x0006
+FLAG_STREAM = 0x0008
+
+CHECKSUM_CODES = {
+    RDTSegment.CHECKSUM_SUM_OF_ORDS: 0,
+    RDTSegment.CHECKSUM_INTERNET: 1,
+    RDTSegment.CHECKSUM_CRC32: 2,
+}
+CHECKSUM_ALGORITHMS = {code: algorithm for algorithm, code in CHECKSUM_CODES.items()}
+
+
+class PackedSegment(object):
+    __slots__ = ("seqnum", "acknum", "window", "flags", "checksum", "streamId", "payloadView")
+
+    def __init__(self, seqnum, acknum, window, flags, checksum, streamId, payloadView):
+        self.seqnum = seqnum
+        self.acknum = acknum
+        self.window = window
+        self.flags = flags
+        self.checksum = checksum
+        self.streamId = streamId
+        self.payloadView = payloadView
+
+    # ################################################################################################################ #
+    # decode()                                                                                                         #
+    #                                                                                                                  #
+    # Description:                                                                                                     #
+    # Reads a segment from bytes, bytearray or memoryview without copying the payload                                  #
+    #                                                                                                                  #
+    # ################################################################################################################ #
+    @classmethod
+    def decode(cls, buffer):
+        view = memoryview(buffer)
+        if len(view) < HEADER.size:
+            raise ValueError(f"Segment is {len(view)} bytes, the header alone is {HEADER.size}")
+        seqnum, acknum, window, flags, checksum = HEADER.unpack_from(view)
+        if not flags & FLAG_STREAM:
+            return cls(seqnum, acknum, window, flags, checksum, 0, view[HEADER.size:])
+
+        if len(view) < HEADER.size + STREAM_ID.size:
+            raise ValueError(f"Segment is {len(view)} bytes, too short for its stream id")
+        streamId = STREAM_ID.unpack_from(view, HEADER.size)[0]
+        return cls(seqnum, acknum, window, flags, checksum, streamId, view[HEADER.size + STREAM_ID.size:])
+
+    # ################################################################################################################ #
+    # fromSegment()                                                                                                    #
+    #                                                                                                                  #
+    # Description:                                                                                                     #
+    # Packs a Segment or RDTSegment, the checksum is copied as is so a corrupted segment stays corrupted              #
+    #                                                                                                                  #
+    # ################################################################################################################ #
+    @classmethod
+    def fromSegment(cls, segment):
+        algorithm = getattr(segment, "checksumAlgorithm", RDTSegment.CHECKSUM_SUM_OF_ORDS)
+        flags = CHECKSUM_CODES[algorithm] << FLAG_CHECKSUM_SHIFT
+        if segment.acknum != -1:
+            flags |= FLAG_ACK
+        streamId = getattr(segment, "streamId", 0)
+        if streamId:
+            flags |= FLAG_STREAM
+        window = getattr(segment, "window", -1)
+        payload = segment.payload.encode(payloadEncoding(segment.acknum, window))
+        return cls(segment.seqnum, segment.acknum, window, flags, segment.checksum & 0xFFFFFFFF, streamId,
+                   memoryview(payload))
+
+    # ################################################################################################################ #
+    # toSegment()                                                                                                      #
+    #                                                                                                                  #
+    # Description:                                                                                                     #
+    # Rebuilds the RDTSegment the RDT layer works with                                                                 #
+    #                                                                                                                  #
+    # ################################################################################################################ #
+    def toSegment(self):
+        segment = RDTSegment(self.getChecksumAlgorithm(), self.streamId)
+        segment.seqnum = self.seqnum
+        segment.acknum = self.acknum
+        segment.window = self.window
+        segment.payload = self.payload
+        segment.checksum = self.checksum
+        return segment
+
+    # ################################################################################################################ #
+    # encode() / encodeInto()                                                                                          #
+    #                                                                                                                  #
+    # Description:                                                                                                     #
+    # encode() returns the segment as bytes, encodeInto() writes it into a preallocated buffer and returns the number  #
+    # of bytes written.                                                                                                #
+    # ################################################################################################################ #
+    def encode(self):
+        header = HEADER.pack(self.seqnum, self.acknum, self.window, self.flags, self.checksum)
+        if self.flags & FLAG_STREAM:
+            header += STREAM_ID.pack(self.streamId)
+        return header + self.payloadView
+
+    def encodeInto(self, buffer, offset=0):
+        HEADER.pack_into(buffer, offset, self.seqnum, self.acknum, self.window, self.flags, self.checksum)
+        start = offset + HEADER.size
+        if self.flags & FLAG_STREAM:
+            STREAM_ID.pack_into(buffer, start, self.streamId)
+            start += STREAM_ID.size
+        end = start + len(self.payloadView)
+        buffer[start:end] = self.payloadView
+        return end - offset
+
+    def __bytes__(self):
+        return self.encode()
+
+    def __len__(self):
+        return HEADER.size + (STREAM_ID.size if self.flags & FLAG_STREAM else 0) + len(self.payloadView)
+
+    @property
+    def payload(self):
+        return str(self.payloadView, payloadEncoding(self.acknum, self.window), "replace")
+
+    def isAck(self):
+        return bool(self.flags & FLAG_ACK)
+
+    def getChecksumAlgorithm(self):
+        return CHECKSUM_ALGORITHMS[(self.flags & FLAG_CHECKSUM_MASK) >> FLAG_CHECKSUM_SHIFT]
+
+    # ################################################################################################################ #
+    # checkChecksum()                                                                                                  #
+    #                                                                                                                  #
+    # Description:                                                                                                     #
+    # Same result as RDTSegment.checkChecksum() on the unpacked segment. Only sum-of-ords needs the payload as a str.  #
+    #                                                                                                                  #
+    # ################################################################################################################ #
+    def checkChecksum(self):
+        algorithm = self.getChecksumAlgorithm()
+        if algorithm == RDTSegment.CHECKSUM_SUM_OF_ORDS:
+            return (self.toSegment().computeChecksum() & 0xFFFFFFFF) == self.checksum
+
+        header = RDTSegment.HEADER.pack(self.seqnum, self.acknum, self.window, self.streamId)
+        if algorithm == RDTSegment.CHECKSUM_CRC32:
+            return zlib.crc32(self.payloadView, zlib.crc32(header)) == self.checksum
+        return internetChecksum(header + self.payloadView) == self.checksum
+
+
+def encodeSegment(segment):
+    return PackedSegment.fromSegment(segment).encode()
+
+
+def decodeSegment(buffer):
+    return PackedSegment.decode(buffer).toSegment()
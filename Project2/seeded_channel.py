@@ -0,0 +1,141 @@
+import heapq
+import random
+
+from channel_models import BernoulliLatency, BernoulliLoss
+from unreliable import UnreliableChannel
+
+try:
+    import numpy
+except ImportError:             # NumPy is optional, only used with useNumpy=True
+    numpy = None
+
+
+# #################################################################################################################### #
+# SeededUnreliableChannel                                                                                              #
+#                                                                                                                      #
+# Description:                                                                                                         #
+# UnreliableChannel with the same flags and stats counters, built for long simulations and tuning:                    #
+#                                                                                                                      #
+#     - it owns its random generator, so a seed reproduces a run exactly (corruption included, which                  #
+#       Segment.createChecksumError() would take from the global generator)                                           #
+#     - the random decisions for a whole tick are drawn in one batch, from the same random.Random unless useNumpy     #
+#       asks for NumPy's generator, which draws different numbers for the same seed (see backend)                     #
+#     - delayed segments wait in a heap keyed by release iteration, releasing them is O(log n) each instead of a      #
+#       scan plus list.remove() every tick                                                                             #
+#     - loss and latency are pluggable models (channel_models.py), the defaults are UnreliableChannel's Bernoulli     #
+#       ratios. An optional LinkLimit caps the segments delivered per iteration.                                      #
+#                                                                                                                      #
+# Notes:                                                                                                               #
+# Every segment goes through loss, then corruption (data only), then latency, then the link. Unlike UnreliableChannel #
+# a delayed segment can still be lost or corrupted, and delayed segments are released on time even on ticks where    #
+# nothing new was sent. Dropped segments are counted but never corrupted.                                              #
+#                                                                                                                      #
+# countTotalDataPackets counts every data segment handed to the channel, dropped and delayed ones included.            #
+# UnreliableChannel leaves out the ones it delays.                                                                     #
+#                                                                                                                      #
+# #################################################################################################################### #
+
+
+class SeededUnreliableChannel(UnreliableChannel):
+
+    def __init__(self, canDeliverOutOfOrder_, canDropPackets_, canDelayPackets_, canHaveChecksumErrors_, seed=None,
+                 useNumpy=False, lossModel=None, latencyModel=None, linkLimit=None,
+                 ratioOutOfOrder=UnreliableChannel.RATIO_OUT_OF_ORDER_PACKETS,
+                 ratioDataErrors=UnreliableChannel.RATIO_DATA_ERROR_PACKETS):
+        super().__init__(canDeliverOutOfOrder_, canDropPackets_, canDelayPackets_, canHaveChecksumErrors_)
+        self.random = random.Random(seed)
+        if useNumpy and numpy is None:
+            raise ImportError("useNumpy needs NumPy installed")
+        self.numpyRandom = numpy.random.default_rng(seed) if useNumpy else None
+        self.backend = "numpy" if useNumpy else "random"    # A seed reproduces a run with the same backend only
+        self.lossModel = lossModel if lossModel is not None else BernoulliLoss()
+        self.latencyModel = latencyModel if latencyModel is not None else BernoulliLatency()
+        self.linkLimit = linkLimit
+        self.ratioOutOfOrder = ratioOutOfOrder
+        self.ratioDataErrors = ratioDataErrors
+        self.delayedPackets = []            # heap of (release iteration, order, seg)
+        self.countDelayedOrder = 0
+
+    # ################################################################################################################ #
+    # draw()                                                                                                           #
+    #                                                                                                                  #
+    # Description:                                                                                                     #
+    # count uniform [0, 1) numbers in one go                                                                           #
+    #                                                                                                                  #
+    # ################################################################################################################ #
+    def draw(self, count):
+        if self.numpyRandom is not None:
+            return self.numpyRandom.random(count).tolist()
+        rand = self.random.random
+        return [rand() for _ in range(count)]
+
+    def processData(self):
+        self.currentIteration += 1
+
+        # release delayed packets
+        while self.delayedPackets and self.delayedPackets[0][0] <= self.currentIteration:
+            self.deliver(heapq.heappop(self.delayedPackets)[2])
+
+        if len(self.sendQueue) != 0:
+            self.impair()
+
+        if self.linkLimit is not None:
+            delivered = self.linkLimit.drain()
+            self.countSentPackets += len(delivered)
+            self.receiveQueue.extend(delivered)
+
+    # One batch per tick: [out of order] + [loss, corrupt, latency] draws per segment.
+    def impair(self):
+        perSegment = self.lossModel.DRAWS * self.canDropPackets + self.canHaveChecksumErrors + \
+            self.latencyModel.DRAWS * self.canDelayPackets
+        draws = iter(self.draw(1 + perSegment * len(self.sendQueue)))
+
+        if next(draws) <= self.ratioOutOfOrder and self.canDeliverOutOfOrder:
+            self.countOutOfOrderPackets += 1
+            self.sendQueue.reverse()
+
+        for seg in self.sendQueue:
+            isData = seg.acknum == -1
+            if isData:
+                self.countTotalDataPackets += 1
+            else:
+                # count ack packets...
+                self.countAckPackets += 1
+
+            if self.canDropPackets and self.lossModel.isLost(draws):
+                self.countDroppedPackets += 1
+                if self.canHaveChecksumErrors:
+                    next(draws)
+                if self.canDelayPackets:
+                    self.latencyModel.getDelay(draws)
+                continue
+
+            # only data packets can have checksum errors...
+            if self.canHaveChecksumErrors and next(draws) <= self.ratioDataErrors and isData:
+                self.createChecksumError(seg)
+                self.countChecksumErrorPackets += 1
+
+            delay = self.latencyModel.getDelay(draws) if self.canDelayPackets else 0
+            if delay > 0:
+                self.countDelayedPackets += 1
+                seg.setStartDelayIteration(self.currentIteration)
+                self.countDelayedOrder += 1
+                heapq.heappush(self.delayedPackets, (self.currentIteration + delay, self.countDelayedOrder, seg))
+            else:
+                self.deliver(seg)
+
+        self.sendQueue.clear()
+
+    def deliver(self, seg):
+        if self.linkLimit is None:
+            self.countSentPackets += 1
+            self.receiveQueue.append(seg)
+        elif not self.linkLimit.offer(seg):
+            self.countDroppedPackets += 1
+
+    # Same corruption as Segment.createChecksumError(), with this channel's generator.
+    def createChecksumError(self, seg):
+        if not seg.payload:
+            return
+        char = self.random.choice(seg.payload)
+        seg.payload = seg.payload.replace(char, 'X', 1)
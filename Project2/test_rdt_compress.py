@@ -0,0 +1,111 @@
+import pytest
+
+import rdt_bench
+from rdt_compress import DecompressionError, StreamDecompressor, compressChunks, splitText
+from rdt_fec import ParityDecoder, ParityEncoder
+from rdt_layer import RDTLayer
+from rdt_segment import RDTSegment
+from rdt_wire import PackedSegment, decodeSegment, encodeSegment
+from unreliable import UnreliableChannel
+
+TEXT = "We choose to go to the moon in this decade, not because it is easy — but because it is hard. " * 20
+
+
+def makeTrial(**overrides):
+    trial = {"mode": RDTLayer.MODE_SELECTIVE_REPEAT, "ackPolicy": "immediate", "fecBlock": 0, "compression": 6,
+             "size": 2000, "dataLength": 4, "window": 15, "ratio": 0.2, "lossModel": "bernoulli", "burst": 1,
+             "jitter": 0, "checksum": RDTSegment.CHECKSUM_CRC32, "maxIterations": 5000, "profile": False, "seed": 1}
+    trial.update(overrides)
+    return trial
+
+
+def test_round_trip_in_small_pieces():
+    compressed = "".join(compressChunks(splitText(TEXT, 100)))
+    assert len(compressed) < len(TEXT) // 10
+
+    decompressor = StreamDecompressor()
+    received = "".join(decompressor.decompress(compressed[start:start + 3]) for start in range(0, len(compressed), 3))
+    assert received == TEXT
+    assert decompressor.isFinished()
+
+
+def test_garbage_raises():
+    decompressor = StreamDecompressor()
+    with pytest.raises(DecompressionError):
+        decompressor.decompress("not a zlib stream")
+    with pytest.raises(DecompressionError):
+        decompressor.decompress("")
+
+
+def test_compressed_segment_is_one_byte_per_character_on_the_wire():
+    payload = "".join(compressChunks([TEXT]))[:16]
+    assert any(ord(character) > 0x7F for character in payload)
+    for algorithm in RDTSegment.CHECKSUM_ALGORITHMS:
+        segment = RDTSegment(algorithm)
+        segment.setData(32, payload, compressed=True)
+        encoded = encodeSegment(segment)
+        assert len(PackedSegment.decode(encoded).payloadView) == len(payload)
+        assert PackedSegment.decode(encoded).checkChecksum()
+        decoded = decodeSegment(encoded)
+        assert decoded.isCompressed() and decoded.payload == payload and decoded.checkChecksum()
+
+
+def test_parity_carries_the_compressed_flag():
+    payloads = ["".join(compressChunks([TEXT]))[start:start + 4] for start in range(0, 12, 4)]
+    encoder = ParityEncoder(3)
+    parity = None
+    for index, payload in enumerate(payloads):
+        parity = encoder.add(4 * index, payload, True)
+
+    decoder = ParityDecoder()
+    assert decoder.addParity(*parity) == []
+    decoder.addData(4, payloads[1])
+    assert decoder.addData(8, payloads[2]) == [(0, payloads[0], True)]
+
+
+# The first segment is lost and rebuilt from parity before any other data has been delivered, it has to be inflated
+# like the ones that arrived.
+def test_layer_inflates_a_rebuilt_first_segment():
+    client = RDTLayer()
+    server = RDTLayer()
+    for layer in (client, server):
+        layer.setSendChannel(UnreliableChannel(False, False, False, False))
+        layer.setReceiveChannel(UnreliableChannel(False, False, False, False))
+        layer.setForwardErrorCorrection(2)
+    client.setCompression(6)
+    client.setDataToSend(TEXT)
+
+    for iteration in range(100):
+        client.processData()
+        segments = client.sendChannel.sendQueue[:]
+        client.sendChannel.sendQueue.clear()
+        if iteration == 0:
+            assert segments[0].isCompressed() and segments[2].isParity() and segments[2].seqnum == 0
+            segments = [segments[2], segments[1]] + segments[3:]
+        server.receiveChannel.receiveQueue.extend(segments)
+        server.processData()
+        client.receiveChannel.receiveQueue.extend(server.sendChannel.sendQueue)
+        server.sendChannel.sendQueue.clear()
+        if server.isReceiveComplete(TEXT):
+            break
+
+    assert server.getDataReceived() == TEXT
+    assert server.countRecoveredSegments == 1
+    assert client.countRetransmits == 0
+
+
+@pytest.mark.parametrize("mode", [RDTLayer.MODE_GO_BACK_N, RDTLayer.MODE_SELECTIVE_REPEAT])
+@pytest.mark.parametrize("fecBlock", [0, 2, 3])
+def test_transfer_with_fec_and_compression(mode, fecBlock):
+    for seed in range(10):
+        result = rdt_bench.runTrial(makeTrial(mode=mode, fecBlock=fecBlock, dataLength=16, seed=seed))
+        assert result["error"] is None
+        assert result["completed"], seed
+
+
+def test_compression_shrinks_the_transfer():
+    plain = rdt_bench.runTrial(makeTrial(compression=None))
+    compressed = rdt_bench.runTrial(makeTrial())
+    assert compressed["completed"] and plain["completed"]
+    assert compressed["dataPackets"] < plain["dataPackets"] / 4
+    assert compressed["iterations"] < plain["iterations"]
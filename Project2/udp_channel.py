@@ -0,0 +1,83 @@
+import socket
+
+from rdt_wire import PackedSegment, encodeSegment
+
+
+# #################################################################################################################### #
+# UDPChannel                                                                                                           #
+#                                                                                                                      #
+# Description:                                                                                                         #
+# Drop-in replacement for UnreliableChannel that moves segments over a nonblocking UDP socket in the rdt_wire format.  #
+# The same object can be handed to both setSendChannel() and setReceiveChannel(), send() goes to the remote address   #
+# and receive() drains whatever has arrived on the local one. Without a remote address (the server end) replies go to  #
+# whoever sent the last datagram.                                                                                      #
+#                                                                                                                      #
+# Notes:                                                                                                               #
+# Loopback UDP is close to perfect, put impairment_proxy.py between the two ends to get drops, delays, reordering and  #
+# corruption.                                                                                                          #
+#                                                                                                                      #
+# #################################################################################################################### #
+
+
+class UDPChannel(object):
+    MAX_DATAGRAM = 65535
+
+    def __init__(self, localAddress, remoteAddress=None):
+        self.remoteAddress = remoteAddress
+        self.replyToSender = remoteAddress is None
+        self.sock = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
+        self.sock.setsockopt(socket.SOL_SOCKET, socket.SO_RCVBUF, 1 << 20)
+        self.sock.bind(localAddress)
+        self.sock.setblocking(False)
+        self.receiveBuffer = bytearray(UDPChannel.MAX_DATAGRAM)
+        self.receiveView = memoryview(self.receiveBuffer)
+        # stats, named like UnreliableChannel's so the same summary works
+        self.countTotalDataPackets = 0
+        self.countSentPackets = 0
+        self.countAckPackets = 0
+        self.countReceivedPackets = 0
+        self.countSendErrors = 0
+        self.currentIteration = 0
+
+    def getLocalAddress(self):
+        return self.sock.getsockname()
+
+    def send(self, seg):
+        if self.remoteAddress is None:
+            self.countSendErrors += 1
+            return
+        try:
+            self.sock.sendto(encodeSegment(seg), self.remoteAddress)
+        except (BlockingIOError, ConnectionRefusedError):
+            # A full socket buffer or a peer that isn't up yet is just another lost packet.
+            self.countSendErrors += 1
+            return
+
+        self.countSentPackets += 1
+        if seg.acknum == -1:
+            self.countTotalDataPackets += 1
+        else:
+            self.countAckPackets += 1
+
+    def receive(self):
+        segments = []
+        while True:
+            try:
+                size, address = self.sock.recvfrom_into(self.receiveBuffer)
+            except (BlockingIOError, ConnectionRefusedError):
+                break
+            try:
+                segments.append(PackedSegment.decode(self.receiveView[:size]).toSegment())
+            except ValueError:
+                continue                        # Truncated datagram, same as a drop
+            self.countReceivedPackets += 1
+            if self.replyToSender:
+                self.remoteAddress = address
+        return segments
+
+    # Nothing to do per tick, the kernel moves the datagrams. Kept so main loops can treat both channel types the same.
+    def processData(self):
+        self.currentIteration += 1
+
+    def close(self):
+        self.sock.close()
@@ -0,0 +1,97 @@
+import argparse
+import os
+import subprocess
+import sys
+import time
+
+from rdt_layer import *
+from udp_channel import UDPChannel
+
+# #################################################################################################################### #
+# UDP Main                                                                                                             #
+#                                                                                                                      #
+# Runs the same client -> server transfer as rdt_main.py over real UDP sockets on loopback and reports wall-clock      #
+# throughput and latency. By default impairment_proxy.py is started as a separate process between the two ends.       #
+#                                                                                                                      #
+#     python udp_main.py --size 100000 --tick-ms 0.5                                                                   #
+#     python udp_main.py --no-proxy                                                                                    #
+#                                                                                                                      #
+# #################################################################################################################### #
+
+parser = argparse.ArgumentParser(description="RDT transfer over loopback UDP")
+parser.add_argument("--host", default="127.0.0.1")
+parser.add_argument("--proxy-port", type=int, default=6000)
+parser.add_argument("--server-port", type=int, default=6001)
+parser.add_argument("--no-proxy", action="store_true", help="send straight to the server, no impairments")
+parser.add_argument("--size", type=int, default=10000, help="characters to send")
+parser.add_argument("--tick-ms", type=float, default=1.0, help="sleep between iterations")
+parser.add_argument("--mode", default=RDTLayer.MODE_SELECTIVE_REPEAT,
+                    choices=[RDTLayer.MODE_GO_BACK_N, RDTLayer.MODE_SELECTIVE_REPEAT])
+parser.add_argument("--seed", type=int, default=None)
+args = parser.parse_args()
+
+dataToSend = ("The quick brown fox jumped over the lazy dog. " * (args.size // 46 + 1))[:args.size]
+
+proxy = None
+proxyOutput = ""
+clientRemote = (args.host, args.server_port)
+if not args.no_proxy:
+    proxyCommand = [sys.executable, os.path.join(os.path.dirname(os.path.abspath(__file__)), "impairment_proxy.py"),
+                    "--host", args.host, "--listen-port", str(args.proxy_port), "--server-port", str(args.server_port)]
+    if args.seed is not None:
+        proxyCommand += ["--seed", str(args.seed)]
+    proxy = subprocess.Popen(proxyCommand, stdout=subprocess.PIPE, text=True)
+    print(proxy.stdout.readline().strip())          # Wait until the proxy is bound
+    clientRemote = (args.host, args.proxy_port)
+
+clientChannel = UDPChannel((args.host, 0), clientRemote)
+serverChannel = UDPChannel((args.host, args.server_port))
+
+client = RDTLayer()
+server = RDTLayer()
+client.setSendChannel(clientChannel)
+client.setReceiveChannel(clientChannel)
+server.setSendChannel(serverChannel)
+server.setReceiveChannel(serverChannel)
+for layer in (client, server):
+    layer.setRetransmitMode(args.mode)
+    layer.setChecksumAlgorithm(RDTSegment.CHECKSUM_CRC32)
+client.setDataToSend(dataToSend)
+
+loopIter = 0
+start = time.perf_counter()
+try:
+    while True:
+        loopIter += 1
+        client.processData()
+        clientChannel.processData()
+        server.processData()
+        serverChannel.processData()
+
+        if server.isReceiveComplete(dataToSend):
+            break
+
+        if args.tick_ms > 0:
+            time.sleep(args.tick_ms / 1000)
+finally:
+    elapsed = time.perf_counter() - start
+    clientChannel.close()
+    serverChannel.close()
+    if proxy is not None:
+        proxy.terminate()
+        proxyOutput = proxy.communicate()[0]        # Its per-direction stats, printed on the way out
+
+secondsPerIteration = elapsed / loopIter
+srtt = client.getRTOEstimates()["srtt"]
+
+print("TOTAL ITERATIONS: {0}".format(loopIter))
+print("elapsed: {0:.3f} s ({1:.3f} ms per iteration)".format(elapsed, secondsPerIteration * 1000))
+print("throughput: {0:.0f} chars/s".format(len(dataToSend) / elapsed))
+if srtt is not None:
+    print("smoothed RTT: {0:.2f} iterations, {1:.3f} ms".format(srtt, srtt * secondsPerIteration * 1000))
+print("countSentPackets: {0}".format(clientChannel.countSentPackets + serverChannel.countSentPackets))
+print("countAckPackets: {0}".format(serverChannel.countAckPackets))
+print("# segment timeouts: {0}".format(client.countSegmentTimeouts))
+print("# fast retransmits: {0}".format(client.countFastRetransmits))
+if proxyOutput:
+    print("proxy: " + proxyOutput.strip().replace("\n", "\nproxy: "))